@@ -1,6 +1,9 @@
+from django.db import transaction
 from rest_framework import serializers
 
 from core.models import ChatRoom, Message
+from product import stats as product_stats
+from product.values import ValuesSerializer
 
 
 class MessageSerializer(serializers.ModelSerializer):
@@ -9,6 +12,11 @@ class MessageSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
+class MessageValuesSerializer(ValuesSerializer):
+    '''MessageSerializer fast path for message list pages'''
+    serializer_class = MessageSerializer
+
+
 class ChatRoomSerializer(serializers.ModelSerializer):
 
     # Fetch latest message dynamically
@@ -36,5 +44,7 @@ class ChatRoomSerializer(serializers.ModelSerializer):
         product = validated_data.get('product')
         seller = validated_data.get('seller')
         buyer = validated_data.get('buyer')
-        chat = ChatRoom.objects.create(seller=seller, product=product, buyer=buyer)
+        with transaction.atomic():
+            chat = ChatRoom.objects.create(seller=seller, product=product, buyer=buyer)
+            product_stats.record(product.id, chat_rooms=1)
         return chat
@@ -0,0 +1,59 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+
+from chat.serializers import MessageSerializer
+from core.models import Category, ChatRoom, Message, Product
+
+
+def messages_url(room_id):
+    # Create and return a chat room messages URL
+    return reverse('chat_messages', args=[room_id])
+
+
+def create_user(email='user@example.com', password='test123123123'):
+    # Create & Return a user
+    return get_user_model().objects.create_user(email=email, password=password)
+
+
+class MessageListAPITest(APITestCase):
+    '''Test listing the messages of a chat room'''
+
+    def setUp(self):
+        seller = create_user()
+        self.buyer = create_user(email='buyer@example.com')
+        self.client.force_authenticate(self.buyer)
+        product = Product.objects.create(
+            seller=seller,
+            category=Category.objects.create(name='Test Category'),
+            title='test_product',
+            price=Decimal('10.00'),
+            description='test description'
+        )
+        self.room = ChatRoom.objects.create(product=product, seller=seller,
+                                            buyer=self.buyer)
+        for text in ('hello', 'is it still available? ☺', ''):
+            Message.objects.create(room=self.room, sender='buyer', text=text)
+
+    def test_list_messages(self):
+        '''Test messages listed newest first'''
+        res = self.client.get(messages_url(self.room.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([message['text'] for message in res.data['results']],
+                         ['', 'is it still available? ☺', 'hello'])
+
+    def test_list_rendered_as_serializer(self):
+        '''Test list pages rendering the same JSON as the serializer'''
+        res = self.client.get(messages_url(self.room.id), {'cursor': ''})
+
+        expected = MessageSerializer(Message.objects.order_by('-created_at'),
+                                     many=True).data
+        renderer = JSONRenderer()
+        self.assertEqual(renderer.render(res.data['results']),
+                         renderer.render(expected))
+        self.assertIsNone(res.data['next'])
@@ -6,12 +6,17 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework_simplejwt.authentication import JWTAuthentication
 
-from chat.serializers import ChatRoomSerializer, MessageSerializer
+from chat.serializers import (
+    ChatRoomSerializer,
+    MessageSerializer,
+    MessageValuesSerializer,
+)
 from core.models import ChatRoom, Message, Product
-from product.pagination import CustomPagination
+from product.pagination import CustomPagination, KeysetPaginationMixin
+from product.values import ValuesListMixin
 
 
-class ChatRoomListCreateView(generics.ListCreateAPIView):
+class ChatRoomListCreateView(KeysetPaginationMixin, generics.ListCreateAPIView):
     serializer_class = ChatRoomSerializer
     pagination_class = CustomPagination
     permission_classes = [IsAuthenticated]
@@ -47,10 +52,11 @@ class ChatRoomListCreateView(generics.ListCreateAPIView):
             return Response(error.detail, status=status.HTTP_400_BAD_REQUEST)
 
 
-class MessageListView(generics.ListAPIView):
+class MessageListView(KeysetPaginationMixin, ValuesListMixin, generics.ListAPIView):
     '''Get a list of messages belonging to the chatroom'''
 
     serializer_class = MessageSerializer
+    values_serializer_class = MessageValuesSerializer
     pagination_class = CustomPagination
 
     def get_queryset(self):
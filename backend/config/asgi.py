@@ -11,8 +11,10 @@ from channels.security.websocket import AllowedHostsOriginValidator
 from django.core.asgi import get_asgi_application
 
 from chat import routing
+from product.counters import start_hit_counter_flusher
 
 django_asgi_app = get_asgi_application()
+start_hit_counter_flusher()
 
 application = ProtocolTypeRouter({
     "http": django_asgi_app,
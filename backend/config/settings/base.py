@@ -36,6 +36,7 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'django.contrib.sites',
+    'django.contrib.postgres',
 
     # Internal_apps
     'core',
@@ -136,6 +137,15 @@ STATIC_ROOT = '/vol/web/static/'
 MEDIA_URL = '/static/media/'
 MEDIA_ROOT = '/vol/web/media/'
 
+# Deduplicating uploads by naming them after their content hash
+DEFAULT_FILE_STORAGE = 'core.storage.ContentAddressedStorage'
+
+# Stream uploads to temporary files in chunks instead of buffering in memory,
+# the storage then moves the file in place rather than copying it
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -213,6 +223,24 @@ SOCIAL_AUTH_GOOGLE_SECRET = os.environ.get('SOCIAL_AUTH_GOOGLE_SECRET')
 STATE = 'qwewqeqwetgljhn4ilb23uy'
 
 
+# cache config
+# Cached trees, pages & suggestions are invalidated through shared version
+# keys. With the default process local cache, changes made by other
+# processes (commands, cron) show up once the versions expire, within
+# PRODUCT_LIST_CACHE['VERSION_TIMEOUT'] & product.categories'
+# TREE_VERSION_TIMEOUT. Set CACHE_LOCATION=redis://... to share the cache.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+if os.environ.get('CACHE_LOCATION'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['CACHE_LOCATION'],
+    }
+
+
 # channels config
 ASGI_APPLICATION = 'config.asgi.application'
 CHANNEL_LAYERS = {
@@ -226,3 +254,98 @@ CHANNEL_LAYERS = {
     #     },
     # },
 }
+
+
+# product view counter config
+# Each serving process flushes its buffer from a background thread.
+# flush_hit_counts needs a shared backend, e.g.
+# HIT_COUNTER_BACKEND=product.counters.RedisHitCounterBackend
+HIT_COUNTER = {
+    'BACKEND': os.environ.get('HIT_COUNTER_BACKEND',
+                              'product.counters.LocalHitCounterBackend'),
+    'LOCATION': os.environ.get('HIT_COUNTER_LOCATION', 'redis://127.0.0.1:6379/0'),
+    # Seconds between flushes, i.e. the window of views lost on a crash
+    'FLUSH_INTERVAL': int(os.environ.get('HIT_COUNTER_FLUSH_INTERVAL', 10)),
+    # Buffered products forcing an early flush
+    'MAX_PENDING': int(os.environ.get('HIT_COUNTER_MAX_PENDING', 1000)),
+}
+
+
+# product image variants config
+PRODUCT_IMAGE_VARIANTS = {
+    'WIDTHS': (160, 480, 1080),
+    'FORMATS': ('WEBP', 'JPEG'),
+    'WORKERS': int(os.environ.get('PRODUCT_IMAGE_WORKERS', 2)),
+}
+
+
+# product facets config
+# Upper bounds of the price buckets, the last bucket has no upper bound
+PRODUCT_PRICE_BUCKETS = (10, 50, 100, 500)
+PRODUCT_FACETS_CACHE_TIMEOUT = 30  # seconds
+
+
+# product trending config
+PRODUCT_TRENDING = {
+    # Number of products kept in the ranked table
+    'SIZE': int(os.environ.get('PRODUCT_TRENDING_SIZE', 200)),
+    # Hours for a product's hits & bookmarks, or a chat, to lose half their weight
+    'HALF_LIFE_HOURS': 48,
+    # Chat rooms older than this don't count anymore
+    'CHAT_WINDOW_HOURS': 7 * 24,
+    'WEIGHTS': {'hits': 1, 'bookmarks': 5, 'chats': 10},
+}
+
+
+# product similar config
+PRODUCT_SIMILAR = {
+    # Directory of the memory-mapped TF-IDF index, see update_similar_index
+    'INDEX_DIR': os.environ.get('PRODUCT_SIMILAR_DIR', '/vol/web/similar/'),
+    'TOP_K': 10,
+}
+
+
+# product list response cache config
+PRODUCT_LIST_CACHE = {
+    # Seconds a page stays fresh, bounding how late counters show up
+    'TIMEOUT': int(os.environ.get('PRODUCT_LIST_CACHE_TIMEOUT', 30)),
+    # Seconds a stale page may still be served while it's being rebuilt
+    'STALE_TIMEOUT': 300,
+    'LOCK_TIMEOUT': 10,
+    'WAIT': 2,
+    # Seconds before changes made by other processes invalidate pages
+    # without a shared cache
+    'VERSION_TIMEOUT': 60,
+}
+
+
+# bulk product import config
+PRODUCT_IMPORT = {
+    # Rows validated & inserted per transaction
+    'BATCH_SIZE': 500,
+    # Row errors listed in a report at most, all of them are counted
+    'MAX_ERRORS': 1000,
+}
+
+
+# sold product archival config
+PRODUCT_ARCHIVE = {
+    # Days a product stays sold, unmodified, before being archived
+    'AFTER_DAYS': int(os.environ.get('PRODUCT_ARCHIVE_AFTER_DAYS', 90)),
+    # Products moved per transaction
+    'BATCH_SIZE': 500,
+}
+
+
+# search box suggestions config
+PRODUCT_SUGGEST = {
+    # 'auto' uses the pg_trgm index when migrations could create it
+    'BACKEND': 'auto',
+    # Titles & categories suggested at most
+    'LIMIT': 10,
+    'MIN_LENGTH': 1,
+    # Seconds a query's suggestions stay cached, also sent as max-age
+    'CACHE_TIMEOUT': 60,
+    # Seconds between rebuilds of the in-process prefix index
+    'REBUILD_INTERVAL': 60,
+}
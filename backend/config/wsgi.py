@@ -17,3 +17,7 @@ else:
     os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings.prod')
 
 application = get_wsgi_application()
+
+from product.counters import start_hit_counter_flusher  # noqa: E402
+
+start_hit_counter_flusher()
@@ -0,0 +1,25 @@
+'''
+Django command to move long sold products to the archive tables.
+'''
+from django.core.management.base import BaseCommand
+
+from product.archive import archive_sold_products
+
+
+class Command(BaseCommand):
+    """Django command to archive sold products, run periodically e.g. by cron."""
+    help = ('Move products sold & unmodified for PRODUCT_ARCHIVE["AFTER_DAYS"], '
+            'with their images, to ArchivedProduct in batches.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int,
+                            help='Archive products sold for this many days instead.')
+        parser.add_argument('--batch-size', type=int)
+
+    def handle(self, *args, **options):
+        """Entrypoint for command"""
+        stats = archive_sold_products(after_days=options['days'],
+                                      batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {stats.products} products & {stats.images} images '
+            f'({stats.duration * 1000:.1f} ms)'))
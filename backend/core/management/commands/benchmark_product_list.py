@@ -0,0 +1,58 @@
+'''
+Django command to benchmark product list rendering.
+'''
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIRequestFactory
+
+from product.serializers import ProductListSerializer
+from product.views import ProductListViewSet
+
+
+class UncachedProductListViewSet(ProductListViewSet):
+    """Rendering every page, the list cache would answer anonymous repeats"""
+
+    def list(self, request, *args, **kwargs):
+        return super(ProductListViewSet, self).list(request, *args, **kwargs)
+
+
+class Command(BaseCommand):
+    """Django command to measure product list throughput per field selection."""
+    help = ('Render product list pages with the card fields, every field, '
+            'and any given --fields selection, reporting rows per second.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50)
+        parser.add_argument('--fields', action='append', default=[],
+                            help='Comma separated field selection, repeatable.')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command"""
+        selections = [('card', None),
+                      ('full', ','.join(ProductListSerializer.get_readable_fields()))]
+        selections += [(fields, fields) for fields in options['fields']]
+        view = UncachedProductListViewSet.as_view({'get': 'list'})
+        factory = APIRequestFactory()
+
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            for label, fields in selections:
+                params = {'fields': fields} if fields else {}
+                view(factory.get('/', params)).render()  # Warm up
+
+                rows = size = 0
+                start = time.perf_counter()
+                with CaptureQueriesContext(connection) as queries:
+                    for _ in range(options['requests']):
+                        response = view(factory.get('/', params)).render()
+                        rows += len(response.data['results'])
+                        size += len(response.content)
+                duration = time.perf_counter() - start
+
+                self.stdout.write(
+                    f'{label}: {rows / duration:.0f} rows/s, '
+                    f'{duration / options["requests"] * 1000:.1f} ms/page, '
+                    f'{size // options["requests"]} bytes/page, '
+                    f'{len(queries) // options["requests"]} queries/page')
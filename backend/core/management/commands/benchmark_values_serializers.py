@@ -0,0 +1,87 @@
+'''
+Django command to benchmark the values fast path against the serializers.
+'''
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from chat.serializers import MessageSerializer, MessageValuesSerializer
+from core.models import DirectTransaction, Message
+from product.serializers import ProductListSerializer, ProductListValuesSerializer
+from product.views import ProductListViewSet
+from transaction.serializers import (
+    DirectTransactionSerializer,
+    DirectTransactionValuesSerializer,
+)
+
+
+def get_product_cases(fields):
+    # Return the serializer & values renderers of a product list page
+    request = APIRequestFactory().get('/', {'fields': fields} if fields else {})
+    view = ProductListViewSet(action_map={'get': 'list'}, action='list',
+                              args=(), kwargs={}, format_kwarg=None)
+    view.request = Request(request)
+    context = view.get_serializer_context()
+    return (view.get_queryset(),
+            lambda page: ProductListSerializer(page, many=True, context=context).data,
+            ProductListValuesSerializer(context=context))
+
+
+class Command(BaseCommand):
+    """Django command to compare the serializers & values fast path per page size."""
+    help = ('Fetch & render list pages of products, messages and transactions '
+            'through the serializers and the values fast path, '
+            'reporting milliseconds per page.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50)
+        parser.add_argument('--page-size', type=int, action='append',
+                            dest='page_sizes', help='Repeatable, 20 & 100 by default.')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command"""
+        full = ','.join(ProductListSerializer.get_readable_fields())
+        cases = [
+            ('product card', *get_product_cases(None)),
+            ('product full', *get_product_cases(full)),
+            ('message',
+             Message.objects.order_by('-created_at'),
+             lambda page: MessageSerializer(page, many=True).data,
+             MessageValuesSerializer()),
+            ('transaction',
+             (DirectTransaction.objects
+              .select_related('chatroom__product')
+              .order_by('-created_at')),
+             lambda page: DirectTransactionSerializer(page, many=True).data,
+             DirectTransactionValuesSerializer()),
+        ]
+        renderer = JSONRenderer()
+
+        for page_size in options['page_sizes'] or [20, 100]:
+            for label, queryset, serialize, values in cases:
+                def render_serializer():
+                    return renderer.render(serialize(list(queryset[:page_size])))
+
+                def render_values():
+                    rows = values.project(queryset, 'id', 'created_at')[:page_size]
+                    return renderer.render(values.to_representation(rows))
+
+                if render_serializer() != render_values():
+                    self.stderr.write(f'{label}: rendered JSON differs')
+                timings = [self.measure(render, options['requests'])
+                           for render in (render_serializer, render_values)]
+                self.stdout.write(
+                    f'{label} x{page_size}: serializer {timings[0]:.2f} ms/page, '
+                    f'values {timings[1]:.2f} ms/page, '
+                    f'{timings[0] / timings[1]:.1f}x')
+
+    @staticmethod
+    def measure(render, requests):
+        render()  # Warm up
+        start = time.perf_counter()
+        for _ in range(requests):
+            render()
+        return (time.perf_counter() - start) / requests * 1000
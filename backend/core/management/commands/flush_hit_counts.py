@@ -0,0 +1,25 @@
+'''
+Django command to flush buffered product hits to the db.
+'''
+from django.core.management.base import BaseCommand, CommandError
+
+from product.counters import get_hit_counter
+
+
+class Command(BaseCommand):
+    """Django command to force a product hit counter flush."""
+    help = ('Flush buffered Product.hit_cnt increments. '
+            'Requires a shared backend (e.g. redis) holding every process\' hits.')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command"""
+        counter = get_hit_counter()
+        if not getattr(counter.backend, 'shared', False):
+            raise CommandError(
+                f'{type(counter.backend).__name__} buffers hits in the memory of '
+                f'each serving process, which flushes them itself. '
+                f'Configure a shared HIT_COUNTER backend to flush from here.')
+        stats = counter.flush()
+        self.stdout.write(self.style.SUCCESS(
+            f'Flushed {stats.hits} hits of {stats.products} products '
+            f'in {stats.queries} queries ({stats.duration * 1000:.1f} ms)'))
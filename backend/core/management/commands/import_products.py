@@ -0,0 +1,44 @@
+'''
+Django command to import products from a CSV or JSON lines file.
+'''
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from product.imports import get_format, import_products
+
+
+class Command(BaseCommand):
+    """Django command to bulk import the products of a seller."""
+    help = ('Stream products from a CSV or JSON lines file, inserting them in '
+            'batches for the given seller. Invalid rows are reported and skipped.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--seller', required=True, help='Email of the seller.')
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help='Guessed from the file extension by default.')
+        parser.add_argument('--batch-size', type=int)
+
+    def handle(self, *args, **options):
+        """Entrypoint for command"""
+        try:
+            seller = get_user_model().objects.get(email=options['seller'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'No user with the email {options["seller"]}')
+        try:
+            file_format = get_format(options['path'], options['format'])
+        except ValueError as error:
+            raise CommandError(error)
+
+        with open(options['path'], 'rb') as file:
+            stats = import_products(seller, file, file_format,
+                                    batch_size=options['batch_size'])
+
+        for error in stats.errors:
+            messages = '; '.join(f'{field}: {" ".join(map(str, field_errors))}'
+                                 for field, field_errors in error['errors'].items())
+            self.stderr.write(f'line {error["line"]}: {messages}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {stats.created} of {stats.rows} rows '
+            f'({stats.error_count} errors) in {stats.duration:.2f} s, '
+            f'{stats.rows_per_second:.0f} rows/s'))
@@ -0,0 +1,54 @@
+'''
+Django command to report the bytes content addressed storage saves.
+'''
+import hashlib
+import os
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+def hash_file(path, chunk_size=64 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Command(BaseCommand):
+    """Django command to find duplicated files on the media volume."""
+    help = 'Hash every media file and report the bytes taken by duplicates.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=settings.MEDIA_ROOT)
+        parser.add_argument('--top', type=int, default=10,
+                            help='Number of largest duplicate groups to list')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command"""
+        groups = defaultdict(list)  # {sha256: [(path, size)]}
+        for directory, _, filenames in os.walk(options['path']):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                groups[hash_file(path)].append((path, os.path.getsize(path)))
+
+        files = sum(len(paths) for paths in groups.values())
+        total = sum(size for paths in groups.values() for _, size in paths)
+        duplicates = {digest: paths for digest, paths in groups.items()
+                      if len(paths) > 1}
+        saved = sum(paths[0][1] * (len(paths) - 1) for paths in duplicates.values())
+
+        self.stdout.write(f'Files: {files} ({total} bytes)')
+        self.stdout.write(f'Unique contents: {len(groups)} ({total - saved} bytes)')
+        self.stdout.write(f'Duplicate files: {files - len(groups)}')
+        ratio = saved / total * 100 if total else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Bytes saved by deduplication: {saved} ({ratio:.1f}%)'))
+
+        largest = sorted(duplicates.values(),
+                         key=lambda paths: paths[0][1] * (len(paths) - 1),
+                         reverse=True)
+        for paths in largest[:options['top']]:
+            self.stdout.write(f'  {len(paths)} x {paths[0][1]} bytes: {paths[0][0]}')
@@ -0,0 +1,30 @@
+'''
+Django command to rebuild the product daily stats.
+'''
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from product.stats import rebuild
+
+
+class Command(BaseCommand):
+    """Django command to recompute ProductDailyStats, e.g. after a backfill."""
+    help = ('Recompute daily favorites, chat rooms, reservations & sales from '
+            'their tables, for the last --days or the whole history. '
+            'Views are kept as recorded.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int,
+                            help='Only rebuild the last N days, today included.')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command"""
+        since = None
+        if options['days']:
+            since = timezone.localdate() - timedelta(days=options['days'] - 1)
+        stats = rebuild(since=since)
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {stats.rows} daily product stats '
+            f'({stats.duration * 1000:.1f} ms)'))
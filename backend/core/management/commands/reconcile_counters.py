@@ -0,0 +1,53 @@
+'''
+Django command to recompute drifted product counters.
+'''
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from core.models import Favorite, Product
+
+
+class Command(BaseCommand):
+    """Django command to reconcile Product.bookmark_cnt with Favorite rows."""
+    help = 'Recompute Product.bookmark_cnt in id ordered batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        """Entrypoint for command"""
+        batch_size = options['batch_size']
+        last_id, checked, fixed = 0, 0, 0
+
+        while True:
+            with transaction.atomic():
+                # Locking the batch so concurrent favorite writes wait for it
+                rows = list(Product.objects
+                            .select_for_update()
+                            .filter(id__gt=last_id)
+                            .order_by('id')
+                            .values_list('id', 'bookmark_cnt')[:batch_size])
+                if not rows:
+                    break
+                first_id, last_id = rows[0][0], rows[-1][0]
+
+                # One grouped aggregate for the whole batch
+                counts = dict(Favorite.objects
+                              .filter(product_id__gte=first_id,
+                                      product_id__lte=last_id)
+                              .values('product_id')
+                              .annotate(total=Count('id'))
+                              .values_list('product_id', 'total'))
+
+                drifted = [Product(id=product_id,
+                                   bookmark_cnt=counts.get(product_id, 0))
+                           for product_id, bookmark_cnt in rows
+                           if bookmark_cnt != counts.get(product_id, 0)]
+                Product.objects.bulk_update(drifted, ['bookmark_cnt'])
+
+            checked += len(rows)
+            fixed += len(drifted)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Checked {checked} products, fixed {fixed} bookmark counts'))
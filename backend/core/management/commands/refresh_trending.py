@@ -0,0 +1,18 @@
+'''
+Django command to rebuild the trending products ranking.
+'''
+from django.core.management.base import BaseCommand
+
+from product.trending import refresh_trending
+
+
+class Command(BaseCommand):
+    """Django command to recompute ProductTrend, run periodically e.g. by cron."""
+    help = 'Score unsold products by decayed hits, bookmarks & recent chats.'
+
+    def handle(self, *args, **options):
+        """Entrypoint for command"""
+        stats = refresh_trending()
+        self.stdout.write(self.style.SUCCESS(
+            f'Ranked {stats.products} trending products '
+            f'({stats.duration * 1000:.1f} ms)'))
@@ -0,0 +1,23 @@
+'''
+Django command to update the similar products index.
+'''
+from django.core.management.base import BaseCommand
+
+from product.similar import update_index
+
+
+class Command(BaseCommand):
+    """Django command to refresh the TF-IDF index, run periodically e.g. by cron."""
+    help = ('Re-vectorize products modified since the last run, '
+            'or every unsold product with --rebuild.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command"""
+        stats = update_index(rebuild=options['rebuild'])
+        kind = 'Rebuilt' if stats.full else 'Updated'
+        self.stdout.write(self.style.SUCCESS(
+            f'{kind} similar index: {stats.rows} products, '
+            f'{stats.vectorized} vectorized ({stats.duration * 1000:.1f} ms)'))
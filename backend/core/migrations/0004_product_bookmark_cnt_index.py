@@ -0,0 +1,17 @@
+# Generated by Django 4.0 on 2026-10-18 08:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['-bookmark_cnt', '-id'], name='product_bookmark_cnt_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.0 on 2026-10-18 08:54
+
+import core.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_productimage_position'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='productimage',
+            name='image',
+            field=models.ImageField(db_index=True, upload_to=core.models.product_file_name_uuid),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='profile_image',
+            field=models.ImageField(blank=True, db_index=True, null=True, upload_to=core.models.user_file_name_uuid),
+        ),
+    ]
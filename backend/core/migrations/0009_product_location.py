@@ -0,0 +1,41 @@
+# Generated by Django 4.0 on 2026-10-18 09:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_product_sort_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='city',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='city_products', to='core.city'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='country',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='country_products', to='core.country'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='county',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='county_products', to='core.county'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['city', '-created_at', '-id'], name='product_city_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['county', '-created_at', '-id'], name='product_county_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['country', '-created_at', '-id'], name='product_country_created_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.0 on 2026-10-18 09:00
+
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_location(apps, schema_editor):
+    # Default existing products to their seller's first address, in one UPDATE
+    Address = apps.get_model('core', 'Address')
+    Product = apps.get_model('core', 'Product')
+
+    first_address = (Address.objects
+                     .filter(user_id=OuterRef('seller_id'))
+                     .order_by('id'))
+    (Product.objects
+     .filter(city__isnull=True)
+     .update(city_id=Subquery(first_address.values('city_id')[:1]),
+             county_id=Subquery(first_address.values('city__county_id')[:1]),
+             country_id=Subquery(
+                 first_address.values('city__county__country_id')[:1])))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_product_location'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_location, migrations.RunPython.noop),
+    ]
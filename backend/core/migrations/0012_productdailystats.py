@@ -0,0 +1,39 @@
+# Generated by Django 4.0 on 2026-10-18 09:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_producttrend'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('views', models.IntegerField(default=0)),
+                ('favorites', models.IntegerField(default=0)),
+                ('chat_rooms', models.IntegerField(default=0)),
+                ('reservations', models.IntegerField(default=0)),
+                ('sales', models.IntegerField(default=0)),
+                ('product', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='core.product')),
+                ('seller', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.user')),
+            ],
+            options={
+                'verbose_name_plural': 'Product daily stats',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='productdailystats',
+            index=models.Index(fields=['seller', 'date'], include=('product', 'views', 'favorites', 'chat_rooms', 'reservations', 'sales'), name='product_stats_seller_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='productdailystats',
+            constraint=models.UniqueConstraint(fields=('product', 'date'), name='product_stats_product_date_uniq'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 4.0 on 2026-10-18 09:45
+
+import core.models
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_productdailystats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedProduct',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=255)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('description', models.TextField()),
+                ('is_sold', models.BooleanField(default=True)),
+                ('hit_cnt', models.IntegerField(default=0)),
+                ('bookmark_cnt', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField()),
+                ('modified_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField()),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='archived_products', to='core.category')),
+                ('city', models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.city')),
+                ('country', models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.country')),
+                ('county', models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.county')),
+                ('seller', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_products', to='core.user')),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='chatroom',
+            name='product',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.PROTECT, related_name='product_chats', to='core.product'),
+        ),
+        migrations.AlterField(
+            model_name='productdailystats',
+            name='product',
+            field=models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='core.product'),
+        ),
+        migrations.CreateModel(
+            name='ArchivedProductImage',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('image', models.ImageField(db_index=True, upload_to=core.models.product_file_name_uuid)),
+                ('variants', models.JSONField(blank=True, default=dict)),
+                ('position', models.PositiveSmallIntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='images', to='core.archivedproduct')),
+            ],
+            options={
+                'ordering': ['position', 'id'],
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.0 on 2026-10-18 10:20
+
+from django.db import DatabaseError, migrations, transaction
+
+TRIGRAM_INDEX = '''
+CREATE INDEX IF NOT EXISTS product_title_trgm_idx
+    ON core_product USING gin (title gin_trgm_ops)
+    WHERE NOT is_sold;
+'''
+
+
+def create_trigram_index(apps, schema_editor):
+    '''
+    Index unsold titles for product.suggest when pg_trgm can be installed,
+    suggestions fall back to the in-process prefix index otherwise
+    '''
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+    try:
+        with transaction.atomic(using=connection.alias):
+            schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            schema_editor.execute(TRIGRAM_INDEX)
+    except DatabaseError:
+        pass  # Not allowed to create the extension
+
+
+def drop_trigram_index(apps, schema_editor):
+    schema_editor.execute('DROP INDEX IF EXISTS product_title_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_archived_products'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
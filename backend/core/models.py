@@ -6,8 +6,11 @@ from django.contrib.auth.models import (
     BaseUserManager,
     PermissionsMixin,
 )
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
+from django.db import models, transaction
+from django.utils.functional import cached_property
 from mptt.models import MPTTModel, TreeForeignKey
 
 
@@ -49,7 +52,8 @@ class User(AbstractBaseUser, PermissionsMixin):
     phone_number = models.CharField(max_length=20)
     profile_image = models.ImageField(upload_to=user_file_name_uuid,
                                       blank=True,
-                                      null=True)
+                                      null=True,
+                                      db_index=True)
     rating = models.PositiveSmallIntegerField(default=0)
     # Set false when introducing verification functionalities
     is_active = models.BooleanField(default=True)
@@ -60,6 +64,12 @@ class User(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = 'email'
     objects = UserManager()
 
+    def save(self, *args, **kwargs):
+        # A reused profile image stays locked until the row commits,
+        # see core.storage
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     def __str__(self):
         return f'[{self.nickname}] {self.get_full_name}'
 
@@ -174,13 +184,126 @@ class Product(models.Model):
     is_sold = models.BooleanField(default=False)
     hit_cnt = models.IntegerField(default=0)
     bookmark_cnt = models.IntegerField(default=0)
+    # Location denormalized from the city, defaulting to the seller's address.
+    # Plain FK indexes are covered by the location composite indexes below.
+    city = models.ForeignKey(City,
+                             on_delete=models.SET_NULL,
+                             null=True,
+                             blank=True,
+                             db_index=False,
+                             related_name='city_products')
+    county = models.ForeignKey(County,
+                               on_delete=models.SET_NULL,
+                               null=True,
+                               blank=True,
+                               db_index=False,
+                               related_name='county_products')
+    country = models.ForeignKey(Country,
+                                on_delete=models.SET_NULL,
+                                null=True,
+                                blank=True,
+                                db_index=False,
+                                related_name='country_products')
+    # Weighted title(A) & description(B) vector maintained by a DB trigger
+    search_vector = SearchVectorField(null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     modified_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='product_search_vector_gin'),
+            models.Index(fields=['-created_at', '-id'], name='product_created_id_idx'),
+            models.Index(fields=['-bookmark_cnt', '-id'],
+                         name='product_bookmark_cnt_idx'),
+            # Filter (is_sold, category) & sort (price, created_at, bookmark_cnt)
+            models.Index(fields=['price', 'id'], name='product_price_idx'),
+            models.Index(fields=['is_sold', 'price', 'id'],
+                         name='product_sold_price_idx'),
+            models.Index(fields=['is_sold', '-created_at', '-id'],
+                         name='product_sold_created_idx'),
+            models.Index(fields=['is_sold', '-bookmark_cnt', '-id'],
+                         name='product_sold_bookmark_idx'),
+            models.Index(fields=['category', 'price', 'id'],
+                         name='product_cat_price_idx'),
+            models.Index(fields=['category', '-created_at', '-id'],
+                         name='product_cat_created_idx'),
+            models.Index(fields=['category', '-bookmark_cnt', '-id'],
+                         name='product_cat_bookmark_idx'),
+            models.Index(fields=['is_sold', 'category', 'price', 'id'],
+                         name='product_sold_cat_price_idx'),
+            models.Index(fields=['is_sold', 'category', '-created_at', '-id'],
+                         name='product_sold_cat_created_idx'),
+            models.Index(fields=['is_sold', 'category', '-bookmark_cnt', '-id'],
+                         name='product_sold_cat_bookmark_idx'),
+            # ?near= filters, newest first
+            models.Index(fields=['city', '-created_at', '-id'],
+                         name='product_city_created_idx'),
+            models.Index(fields=['county', '-created_at', '-id'],
+                         name='product_county_created_idx'),
+            models.Index(fields=['country', '-created_at', '-id'],
+                         name='product_country_created_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
 
+class ProductTrend(models.Model):
+    '''Trending product ranking, rebuilt periodically by refresh_trending'''
+    product = models.OneToOneField(Product,
+                                   on_delete=models.CASCADE,
+                                   primary_key=True,
+                                   related_name='trend')
+    rank = models.PositiveIntegerField(unique=True)
+    score = models.FloatField()
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['rank']
+
+    def __str__(self):
+        return f'{self.rank}. {self.product.title}'
+
+
+class ProductDailyStats(models.Model):
+    '''Activity of a product per day, rolled up by product.stats'''
+    # Indexed by the (product, date) unique constraint. Without a DB
+    # constraint the stats of archived products stay in the dashboard.
+    product = models.ForeignKey(Product,
+                                on_delete=models.CASCADE,
+                                db_index=False,
+                                db_constraint=False,
+                                related_name='daily_stats')
+    # Denormalized from the product, a seller's stats are one index range
+    seller = models.ForeignKey(User,
+                               on_delete=models.CASCADE,
+                               db_index=False,
+                               related_name='+')
+    date = models.DateField()
+    views = models.IntegerField(default=0)
+    favorites = models.IntegerField(default=0)
+    chat_rooms = models.IntegerField(default=0)
+    reservations = models.IntegerField(default=0)
+    sales = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = 'Product daily stats'
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'date'],
+                                    name='product_stats_product_date_uniq'),
+        ]
+        indexes = [
+            # Covering the dashboard read, served by an index only scan
+            models.Index(fields=['seller', 'date'],
+                         include=['product', 'views', 'favorites', 'chat_rooms',
+                                  'reservations', 'sales'],
+                         name='product_stats_seller_date_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.product_id} on {self.date}'
+
+
 def product_file_name_uuid(instance, filename):
     # Generate file path for new recipe image
     ext = os.path.splitext(filename)[1]  # Extract file's extension
@@ -193,7 +316,13 @@ class ProductImage(models.Model):
     product = models.ForeignKey(Product,
                                 on_delete=models.CASCADE,
                                 related_name='images')
-    image = models.ImageField(upload_to=product_file_name_uuid)
+    image = models.ImageField(upload_to=product_file_name_uuid, db_index=True)
+    # Resized copies {"<width>": {"<format>": "<name>"}}, see product.images
+    variants = models.JSONField(default=dict, blank=True)
+    position = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        ordering = ['position', 'id']
 
     def __str__(self):
         return self.product.title
@@ -213,14 +342,80 @@ class Favorite(models.Model):
 
     class Meta:
         unique_together = ('user', 'product')
+        indexes = [
+            # The user's favorites list, newest first
+            models.Index(fields=['user', '-created_at', '-id'],
+                         name='favorite_user_created_idx'),
+        ]
+
+    def __str__(self):
+        return self.product.title
+
+
+class ArchivedProduct(models.Model):
+    '''
+    Long sold product moved out of Product by product.archive,
+    keeping its id so chat rooms & transactions still resolve it
+    '''
+    id = models.BigIntegerField(primary_key=True)
+    seller = models.ForeignKey(User,
+                               on_delete=models.CASCADE,
+                               related_name='archived_products')
+    category = models.ForeignKey(Category,
+                                 on_delete=models.PROTECT,
+                                 related_name='archived_products')
+    title = models.CharField(max_length=255)
+    price = models.DecimalField(max_digits=5, decimal_places=2)
+    description = models.TextField()
+    is_sold = models.BooleanField(default=True)
+    hit_cnt = models.IntegerField(default=0)
+    bookmark_cnt = models.IntegerField(default=0)
+    # Only looked up by id, no location indexes
+    city = models.ForeignKey(City,
+                             on_delete=models.SET_NULL,
+                             null=True,
+                             db_index=False,
+                             related_name='+')
+    county = models.ForeignKey(County,
+                               on_delete=models.SET_NULL,
+                               null=True,
+                               db_index=False,
+                               related_name='+')
+    country = models.ForeignKey(Country,
+                                on_delete=models.SET_NULL,
+                                null=True,
+                                db_index=False,
+                                related_name='+')
+    created_at = models.DateTimeField()
+    modified_at = models.DateTimeField()
+    archived_at = models.DateTimeField()
+
+    def __str__(self):
+        return self.title
+
+
+class ArchivedProductImage(models.Model):
+    '''Image of an archived product, still referencing its stored files'''
+    id = models.BigIntegerField(primary_key=True)
+    product = models.ForeignKey(ArchivedProduct,
+                                on_delete=models.CASCADE,
+                                related_name='images')
+    image = models.ImageField(upload_to=product_file_name_uuid, db_index=True)
+    variants = models.JSONField(default=dict, blank=True)
+    position = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        ordering = ['position', 'id']
 
     def __str__(self):
         return self.product.title
 
 
 class ChatRoom(models.Model):
+    # No DB constraint, rooms outlive their product's archival (see listing)
     product = models.ForeignKey(Product,
                                 on_delete=models.PROTECT,
+                                db_constraint=False,
                                 related_name='product_chats')
     seller = models.ForeignKey(User,
                                on_delete=models.PROTECT,
@@ -232,9 +427,23 @@ class ChatRoom(models.Model):
 
     class Meta:
         unique_together = ('product', 'seller', 'buyer')
+        indexes = [
+            models.Index(fields=['seller', '-created_at', '-id'],
+                         name='chatroom_seller_created_idx'),
+            models.Index(fields=['buyer', '-created_at', '-id'],
+                         name='chatroom_buyer_created_idx'),
+        ]
 
     def __str__(self):
-        return self.product.title
+        return self.listing.title
+
+    @cached_property
+    def listing(self):
+        '''The product, or its archived copy once archived'''
+        try:
+            return self.product
+        except Product.DoesNotExist:
+            return ArchivedProduct.objects.get(id=self.product_id)
 
 
 class Message(models.Model):
@@ -245,6 +454,12 @@ class Message(models.Model):
     text = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['room', '-created_at', '-id'],
+                         name='message_room_created_idx'),
+        ]
+
     def __str__(self):
         return self.text[:15] + '...' if len(self.text) > 15 else self.text
 
@@ -265,10 +480,16 @@ class DirectTransaction(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     modified_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'],
+                         name='transaction_created_id_idx'),
+        ]
+
     def __str__(self):
         return (f"[S:{self.chatroom.seller.nickname} "
                 f"B:{self.chatroom.buyer.nickname}] "
-                f"- {self.chatroom.product.title}")
+                f"- {self.chatroom.listing.title}")
 
 
 class Review(models.Model):
@@ -286,7 +507,12 @@ class Review(models.Model):
                                                   MaxValueValidator(5)])
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='review_created_id_idx'),
+        ]
+
     def __str__(self):
         return (f"[{self.reviewer.nickname} -> "
                 f"{self.receiver.nickname}] "
-                f"{self.transaction.chatroom.product.title}")
+                f"{self.transaction.chatroom.listing.title}")
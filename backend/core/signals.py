@@ -0,0 +1,47 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core.models import ProductImage, User
+from core.storage import release_file
+
+
+def release_on_commit(name, storage, derived=()):
+    # Only release once the reference is really gone
+    if name:
+        transaction.on_commit(lambda: release_file(name, derived, storage))
+
+
+@receiver(post_delete, sender=ProductImage)
+def release_product_image(sender, instance, **kwargs):
+    '''Release the image, and its variants, of a removed product image'''
+    variants = [name
+                for formats in instance.variants.values()
+                for name in formats.values()]
+    release_on_commit(instance.image.name, instance.image.storage, variants)
+
+
+@receiver(pre_save, sender=User)
+def remember_profile_image(sender, instance, update_fields=None, **kwargs):
+    '''Remember the stored profile image to release it once replaced'''
+    instance._stored_profile_image = None
+    if instance.pk is None:
+        return
+    if update_fields is not None and 'profile_image' not in update_fields:
+        return
+    instance._stored_profile_image = (User.objects
+                                      .filter(pk=instance.pk)
+                                      .values_list('profile_image', flat=True)
+                                      .first())
+
+
+@receiver(post_save, sender=User)
+def release_replaced_profile_image(sender, instance, **kwargs):
+    stored = getattr(instance, '_stored_profile_image', None)
+    if stored != instance.profile_image.name:
+        release_on_commit(stored, instance.profile_image.storage)
+
+
+@receiver(post_delete, sender=User)
+def release_deleted_profile_image(sender, instance, **kwargs):
+    release_on_commit(instance.profile_image.name, instance.profile_image.storage)
@@ -0,0 +1,95 @@
+'''
+Content addressed, deduplicated media storage.
+Files are named by the sha256 of their bytes, sharded under the directory
+the model's upload_to gives, e.g. uploads/products/ab/cd/<sha256>.jpg.
+Saving bytes which are already stored skips the write and reuses the name,
+and a file is only deleted once no row references it anymore.
+Reusing a name and releasing it are serialized with an advisory lock on
+the name, held until the transactions commit: save files in the
+transaction creating the row referencing them.
+'''
+import hashlib
+import os
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import connection, transaction
+
+# Trailing ab/cd shard directories of an already content addressed name
+SHARD_DIRS = re.compile(r'(/[0-9a-f]{2}){2}$')
+
+
+def hash_content(content):
+    '''Return the sha256 hex digest of a file, read in chunks'''
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+def lock_name(name, shared=False):
+    '''
+    Take the transaction scoped advisory lock of a stored name, shared by
+    the writers reusing it, exclusive for releasing it. Postgres only.
+    '''
+    if connection.vendor != 'postgresql':
+        return
+    key = int.from_bytes(hashlib.sha256(name.encode()).digest()[:8], 'big',
+                         signed=True)
+    function = 'pg_advisory_xact_lock_shared' if shared else 'pg_advisory_xact_lock'
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT {function}(%s)', [key])
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    '''File system storage naming files by content hash'''
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+
+        digest = hash_content(content)
+        directory, filename = os.path.split(name.replace('\\', '/'))
+        # Files derived from a stored file are sharded from the same root
+        directory = SHARD_DIRS.sub('', directory)
+        extension = os.path.splitext(filename)[1].lower()
+        name = '/'.join(filter(None, [directory, digest[:2], digest[2:4],
+                                      f'{digest}{extension}']))
+
+        # Kept until the referencing row commits, so a concurrent release
+        # either deletes the file before the check or sees the new row
+        lock_name(name, shared=True)
+        if self.exists(name):
+            return name  # Same bytes already stored
+        return super().save(name, content, max_length=max_length)
+
+
+def is_referenced(name):
+    '''Whether any product image, archived or not, or profile image uses the file'''
+    from core.models import ArchivedProductImage, ProductImage, User
+
+    return (ProductImage.objects.filter(image=name).exists()
+            or ArchivedProductImage.objects.filter(image=name).exists()
+            or User.objects.filter(profile_image=name).exists())
+
+
+def release_file(name, derived=(), storage=default_storage):
+    '''
+    Delete a file, and the files derived from it (e.g. image variants),
+    once no row references it anymore.
+    '''
+    if not name:
+        return False
+    with transaction.atomic():
+        # Waiting for the transactions reusing the file to commit
+        lock_name(name)
+        if is_referenced(name):
+            return False
+        storage.delete(name)
+        for derived_name in derived:
+            storage.delete(derived_name)
+    return True
@@ -2,13 +2,29 @@
     Test custom Django management commands.
 '''
 
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
 from unittest.mock import patch
 
-from django.core.management import call_command
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
 from psycopg2 import OperationalError as Psycopg2OpError
 
+from core.models import (
+    ArchivedProduct,
+    Category,
+    Favorite,
+    Product,
+    ProductDailyStats,
+    ProductTrend,
+)
+from product.counters import LocalHitCounterBackend, get_hit_counter
+
 
 @patch('core.management.commands.wait_for_db.Command.check')
 class CommandTests(SimpleTestCase):
@@ -27,3 +43,253 @@ class CommandTests(SimpleTestCase):
         call_command('wait_for_db')
         self.assertEqual(patched_check.call_count, 6)
         patched_check.assert_called_with(databases=['default'])
+
+
+class SharedHitCounterBackend(LocalHitCounterBackend):
+    """In memory stand-in for a shared backend like redis"""
+    shared = True
+
+
+class FlushHitCountsCommandTests(TestCase):
+    """Test flushing the product hit buffer"""
+
+    def test_process_local_backend_rejected(self):
+        """Test the command refusing a buffer only serving processes hold"""
+        with self.assertRaisesMessage(CommandError, 'LocalHitCounterBackend'):
+            call_command('flush_hit_counts', stdout=StringIO())
+
+    @override_settings(HIT_COUNTER={
+        'BACKEND': 'core.tests.test_commands.SharedHitCounterBackend',
+        'FLUSH_INTERVAL': 3600})
+    def test_flush_hit_counts(self):
+        """Test buffered hits written with batched updates"""
+        user = get_user_model().objects.create_user('user@example.com', 'test123')
+        category = Category.objects.create(name='Test Category')
+        products = [Product.objects.create(seller=user,
+                                           category=category,
+                                           title=f'product_{i}',
+                                           price=Decimal('10.00'),
+                                           description='test description')
+                    for i in range(3)]
+        counter = get_hit_counter()
+        for product, hits in zip(products, [2, 2, 5]):
+            for _ in range(hits):
+                counter.incr(product.id)
+        # Nothing written before the flush
+        self.assertEqual(Product.objects.filter(hit_cnt__gt=0).count(), 0)
+
+        out = StringIO()
+        # savepoint, 2 UPDATEs, daily stats upsert, release
+        with self.assertNumQueries(5):
+            call_command('flush_hit_counts', stdout=out)
+
+        self.assertIn('Flushed 9 hits of 3 products in 2 queries', out.getvalue())
+        self.assertEqual([p.hit_cnt for p in Product.objects.order_by('id')],
+                         [2, 2, 5])
+
+
+class ReconcileCountersCommandTests(TestCase):
+    """Test recomputing drifted product counters"""
+
+    def test_reconcile_bookmark_cnt(self):
+        """Test drifted bookmark counts fixed batch by batch"""
+        user = get_user_model().objects.create_user('user@example.com', 'test123')
+        other = get_user_model().objects.create_user('other@example.com', 'test123')
+        category = Category.objects.create(name='Test Category')
+        products = [Product.objects.create(seller=user,
+                                           category=category,
+                                           title=f'product_{i}',
+                                           price=Decimal('10.00'),
+                                           description='test description')
+                    for i in range(5)]
+        Favorite.objects.create(user=user, product=products[0])
+        Favorite.objects.create(user=other, product=products[0])
+        Favorite.objects.create(user=user, product=products[3])
+        Product.objects.filter(id=products[1].id).update(bookmark_cnt=7)
+        Product.objects.filter(id=products[3].id).update(bookmark_cnt=1)
+
+        out = StringIO()
+        call_command('reconcile_counters', batch_size=2, stdout=out)
+
+        self.assertIn('Checked 5 products, fixed 2 bookmark counts', out.getvalue())
+        self.assertEqual([p.bookmark_cnt for p in Product.objects.order_by('id')],
+                         [2, 0, 0, 1, 0])
+
+
+class RefreshTrendingCommandTests(TestCase):
+    """Test rebuilding the trending products ranking"""
+
+    def test_refresh_trending(self):
+        """Test products with signals ranked"""
+        user = get_user_model().objects.create_user('user@example.com', 'test123')
+        category = Category.objects.create(name='Test Category')
+        for hit_cnt in (0, 3, 7):
+            Product.objects.create(seller=user,
+                                   category=category,
+                                   title='test_product',
+                                   price=Decimal('10.00'),
+                                   description='test description',
+                                   hit_cnt=hit_cnt)
+
+        out = StringIO()
+        call_command('refresh_trending', stdout=out)
+
+        self.assertIn('Ranked 2 trending products', out.getvalue())
+        self.assertEqual(list(ProductTrend.objects.values_list('product__hit_cnt',
+                                                               flat=True)),
+                         [7, 3])
+
+
+class UpdateSimilarIndexCommandTests(TestCase):
+    """Test updating the similar products index"""
+
+    def test_update_similar_index(self):
+        """Test a full build, then an incremental update"""
+        user = get_user_model().objects.create_user('user@example.com', 'test123')
+        category = Category.objects.create(name='Test Category')
+        for title in ('Road bike', 'Gravel bike'):
+            Product.objects.create(seller=user,
+                                   category=category,
+                                   title=title,
+                                   price=Decimal('10.00'),
+                                   description='test description')
+
+        with tempfile.TemporaryDirectory() as index_dir, \
+                override_settings(PRODUCT_SIMILAR={'INDEX_DIR': index_dir}):
+            out = StringIO()
+            call_command('update_similar_index', stdout=out)
+            call_command('update_similar_index', stdout=out)
+
+        self.assertIn('Rebuilt similar index: 2 products, 2 vectorized',
+                      out.getvalue())
+        self.assertIn('Updated similar index: 2 products, 0 vectorized',
+                      out.getvalue())
+
+
+class BenchmarkProductListCommandTests(TestCase):
+    """Test the product list benchmark"""
+
+    def test_benchmark_product_list(self):
+        """Test every field selection reported"""
+        out = StringIO()
+        call_command('benchmark_product_list', requests=1, fields=['id,title'],
+                     stdout=out)
+
+        lines = out.getvalue().splitlines()
+        self.assertEqual([line.split(':')[0] for line in lines],
+                         ['card', 'full', 'id,title'])
+        self.assertIn('rows/s', lines[0])
+        # Measured past the anonymous list cache
+        self.assertNotIn(' 0 queries/page', out.getvalue())
+
+    def test_benchmark_values_serializers(self):
+        """Test every case reported per page size with identical JSON"""
+        Product.objects.create(
+            seller=get_user_model().objects.create_user(email='user@example.com',
+                                                        password='test123123123'),
+            category=Category.objects.create(name='Test Category'),
+            title='test_product',
+            price=Decimal('10.00'),
+            description='test description')
+        out, err = StringIO(), StringIO()
+        call_command('benchmark_values_serializers', requests=1, page_sizes=[5],
+                     stdout=out, stderr=err)
+
+        lines = out.getvalue().splitlines()
+        self.assertEqual([line.split(':')[0] for line in lines],
+                         ['product card x5', 'product full x5',
+                          'message x5', 'transaction x5'])
+        self.assertIn('ms/page', lines[0])
+        self.assertEqual(err.getvalue(), '')
+
+
+class RebuildProductStatsCommandTests(TestCase):
+    """Test recomputing the product daily stats"""
+
+    def test_rebuild_product_stats(self):
+        """Test drifted stats recomputed, views kept & empty rows removed"""
+        user = get_user_model().objects.create_user('user@example.com', 'test123')
+        other = get_user_model().objects.create_user('other@example.com', 'test123')
+        category = Category.objects.create(name='Test Category')
+        products = [Product.objects.create(seller=user,
+                                           category=category,
+                                           title=f'product_{i}',
+                                           price=Decimal('10.00'),
+                                           description='test description')
+                    for i in range(3)]
+        Favorite.objects.create(user=user, product=products[0])
+        Favorite.objects.create(user=other, product=products[0])
+        today = timezone.localdate()
+        ProductDailyStats.objects.create(product=products[0], seller=user,
+                                         date=today, views=4, favorites=9)
+        ProductDailyStats.objects.create(product=products[1], seller=user,
+                                         date=today, favorites=1)
+        ProductDailyStats.objects.create(product=products[2], seller=user,
+                                         date=today, views=3, favorites=1)
+
+        out = StringIO()
+        call_command('rebuild_product_stats', days=7, stdout=out)
+
+        self.assertIn('Rebuilt 1 daily product stats', out.getvalue())
+        self.assertEqual(list(ProductDailyStats.objects
+                              .order_by('product_id')
+                              .values_list('product_id', 'views', 'favorites')),
+                         [(products[0].id, 4, 2), (products[2].id, 3, 0)])
+
+
+class ArchiveSoldProductsCommandTests(TestCase):
+    """Test archiving long sold products"""
+
+    def test_archive_sold_products(self):
+        """Test only products sold before the cutoff archived, in batches"""
+        user = get_user_model().objects.create_user('user@example.com', 'test123')
+        category = Category.objects.create(name='Test Category')
+        products = [Product.objects.create(seller=user,
+                                           category=category,
+                                           title=f'product_{i}',
+                                           price=Decimal('10.00'),
+                                           description='test description',
+                                           is_sold=i < 3)
+                    for i in range(4)]
+        Product.objects.filter(id__in=[p.id for p in products[:2]]).update(
+            modified_at=timezone.now() - timedelta(days=31))
+
+        out = StringIO()
+        call_command('archive_sold_products', days=30, batch_size=1, stdout=out)
+
+        self.assertIn('Archived 2 products & 0 images', out.getvalue())
+        self.assertEqual(list(Product.objects.order_by('id')), products[2:])
+        self.assertEqual(list(ArchivedProduct.objects.order_by('id')
+                              .values_list('id', flat=True)),
+                         [products[0].id, products[1].id])
+
+
+class ImportProductsCommandTests(TestCase):
+    """Test importing products from a file"""
+
+    def setUp(self):
+        self.seller = get_user_model().objects.create_user(email='user@example.com',
+                                                           password='test123123123')
+        Category.objects.create(name='Books')
+
+    def test_import_products(self):
+        """Test valid rows imported & invalid ones reported"""
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as file:
+            file.write('title,price,description,category\n'
+                       'novel,5.00,a novel,books\n'
+                       'toy,5.00,a toy,toys\n')
+            file.flush()
+            out, err = StringIO(), StringIO()
+            call_command('import_products', file.name, seller='user@example.com',
+                         stdout=out, stderr=err)
+
+        self.assertEqual(list(Product.objects.values_list('title', flat=True)),
+                         ['novel'])
+        self.assertIn('Imported 1 of 2 rows (1 errors)', out.getvalue())
+        self.assertIn('rows/s', out.getvalue())
+        self.assertEqual(err.getvalue(), 'line 3: category: Unknown category.\n')
+
+    def test_unknown_seller(self):
+        """Test an error raised for an unknown seller email"""
+        with self.assertRaises(CommandError):
+            call_command('import_products', 'products.csv', seller='no@example.com')
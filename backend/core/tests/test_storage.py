@@ -0,0 +1,166 @@
+'''
+    Test content addressed media storage.
+'''
+import os
+import shutil
+import tempfile
+import threading
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from core.models import Category, Product, ProductImage
+from core.storage import ContentAddressedStorage, release_file
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def tearDownModule():
+    shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ContentAddressedStorageTests(TestCase):
+    """Test deduplicating files by content"""
+
+    def setUp(self):
+        self.storage = ContentAddressedStorage()
+        self.user = get_user_model().objects.create_user('user@example.com',
+                                                         'test123')
+        category = Category.objects.create(name='Test Category')
+        self.product = Product.objects.create(seller=self.user,
+                                              category=category,
+                                              title='test_product',
+                                              price=Decimal('10.00'),
+                                              description='test description')
+
+    def test_name_by_content_hash(self):
+        """Test files named after their sha256 in sharded directories"""
+        name = self.storage.save('uploads/products/photo.JPG',
+                                 ContentFile(b'abc'))
+
+        digest = 'ba7816bf8f01cfea414140de5dae2223b00361a396177a9cb410ff61f20015ad'
+        self.assertEqual(name, f'uploads/products/ba/78/{digest}.jpg')
+        self.assertTrue(self.storage.exists(name))
+
+    def test_same_content_stored_once(self):
+        """Test saving identical bytes reusing the stored file"""
+        first = self.storage.save('uploads/products/a.jpg', ContentFile(b'same'))
+        second = self.storage.save('uploads/products/b.jpg', ContentFile(b'same'))
+        derived = self.storage.save(f'{os.path.splitext(first)[0]}_160w.webp',
+                                    ContentFile(b'derived'))
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(os.listdir(os.path.dirname(self.storage.path(first)))), 1)
+        # Derived names re-sharded from the upload directory, not nested
+        self.assertTrue(derived.startswith('uploads/products/'))
+        self.assertEqual(derived.count('/'), 4)
+
+    def test_file_deleted_with_last_reference(self):
+        """Test a shared file kept until its last product image is removed"""
+        images = [ProductImage.objects.create(
+            product=self.product,
+            image=SimpleUploadedFile('photo.jpg', b'photo bytes'))
+            for _ in range(2)]
+        name = images[0].image.name
+        self.assertEqual(images[1].image.name, name)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            images[0].delete()
+        self.assertTrue(self.storage.exists(name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            images[1].delete()
+        self.assertFalse(self.storage.exists(name))
+
+    def test_replaced_profile_image_released(self):
+        """Test the previous profile image deleted once replaced"""
+        self.user.profile_image = SimpleUploadedFile('me.jpg', b'old face')
+        self.user.save()
+        old = self.user.profile_image.name
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.profile_image = SimpleUploadedFile('me.jpg', b'new face')
+            self.user.save()
+
+        self.assertFalse(self.storage.exists(old))
+        self.assertTrue(self.storage.exists(self.user.profile_image.name))
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ConcurrentReuseTests(TransactionTestCase):
+    """Test reusing stored bytes while they are being released"""
+
+    def test_release_waits_for_reuse(self):
+        """Test a file reused by an uncommitted row not deleted under it"""
+        storage = ContentAddressedStorage()
+        user = get_user_model().objects.create_user('user@example.com', 'test123')
+        product = Product.objects.create(seller=user,
+                                         category=Category.objects.create(name='C'),
+                                         title='test_product',
+                                         price=Decimal('10.00'),
+                                         description='test description')
+        # Stored, but its last reference just went away
+        name = storage.save('uploads/products/a.jpg', ContentFile(b'shared'))
+        reused, commit = threading.Event(), threading.Event()
+
+        def upload():
+            try:
+                with transaction.atomic():
+                    ProductImage.objects.create(
+                        product=product,
+                        image=SimpleUploadedFile('b.jpg', b'shared'))
+                    reused.set()
+                    commit.wait(5)
+            finally:
+                connection.close()
+
+        def release():
+            try:
+                release_file(name, storage=storage)
+            finally:
+                connection.close()
+
+        uploader = threading.Thread(target=upload)
+        releaser = threading.Thread(target=release)
+        uploader.start()
+        self.assertTrue(reused.wait(5))
+        releaser.start()
+        releaser.join(0.5)
+        self.assertTrue(releaser.is_alive())  # Waiting for the upload
+
+        commit.set()
+        uploader.join(5)
+        releaser.join(5)
+
+        self.assertEqual(ProductImage.objects.get().image.name, name)
+        self.assertTrue(storage.exists(name))
+
+
+class MediaDedupeReportCommandTests(TestCase):
+    """Test reporting duplicated media bytes"""
+
+    def test_media_dedupe_report(self):
+        """Test bytes taken by duplicate files reported"""
+        with tempfile.TemporaryDirectory() as media:
+            os.makedirs(os.path.join(media, 'products'))
+            for name, content in [('a.jpg', b'x' * 100),
+                                  ('products/b.jpg', b'x' * 100),
+                                  ('products/c.jpg', b'x' * 100),
+                                  ('products/d.jpg', b'y' * 50)]:
+                with open(os.path.join(media, name), 'wb') as file:
+                    file.write(content)
+
+            out = StringIO()
+            call_command('media_dedupe_report', path=media, stdout=out)
+
+        output = out.getvalue()
+        self.assertIn('Files: 4 (350 bytes)', output)
+        self.assertIn('Unique contents: 2 (150 bytes)', output)
+        self.assertIn('Bytes saved by deduplication: 200 (57.1%)', output)
@@ -0,0 +1,146 @@
+'''
+Hot/cold split of sold products.
+Products sold & left unmodified for AFTER_DAYS are moved, with their
+images, to ArchivedProduct & ArchivedProductImage under the same ids,
+so the product table & its many indexes only hold live listings.
+Chat rooms keep their product id and resolve it through ChatRoom.listing,
+transactions & reviews through their chat room, daily stats are kept.
+Favorites & the trending rank of archived products are dropped.
+Configured with the PRODUCT_ARCHIVE setting:
+- AFTER_DAYS: days a product stays sold before being archived
+- BATCH_SIZE: products moved per transaction
+'''
+import time
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.models import (
+    ArchivedProduct,
+    ArchivedProductImage,
+    Favorite,
+    Product,
+    ProductImage,
+    ProductTrend,
+)
+from product import list_cache
+
+DEFAULTS = {
+    'AFTER_DAYS': 90,
+    'BATCH_SIZE': 500,
+}
+
+ArchiveStats = namedtuple('ArchiveStats', ['products', 'images', 'duration'])
+
+
+def get_options():
+    return {**DEFAULTS, **getattr(settings, 'PRODUCT_ARCHIVE', {})}
+
+
+def _copy_rows(source, target, key, ids, extra=None):
+    '''
+    Copy the source model's rows whose key is in ids to the target model,
+    column by column, returning the number of rows copied.
+    extra gives {column: value} of target columns the source lacks.
+    '''
+    extra = extra or {}
+    columns = [field.column for field in target._meta.concrete_fields
+               if field.column not in extra]
+    names = ', '.join(columns + list(extra))
+    selected = ', '.join(columns + ['%s'] * len(extra))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {target._meta.db_table} ({names}) '
+            f'SELECT {selected} FROM {source._meta.db_table} '
+            f'WHERE {key} = ANY(%s)',
+            [*extra.values(), ids])
+        return cursor.rowcount
+
+
+def _delete_rows(model, key, ids):
+    # Without the ORM's collector & signals, which would release the
+    # image files the archive still uses and refuse PROTECTed chat rooms
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {model._meta.db_table} WHERE {key} = ANY(%s)',
+                       [ids])
+
+
+def archive_products(product_ids, now=None):
+    '''
+    Move the products & their images to the archive in one transaction,
+    returning the (products, images) moved.
+    '''
+    now = now or timezone.now()
+    ids = sorted(product_ids)
+    with transaction.atomic():
+        products = _copy_rows(Product, ArchivedProduct, 'id', ids,
+                              extra={'archived_at': now})
+        images = _copy_rows(ProductImage, ArchivedProductImage, 'product_id', ids)
+        Favorite.objects.filter(product_id__in=ids).delete()
+        ProductTrend.objects.filter(product_id__in=ids).delete()
+        _delete_rows(ProductImage, 'product_id', ids)
+        _delete_rows(Product, 'id', ids)
+    return products, images
+
+
+def get_archivable_ids(before, limit):
+    '''
+    Lock & return up to limit ids of products sold & unmodified since before,
+    skipping rows another transaction holds
+    '''
+    return list(Product.objects
+                .filter(is_sold=True, modified_at__lt=before)
+                .order_by('id')
+                .select_for_update(skip_locked=True)
+                .values_list('id', flat=True)[:limit])
+
+
+def archive_sold_products(after_days=None, batch_size=None, now=None):
+    '''Archive every product sold for after_days, returning ArchiveStats'''
+    options = get_options()
+    after_days = options['AFTER_DAYS'] if after_days is None else after_days
+    batch_size = batch_size or options['BATCH_SIZE']
+    now = now or timezone.now()
+    before = now - timedelta(days=after_days)
+    start = time.perf_counter()
+    stats = {'products': 0, 'images': 0}
+
+    while True:
+        with transaction.atomic():
+            ids = get_archivable_ids(before, batch_size)
+            if not ids:
+                break
+            products, images = archive_products(ids, now=now)
+        stats['products'] += products
+        stats['images'] += images
+
+    if stats['products']:
+        # Raw deletes send no post_delete signals
+        list_cache.invalidate('product')
+    return ArchiveStats(duration=time.perf_counter() - start, **stats)
+
+
+def get_listings(product_ids, *fields):
+    '''
+    Return {product id: {field: value}} of the products,
+    looked up in the archive for the ones not found
+    '''
+    rows = Product.objects.filter(id__in=product_ids).values('id', *fields)
+    listings = {row['id']: row for row in rows}
+    missing = set(product_ids) - set(listings)
+    if missing:
+        rows = ArchivedProduct.objects.filter(id__in=missing).values('id', *fields)
+        listings.update((row['id'], row) for row in rows)
+    return listings
+
+
+def get_archived_product(product_id):
+    '''Return the archived product with its images, or None'''
+    return (ArchivedProduct.objects
+            .select_related('seller', 'category')
+            .prefetch_related('images')
+            .filter(id=product_id)
+            .first())
@@ -0,0 +1,199 @@
+'''
+Category tree helpers.
+The whole MPTT tree is loaded with a single tree_id/lft ordered query,
+and kept in process until the shared tree version changes.
+Any category save, delete or move bumps the version (see product.signals).
+The version expires after TREE_VERSION_TIMEOUT, so with a process local
+cache, changes made by other processes show up within that window.
+'''
+import hashlib
+import json
+import time
+
+from django.core.cache import cache
+
+from core.models import Category
+
+TREE_VERSION_KEY = 'category_tree_version'
+# Seconds the version lives, bounding how stale another process' tree gets
+TREE_VERSION_TIMEOUT = 60
+
+# {version: {cache key: value}} only ever holding the current version
+_local_cache = {}
+
+
+def get_tree_version():
+    '''Return the current category tree version shared between processes'''
+    version = cache.get(TREE_VERSION_KEY)
+    if version is None:
+        # Time based seed so a lost version never reuses an old number
+        cache.add(TREE_VERSION_KEY, time.time_ns(), TREE_VERSION_TIMEOUT)
+        version = cache.get(TREE_VERSION_KEY)
+    return version
+
+
+def bump_tree_version():
+    '''Invalidate every cached tree in all processes'''
+    try:
+        cache.incr(TREE_VERSION_KEY)
+    except ValueError:
+        cache.set(TREE_VERSION_KEY, time.time_ns(), TREE_VERSION_TIMEOUT)
+
+
+def _cached(key, build):
+    # Memoize build() in process for the current tree version
+    version = get_tree_version()
+    entries = _local_cache.get(version)
+    if entries is None:
+        _local_cache.clear()
+        entries = _local_cache[version] = {}
+    if key not in entries:
+        entries[key] = build()
+    return entries[key]
+
+
+def get_category_nodes():
+    '''Return {id: node} of every category in tree order from one query'''
+    def build():
+        rows = (Category.objects
+                .order_by('tree_id', 'lft')
+                .values('id', 'name', 'parent_id', 'is_active',
+                        'tree_id', 'lft', 'rght', 'level'))
+        return {row['id']: row for row in rows}
+
+    return _cached('nodes', build)
+
+
+def get_tree_height():
+    '''Return the number of levels of the deepest branch, 0 without categories'''
+    def build():
+        return max((node['level'] + 1 for node in get_category_nodes().values()),
+                   default=0)
+
+    return _cached('height', build)
+
+
+def _clamp_depth(depth):
+    # Any depth reaching the deepest level is the whole tree, cached once
+    if depth is not None and depth >= get_tree_height():
+        return None
+    return depth
+
+
+def _serialize(nodes, node_id, depth):
+    node = nodes[node_id]
+    children = []
+    if depth is None or depth > 1:
+        child_depth = None if depth is None else depth - 1
+        children = [_serialize(nodes, child_id, child_depth)
+                    for child_id in node['children']]
+    return {
+        'id': node['id'],
+        'name': node['name'],
+        'parent': node['parent_id'],
+        'children': children,
+    }
+
+
+def get_category_tree(root=None, depth=None):
+    '''
+    Return the serialized tree in CategorySerializer's nested shape.
+    - root: category id to start from, the root nodes are used otherwise.
+    - depth: number of levels to include, unlimited when None.
+    Raise Category.DoesNotExist for an unknown root.
+    '''
+    depth = _clamp_depth(depth)
+
+    def build():
+        nodes = get_category_nodes()
+        # Link children in tree order, parents always come first
+        linked = {node_id: dict(node, children=[]) for node_id, node in nodes.items()}
+        for node in linked.values():
+            if node['parent_id'] is not None:
+                linked[node['parent_id']]['children'].append(node['id'])
+
+        if root is None:
+            start = [node['id'] for node in linked.values()
+                     if node['parent_id'] is None]
+        elif root in linked:
+            start = [root]
+        else:
+            raise Category.DoesNotExist(f'Category {root} does not exist')
+        return [_serialize(linked, node_id, depth) for node_id in start]
+
+    return _cached(('tree', root, depth), build)
+
+
+def get_category_tree_etag(root=None, depth=None):
+    '''
+    Digest of the serialized tree, the same in every process for the same
+    tree. Raise Category.DoesNotExist for an unknown root.
+    '''
+    depth = _clamp_depth(depth)
+
+    def build():
+        tree = get_category_tree(root=root, depth=depth)
+        return hashlib.sha1(json.dumps(tree, sort_keys=True).encode()).hexdigest()
+
+    return _cached(('etag', root, depth), build)
+
+
+def get_category_path(category_id):
+    '''Return the nodes from the root down to the category, empty if unknown'''
+    if category_id not in get_category_nodes():
+        return []
+
+    def build():
+        nodes = get_category_nodes()
+        path = []
+        node = nodes.get(category_id)
+        while node is not None:
+            path.append(node)
+            node = nodes.get(node['parent_id'])
+        return path[::-1]
+
+    return _cached(('path', category_id), build)
+
+
+def get_descendant_ids(category_id):
+    '''
+    Return ids of the category and all of its descendants, resolved from
+    the node's tree_id/lft/rght range. Inactive nodes are skipped together
+    with their whole subtree. Unknown ids resolve to an empty list.
+    '''
+    if category_id not in get_category_nodes():
+        # Not memoized, any number of unknown ids could be requested
+        return []
+
+    def build():
+        nodes = get_category_nodes()
+        node = nodes.get(category_id)
+        if node is None:
+            return []  # Removed since checked
+
+        ids = []
+        skip_rght = None  # rght of the inactive subtree being skipped
+        for other in nodes.values():
+            if (other['tree_id'] != node['tree_id']
+                    or not node['lft'] <= other['lft'] < node['rght']):
+                continue
+            if skip_rght is not None and other['lft'] < skip_rght:
+                continue
+            if not other['is_active']:
+                skip_rght = other['rght']
+                continue
+            ids.append(other['id'])
+        return ids
+
+    return _cached(('descendants', category_id), build)
+
+
+def get_category_lookup():
+    '''Return {case folded name: [ids]} of every category'''
+    def build():
+        lookup = {}
+        for node_id, node in get_category_nodes().items():
+            lookup.setdefault(node['name'].casefold(), []).append(node_id)
+        return lookup
+
+    return _cached('lookup', build)
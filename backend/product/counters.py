@@ -0,0 +1,216 @@
+'''
+Write-behind buffer for Product.hit_cnt.
+Detail views are aggregated per product in a pluggable backend, and flushed
+in batches with one `UPDATE ... SET hit_cnt = hit_cnt + n` per distinct n,
+adding the views to the products' daily stats in the same transaction.
+Configured with the HIT_COUNTER setting:
+- BACKEND: dotted path of the buffer backend
+- FLUSH_INTERVAL: seconds between flushes, bounding the views lost on a crash
+- MAX_PENDING: number of buffered products forcing an early flush
+- LOCATION: redis url for RedisHitCounterBackend
+
+Serving processes flush from a background thread every FLUSH_INTERVAL,
+started by start_hit_counter_flusher() in the WSGI & ASGI entrypoints,
+and on exit. A failed flush is logged and its hits kept for the next one.
+'''
+import atexit
+import logging
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict, namedtuple
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from core.models import Product
+from product import stats as product_stats
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BACKEND': 'product.counters.LocalHitCounterBackend',
+    'FLUSH_INTERVAL': 10,
+    'MAX_PENDING': 1000,
+}
+
+FlushStats = namedtuple('FlushStats', ['products', 'hits', 'queries', 'duration'])
+
+
+class LocalHitCounterBackend:
+    '''Buffering pending hits in process memory'''
+    # Only the process buffering the hits can flush them
+    shared = False
+
+    def __init__(self, options):
+        self._pending = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, counts):
+        '''Add {product_id: hits}, returning the number of buffered products'''
+        with self._lock:
+            self._pending.update(counts)
+            return len(self._pending)
+
+    def drain(self):
+        '''Remove & return every buffered {product_id: hits}'''
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+        return pending
+
+
+class RedisHitCounterBackend:
+    '''
+    Buffering pending hits in a redis hash shared by all processes,
+    so views survive process restarts and any process can flush them.
+    '''
+    key = 'product:hit_cnt'
+    shared = True
+
+    def __init__(self, options):
+        import redis
+
+        self.client = redis.Redis.from_url(options['LOCATION'])
+        self.response_error = redis.ResponseError
+
+    def add(self, counts):
+        pipe = self.client.pipeline()
+        for product_id, hits in counts.items():
+            pipe.hincrby(self.key, product_id, hits)
+        pipe.hlen(self.key)
+        return pipe.execute()[-1]
+
+    def drain(self):
+        # Renaming is atomic, hits arriving meanwhile go to a fresh hash
+        draining = f'{self.key}:draining:{uuid.uuid4().hex}'
+        try:
+            self.client.rename(self.key, draining)
+        except self.response_error:
+            return Counter()  # Nothing buffered
+        pipe = self.client.pipeline()
+        pipe.hgetall(draining)
+        pipe.delete(draining)
+        pending = pipe.execute()[0]
+        return Counter({int(product_id): int(hits)
+                        for product_id, hits in pending.items()})
+
+
+class HitCounter:
+    '''Aggregating product hits and flushing them to the DB periodically'''
+
+    def __init__(self, backend, flush_interval, max_pending):
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._flusher = None
+        self._stopped = threading.Event()
+
+    def incr(self, product_id, hits=1):
+        pending = self.backend.add({product_id: hits})
+        if pending >= self.max_pending:
+            self.flush_quietly()
+
+    def start(self):
+        '''Flush every flush_interval from a daemon thread, and on exit'''
+        if self._flusher is not None:
+            return
+        self._flusher = threading.Thread(target=self._run,
+                                         name='hit-counter-flusher',
+                                         daemon=True)
+        self._flusher.start()
+        atexit.register(self.flush_quietly)
+
+    def stop(self):
+        '''Stop the flusher thread, without a final flush'''
+        if self._flusher is None:
+            return
+        self._stopped.set()
+        self._flusher.join()
+        atexit.unregister(self.flush_quietly)
+        self._flusher = None
+        self._stopped.clear()
+
+    def _run(self):
+        while not self._stopped.wait(self.flush_interval):
+            self.flush_quietly()
+            # The thread's own connection, closed past CONN_MAX_AGE
+            close_old_connections()
+
+    def flush_quietly(self):
+        '''
+        Flush, logging instead of raising the errors, so a failed flush
+        never fails a product view. Hits of a failed flush are kept.
+        '''
+        try:
+            return self.flush()
+        except Exception:
+            logger.exception('Flushing product hits failed, kept for the next flush')
+            return None
+
+    def flush(self):
+        '''Write buffered hits with batched F() updates, returning FlushStats'''
+        pending = self.backend.drain()
+        if not pending:
+            return FlushStats(0, 0, 0, 0.0)
+
+        # Group products by increment so each distinct increment is one UPDATE
+        by_hits = defaultdict(list)
+        for product_id, hits in pending.items():
+            by_hits[hits].append(product_id)
+
+        start = time.perf_counter()
+        try:
+            with transaction.atomic():
+                for hits, product_ids in sorted(by_hits.items()):
+                    (Product.objects
+                     .filter(id__in=sorted(product_ids))
+                     .update(hit_cnt=F('hit_cnt') + hits))
+                product_stats.record_many({product_id: {'views': hits}
+                                           for product_id, hits in pending.items()})
+        except Exception:
+            # Put the hits back to retry on the next flush
+            self.backend.add(pending)
+            raise
+        duration = time.perf_counter() - start
+
+        stats = FlushStats(products=len(pending),
+                           hits=sum(pending.values()),
+                           queries=len(by_hits),
+                           duration=duration)
+        logger.info('Flushed %d hits of %d products in %d queries (%.1f ms)',
+                    stats.hits, stats.products, stats.queries, duration * 1000)
+        return stats
+
+
+_hit_counter = None
+_hit_counter_lock = threading.Lock()
+
+
+def get_hit_counter():
+    '''Return the process wide HitCounter built from the HIT_COUNTER setting'''
+    global _hit_counter
+    if _hit_counter is None:
+        with _hit_counter_lock:
+            if _hit_counter is None:
+                options = {**DEFAULTS, **getattr(settings, 'HIT_COUNTER', {})}
+                backend = import_string(options['BACKEND'])(options)
+                _hit_counter = HitCounter(backend,
+                                          flush_interval=options['FLUSH_INTERVAL'],
+                                          max_pending=options['MAX_PENDING'])
+    return _hit_counter
+
+
+def start_hit_counter_flusher():
+    '''Start flushing the hit counter periodically, for serving processes'''
+    get_hit_counter().start()
+
+
+@receiver(setting_changed)
+def reset_hit_counter(setting, **kwargs):
+    global _hit_counter
+    if setting == 'HIT_COUNTER':
+        _hit_counter = None
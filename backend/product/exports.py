@@ -0,0 +1,78 @@
+'''
+Inventory export.
+Products are read through a server-side cursor a chunk at a time,
+with their image names aggregated per row, and encoded into a spooled
+temporary file, so exporting any number of products keeps the memory flat.
+The file is filled before the response is sent: Django 4.0's ASGI handler
+iterates streamed bodies in the event loop, where the ORM can't be used.
+'''
+import tempfile
+
+from django.contrib.postgres.expressions import ArraySubquery
+from django.db.models import OuterRef
+
+from core.models import Product, ProductImage
+from product.categories import get_category_path
+from product.serializers import get_image_url_builder
+
+CHUNK_SIZE = 2000
+# Bytes of an export kept in memory before spooling it to disk
+SPOOL_SIZE = 4 * 1024 * 1024
+
+COLUMNS = ['id', 'seller_id', 'title', 'price', 'description', 'is_sold',
+           'bookmark_cnt', 'hit_cnt', 'category_id', 'city__name',
+           'created_at', 'modified_at', 'image_names']
+
+
+def get_export_queryset(seller=None):
+    '''Products of the seller, or every product, in id order as dicts'''
+    queryset = Product.objects.all()
+    if seller is not None:
+        queryset = queryset.filter(seller=seller)
+    image_names = (ProductImage.objects
+                   .filter(product=OuterRef('pk'))
+                   .order_by('position', 'id')
+                   .values('image'))
+    return (queryset
+            .annotate(image_names=ArraySubquery(image_names))
+            .order_by('id')
+            .values(*COLUMNS))
+
+
+def get_export_rows(queryset, request=None):
+    '''Yield the export rows of the queryset, fetched CHUNK_SIZE at a time'''
+    paths = {}  # Resolved once per category for the whole export
+    get_image_url = get_image_url_builder(request)
+    for product in queryset.iterator(chunk_size=CHUNK_SIZE):
+        category_id = product['category_id']
+        if category_id not in paths:
+            paths[category_id] = ' > '.join(
+                node['name'] for node in get_category_path(category_id))
+        yield {
+            'id': product['id'],
+            'seller': product['seller_id'],
+            'title': product['title'],
+            'price': product['price'],
+            'description': product['description'],
+            'is_sold': product['is_sold'],
+            'bookmark_cnt': product['bookmark_cnt'],
+            'hit_cnt': product['hit_cnt'],
+            'category': paths[category_id],
+            'city': product['city__name'],
+            'images': [get_image_url(name) for name in product['image_names']],
+            'created_at': product['created_at'],
+            'modified_at': product['modified_at'],
+        }
+
+
+def write_export(rows, renderer):
+    '''Return a temporary file of the rows encoded by the renderer, rewound'''
+    file = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    try:
+        for chunk in renderer.stream(rows):
+            file.write(chunk)
+    except BaseException:
+        file.close()
+        raise
+    file.seek(0)
+    return file
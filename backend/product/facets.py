@@ -0,0 +1,102 @@
+'''
+Faceted product counts.
+Category, sold status and price bucket counts of a filtered product queryset
+are computed with a single GROUP BY query, then category counts are rolled
+up the MPTT tree in Python. Results are cached per normalized filter set.
+'''
+import hashlib
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, Count, IntegerField, Value, When
+
+from product.categories import get_category_nodes, get_tree_version
+
+# Query params which don't change the filtered set
+IGNORED_PARAMS = {'p', 'cursor', 'ordering', 'fields', 'format'}
+
+
+def get_price_buckets():
+    '''Return [(lower, upper)] price ranges, upper is None for the last one'''
+    bounds = [Decimal(str(bound)) for bound in settings.PRODUCT_PRICE_BUCKETS]
+    lowers = [Decimal('0')] + bounds
+    return list(zip(lowers, bounds + [None]))
+
+
+def get_cache_key(query_params):
+    '''Cache key of the normalized filter params, independent of their order'''
+    items = sorted((key, value)
+                   for key in query_params if key not in IGNORED_PARAMS
+                   for value in query_params.getlist(key) if value != '')
+    digest = hashlib.sha1(repr(items).encode()).hexdigest()
+    return f'product_facets:{get_tree_version()}:{digest}'
+
+
+def compute_facets(queryset):
+    '''Return category, is_sold & price facet counts of the queryset'''
+    buckets = get_price_buckets()
+    bucket = Case(*[When(price__lt=upper, then=Value(index))
+                    for index, (_, upper) in enumerate(buckets[:-1])],
+                  default=Value(len(buckets) - 1),
+                  output_field=IntegerField())
+    rows = (queryset
+            .order_by()
+            .annotate(price_bucket=bucket)
+            .values('category_id', 'is_sold', 'price_bucket')
+            .annotate(total=Count('id')))
+
+    by_category, by_sold, by_bucket = {}, {True: 0, False: 0}, [0] * len(buckets)
+    for row in rows:
+        by_category[row['category_id']] = (by_category.get(row['category_id'], 0)
+                                           + row['total'])
+        by_sold[row['is_sold']] += row['total']
+        by_bucket[row['price_bucket']] += row['total']
+
+    return {
+        'categories': rollup_categories(by_category),
+        'is_sold': [{'value': value, 'count': by_sold[value]}
+                    for value in (False, True)],
+        'price': [{'min': f'{lower:.2f}',
+                   'max': None if upper is None else f'{upper:.2f}',
+                   'count': count}
+                  for (lower, upper), count in zip(buckets, by_bucket)],
+    }
+
+
+def rollup_categories(by_category):
+    '''
+    Roll direct counts up to every ancestor, using the nodes' lft/rght
+    ranges: a node counts every product whose category lies within it.
+    '''
+    nodes = get_category_nodes()
+    totals = dict.fromkeys(nodes, 0)
+    path = []  # Ancestors of the current node, in tree order
+    for node in nodes.values():
+        while path and (path[-1]['tree_id'] != node['tree_id']
+                        or path[-1]['rght'] < node['lft']):
+            path.pop()
+        path.append(node)
+        count = by_category.get(node['id'], 0)
+        if count:
+            for ancestor in path:
+                totals[ancestor['id']] += count
+
+    return [{'id': node['id'],
+             'name': node['name'],
+             'parent': node['parent_id'],
+             'count': totals[node['id']]}
+            for node in nodes.values() if totals[node['id']]]
+
+
+def get_facets(query_params, get_queryset):
+    '''
+    Return the facets for the filter params, cached for a short time.
+    get_queryset builds the filtered queryset, only called on a cache miss.
+    '''
+    key = get_cache_key(query_params)
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(get_queryset())
+        cache.set(key, facets, settings.PRODUCT_FACETS_CACHE_TIMEOUT)
+    return facets
@@ -0,0 +1,122 @@
+import django_filters
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from core.models import City, Product
+from product.categories import get_descendant_ids
+
+# Text search configuration, must match the one used by the DB trigger
+SEARCH_CONFIG = 'english'
+
+# Supported ?ordering= values, each backed by composite indexes on Product
+PRODUCT_ORDERINGS = {
+    'price': ('price', 'id'),
+    '-price': ('-price', '-id'),
+    '-created_at': ('-created_at', '-id'),
+    '-bookmark_cnt': ('-bookmark_cnt', '-id'),
+}
+
+
+class ProductSearchFilter(BaseFilterBackend):
+    '''
+    Full-text search on products with the `q` query param.
+    Matches the trigger maintained, GIN indexed search_vector,
+    and ranks title matches above description matches.
+    '''
+    search_param = 'q'
+
+    def filter_queryset(self, request, queryset, view):
+        terms = request.query_params.get(self.search_param, '').strip()
+        if not terms:
+            return queryset
+
+        query = SearchQuery(terms, search_type='websearch', config=SEARCH_CONFIG)
+        return (queryset
+                .filter(search_vector=query)
+                .annotate(rank=SearchRank(F('search_vector'), query))
+                .order_by('-rank', '-created_at')
+                )
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.search_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Full-text search terms matched on title & description.',
+                'schema': {'type': 'string'},
+            },
+        ]
+
+
+class ProductFilter(django_filters.FilterSet):
+    '''
+    Product list filters
+    - category: products of the exact category
+    - category_tree: products of the category and its active subcategories
+    - min_price / max_price: inclusive price range
+    - near & scope: products in the same city, county or country as the city
+    '''
+    category_tree = django_filters.NumberFilter(method='filter_category_tree')
+    min_price = django_filters.NumberFilter(field_name='price', lookup_expr='gte')
+    max_price = django_filters.NumberFilter(field_name='price', lookup_expr='lte')
+    near = django_filters.NumberFilter(method='filter_near')
+    # Only read by filter_near
+    scope = django_filters.ChoiceFilter(
+        choices=[(scope, scope) for scope in ('city', 'county', 'country')],
+        method=lambda queryset, name, value: queryset)
+
+    class Meta:
+        model = Product
+        fields = ['category', 'is_sold']
+
+    def filter_category_tree(self, queryset, name, value):
+        return queryset.filter(category_id__in=get_descendant_ids(int(value)))
+
+    def filter_near(self, queryset, name, value):
+        # Resolve the city's county & country once, then match the product's
+        # own indexed location column without joining the address tables
+        location = (City.objects
+                    .filter(id=int(value))
+                    .values('id', 'county_id', 'county__country_id')
+                    .first())
+        if location is None:
+            return queryset.none()
+        scope = self.form.cleaned_data.get('scope') or 'city'
+        if scope == 'city':
+            return queryset.filter(city_id=location['id'])
+        if scope == 'county':
+            return queryset.filter(county_id=location['county_id'])
+        return queryset.filter(country_id=location['county__country_id'])
+
+
+class ProductOrderingFilter(BaseFilterBackend):
+    '''
+    Ordering products with `ordering`, limited to PRODUCT_ORDERINGS
+    so every supported sort is served by an index.
+    Without the param the view's ordering (or search rank) is kept.
+    '''
+    ordering_param = 'ordering'
+
+    def filter_queryset(self, request, queryset, view):
+        ordering = request.query_params.get(self.ordering_param)
+        if not ordering:
+            return queryset
+        if ordering not in PRODUCT_ORDERINGS:
+            raise ValidationError({
+                self.ordering_param: f'Choose one of {", ".join(PRODUCT_ORDERINGS)}.'
+            })
+        return queryset.order_by(*PRODUCT_ORDERINGS[ordering])
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.ordering_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Which field to use when ordering the results.',
+                'schema': {'type': 'string', 'enum': list(PRODUCT_ORDERINGS)},
+            },
+        ]
@@ -0,0 +1,113 @@
+'''
+Responsive variants for product images.
+After the upload transaction commits, each ProductImage is resized to the
+configured widths in every configured format on a worker thread pool,
+and the stored names are recorded in ProductImage.variants as
+{"<width>": {"<format>": "<name>"}}.
+Configured with the PRODUCT_IMAGE_VARIANTS setting:
+- WIDTHS: target widths in pixels, never upscaling the original
+- FORMATS: Pillow format names, e.g. WEBP & JPEG
+- WORKERS: size of the worker thread pool
+'''
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+from core.models import ProductImage
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'WIDTHS': (160, 480, 1080),
+    'FORMATS': ('WEBP', 'JPEG'),
+    'WORKERS': 2,
+    'QUALITY': 82,
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_options():
+    return {**DEFAULTS, **getattr(settings, 'PRODUCT_IMAGE_VARIANTS', {})}
+
+
+def get_executor():
+    '''Return the process wide worker pool'''
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=get_options()['WORKERS'],
+                    thread_name_prefix='product-image-variants')
+    return _executor
+
+
+def schedule_variants(image_ids):
+    '''Generate variants in the background once the current transaction commits'''
+    image_ids = list(image_ids)
+    if image_ids:
+        transaction.on_commit(
+            lambda: get_executor().submit(_generate_in_worker, image_ids))
+
+
+def _generate_in_worker(image_ids):
+    try:
+        for image_id in image_ids:
+            generate_variants(image_id)
+    except Exception:
+        logger.exception('Failed generating variants of images %s', image_ids)
+    finally:
+        # Worker threads hold their own DB connection
+        close_old_connections()
+
+
+def _encode(image, image_format, quality):
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    buffer = BytesIO()
+    image.save(buffer, image_format, quality=quality)
+    return buffer.getvalue()
+
+
+def generate_variants(image_id):
+    '''Resize a stored product image to every configured width & format'''
+    try:
+        product_image = ProductImage.objects.get(id=image_id)
+    except ProductImage.DoesNotExist:
+        return None  # Removed before the worker got to it
+
+    options = get_options()
+    field = product_image.image
+    with field.open('rb') as file:
+        original = ImageOps.exif_transpose(Image.open(file))
+        original.load()
+
+    # Never upscale, small originals get a single variant at their own width
+    widths = sorted(width for width in options['WIDTHS'] if width < original.width)
+    if not widths:
+        widths = [original.width]
+
+    base_name = os.path.splitext(field.name)[0]
+    variants = {}
+    for width in widths:
+        height = max(1, round(original.height * width / original.width))
+        resized = original.resize((width, height), Image.LANCZOS)
+        variants[str(width)] = {}
+        for image_format in options['FORMATS']:
+            extension = image_format.lower().replace('jpeg', 'jpg')
+            content = _encode(resized, image_format, options['QUALITY'])
+            name = field.storage.save(f'{base_name}_{width}w.{extension}',
+                                      ContentFile(content))
+            variants[str(width)][image_format.lower()] = name
+
+    ProductImage.objects.filter(id=image_id).update(variants=variants)
+    return variants
@@ -0,0 +1,205 @@
+'''
+Bulk product import for large sellers.
+Rows are streamed from CSV or JSON lines, validated a batch at a time
+(categories resolved from the cached tree, cities with one query per batch)
+and the valid ones inserted with bulk_create, one transaction per batch.
+Invalid rows are reported by line without stopping the import.
+'''
+import csv
+import json
+import logging
+import time
+from collections import namedtuple
+from itertools import islice
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from rest_framework import serializers
+
+from core.models import City, Product
+from product import list_cache
+from product.categories import get_category_lookup, get_category_nodes
+from product.serializers import get_default_city, get_location
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BATCH_SIZE': 500,
+    'MAX_ERRORS': 1000,  # Row errors reported at most, all are counted
+}
+
+FORMATS = {'csv': 'csv', 'jsonl': 'jsonl', 'ndjson': 'jsonl'}
+
+SAVE_ERROR_MESSAGE = 'Not saved because of a server error, please retry.'
+
+
+class ImportStats(namedtuple('ImportStats', ['rows', 'created', 'error_count',
+                                             'errors', 'duration'])):
+    @property
+    def rows_per_second(self):
+        return self.rows / self.duration if self.duration else 0.0
+
+
+def get_options():
+    return {**DEFAULTS, **getattr(settings, 'PRODUCT_IMPORT', {})}
+
+
+def get_format(name, file_format=None):
+    '''Return 'csv' or 'jsonl', given or guessed from the file extension'''
+    file_format = file_format or name.rsplit('.', 1)[-1]
+    if file_format.lower() not in FORMATS:
+        raise ValueError(f'Unsupported format, use one of {", ".join(FORMATS)}.')
+    return FORMATS[file_format.lower()]
+
+
+def decode_lines(file):
+    '''Yield the lines of a binary stream as text, one at a time'''
+    for line_number, line in enumerate(file):
+        yield line.decode('utf-8-sig' if line_number == 0 else 'utf-8')
+
+
+def read_rows(file, file_format):
+    '''
+    Yield (line number, row dict, parse error) from a binary stream,
+    ending with an error when the rest of it can't be decoded
+    '''
+    line_number = 0
+    lines = decode_lines(file)
+    try:
+        if file_format == 'csv':
+            reader = csv.DictReader(lines)
+            for row in reader:
+                line_number = reader.line_num
+                # Empty cells are left out, like missing JSON keys
+                yield line_number, {key: value for key, value in row.items()
+                                    if key and value not in ('', None)}, None
+            return
+
+        for line_number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as error:
+                yield line_number, None, f'Invalid JSON: {error}'
+                continue
+            if not isinstance(row, dict):
+                yield line_number, None, 'Each line must be a JSON object.'
+                continue
+            yield line_number, row, None
+    except (UnicodeDecodeError, csv.Error) as error:
+        yield line_number + 1, None, f'Unreadable file: {error}'
+
+
+class ProductImportRowSerializer(serializers.ModelSerializer):
+    '''
+    Validating a row without any query,
+    category & city are resolved for the whole batch
+    '''
+    category = serializers.CharField(max_length=255)
+    city = serializers.IntegerField(required=False, allow_null=True)
+
+    class Meta:
+        model = Product
+        fields = ['title', 'price', 'description', 'is_sold', 'category', 'city']
+
+
+def resolve_category(value):
+    '''Return (category id, error) of a category id or name'''
+    value = value.strip()
+    if value.isdigit():
+        if int(value) in get_category_nodes():
+            return int(value), None
+        return None, 'Unknown category.'
+
+    ids = get_category_lookup().get(value.casefold(), [])
+    if not ids:
+        return None, 'Unknown category.'
+    if len(ids) > 1:
+        # Names are only unique case sensitively
+        ids = [category_id for category_id in ids
+               if get_category_nodes()[category_id]['name'] == value]
+        if len(ids) != 1:
+            return None, 'Ambiguous category name, use its exact case or id.'
+    return ids[0], None
+
+
+def validate_batch(batch, seller, default_city):
+    '''Return the (line number, Product) of valid rows & (line number, errors)'''
+    validated, errors = [], []
+    # A single serializer for the batch, its fields are built once
+    row_serializer = ProductImportRowSerializer()
+    for line_number, row, error in batch:
+        if error is not None:
+            errors.append((line_number, {'non_field_errors': [error]}))
+            continue
+        try:
+            data = row_serializer.run_validation(row)
+        except serializers.ValidationError as error:
+            errors.append((line_number, error.detail))
+            continue
+        data['category_id'], error = resolve_category(data.pop('category'))
+        if error is not None:
+            errors.append((line_number, {'category': [error]}))
+            continue
+        validated.append((line_number, data))
+
+    city_ids = {data['city'] for _, data in validated
+                if data.get('city') is not None}
+    cities = City.objects.select_related('county').in_bulk(city_ids)
+
+    products = []
+    for line_number, data in validated:
+        city_id = data.pop('city', None)
+        if city_id is not None and city_id not in cities:
+            errors.append((line_number, {'city': ['Unknown city.']}))
+            continue
+        city = default_city if city_id is None else cities[city_id]
+        data.update(get_location(city))
+        products.append((line_number, Product(seller=seller, **data)))
+    return products, errors
+
+
+def import_products(seller, file, file_format, batch_size=None):
+    '''
+    Import the products of a seller from a CSV or JSON lines binary stream,
+    returning ImportStats. Every row needs a title, price, description &
+    category, is_sold & city are optional, the city defaulting to the
+    seller's address.
+    '''
+    options = get_options()
+    batch_size = batch_size or options['BATCH_SIZE']
+    start = time.perf_counter()
+    default_city = get_default_city(seller)
+    stats = {'rows': 0, 'created': 0, 'error_count': 0}
+    errors = []
+
+    def report(line_number, row_errors):
+        stats['error_count'] += 1
+        if len(errors) < options['MAX_ERRORS']:
+            errors.append({'line': line_number, 'errors': row_errors})
+
+    rows = read_rows(file, file_format)
+    while batch := list(islice(rows, batch_size)):
+        stats['rows'] += len(batch)
+
+        products, row_errors = validate_batch(batch, seller, default_city)
+        for line_number, row_error in row_errors:
+            report(line_number, row_error)
+        try:
+            with transaction.atomic():
+                Product.objects.bulk_create([product for _, product in products])
+        except DatabaseError:
+            # The DB error may reveal schema details, only logged
+            logger.exception('Saving a batch of %d imported products failed',
+                             len(products))
+            for line_number, _ in products:
+                report(line_number, {'non_field_errors': [SAVE_ERROR_MESSAGE]})
+            continue
+        stats['created'] += len(products)
+
+    if stats['created']:
+        # bulk_create sends no post_save signals
+        list_cache.invalidate('product')
+    errors.sort(key=lambda error: error['line'])
+    return ImportStats(errors=errors, duration=time.perf_counter() - start, **stats)
@@ -0,0 +1,132 @@
+'''
+Response cache for anonymous product list pages.
+Pages are cached per normalized query params, and each entry remembers
+the versions of the tags it depends on. Saving or deleting a Product,
+ProductImage or Category bumps its tag (see product.signals), turning
+every entry depending on it stale at once. Tag versions expire after
+VERSION_TIMEOUT, so with a process local cache, changes made by other
+processes turn entries stale within that window.
+
+Stale entries are still served, while a single request holding the
+rebuild lock recomputes the page (single-flight). On a miss the other
+requests wait for that rebuild instead of all running the same query.
+Configured with the PRODUCT_LIST_CACHE setting:
+- TIMEOUT: seconds an entry stays fresh
+- STALE_TIMEOUT: seconds a stale entry may still be served
+- LOCK_TIMEOUT: seconds a rebuild lock is held at most
+- WAIT: seconds a request waits for another request's rebuild on a miss
+- VERSION_TIMEOUT: seconds a tag version lives
+'''
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+DEFAULTS = {
+    'TIMEOUT': 30,
+    'STALE_TIMEOUT': 300,
+    'LOCK_TIMEOUT': 10,
+    'WAIT': 2,
+    'VERSION_TIMEOUT': 60,
+}
+
+TAGS = ('product', 'category')
+POLL_INTERVAL = 0.05  # seconds
+
+
+def get_options():
+    return {**DEFAULTS, **getattr(settings, 'PRODUCT_LIST_CACHE', {})}
+
+
+def _tag_key(tag):
+    return f'product_list:tag:{tag}'
+
+
+def get_tag_versions():
+    '''Return the current version of every tag, from one cache round trip'''
+    keys = [_tag_key(tag) for tag in TAGS]
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    for key in missing:
+        # Time based seed so a lost version never reuses an old number
+        cache.add(key, time.time_ns(), get_options()['VERSION_TIMEOUT'])
+    if missing:
+        versions.update(cache.get_many(missing))
+    return tuple(versions.get(key) for key in keys)
+
+
+def invalidate(*tags):
+    '''Turn every cached page depending on the tags stale'''
+    for tag in tags:
+        try:
+            cache.incr(_tag_key(tag))
+        except ValueError:
+            cache.set(_tag_key(tag), time.time_ns(),
+                      get_options()['VERSION_TIMEOUT'])
+
+
+def get_cache_key(request):
+    '''Cache key of the request's host & query params, independent of their order'''
+    items = sorted((key, value)
+                   for key in request.query_params
+                   for value in request.query_params.getlist(key)
+                   # An empty cursor still selects keyset pagination
+                   if value != '' or key == 'cursor')
+    digest = hashlib.sha1(repr((request.get_host(), items)).encode()).hexdigest()
+    return f'product_list:page:{digest}'
+
+
+def is_cacheable(request):
+    '''Only anonymous reads share cached pages'''
+    return request.method in ('GET', 'HEAD') and not request.user.is_authenticated
+
+
+def _store(key, data, versions, options):
+    entry = {'data': data,
+             'versions': versions,
+             'fresh_until': time.time() + options['TIMEOUT']}
+    cache.set(key, entry, options['TIMEOUT'] + options['STALE_TIMEOUT'])
+
+
+def _rebuild(key, lock_key, build, options):
+    # Versions are read before building, so a change meanwhile keeps it stale
+    versions = get_tag_versions()
+    try:
+        data = build()
+        _store(key, data, versions, options)
+        return data
+    finally:
+        cache.delete(lock_key)
+
+
+def get_page(request, build):
+    '''
+    Return (data, status) of the page for the request, status being
+    'HIT', 'STALE' or 'MISS'. build() renders the page data, and is only
+    called by the request winning the rebuild lock (or after waiting
+    for it in vain).
+    '''
+    options = get_options()
+    key = get_cache_key(request)
+    lock_key = f'{key}:lock'
+    entry = cache.get(key)
+
+    if entry is not None:
+        if (entry['fresh_until'] > time.time()
+                and entry['versions'] == get_tag_versions()):
+            return entry['data'], 'HIT'
+        if not cache.add(lock_key, 1, options['LOCK_TIMEOUT']):
+            return entry['data'], 'STALE'  # Another request is rebuilding
+        return _rebuild(key, lock_key, build, options), 'MISS'
+
+    if not cache.add(lock_key, 1, options['LOCK_TIMEOUT']):
+        # Waiting for the request which is building the page
+        deadline = time.monotonic() + options['WAIT']
+        while time.monotonic() < deadline:
+            time.sleep(POLL_INTERVAL)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry['data'], 'HIT'
+        return build(), 'MISS'
+    return _rebuild(key, lock_key, build, options), 'MISS'
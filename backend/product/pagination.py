@@ -1,6 +1,159 @@
-from rest_framework.pagination import PageNumberPagination
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from urllib import parse
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class CustomPagination(PageNumberPagination):
     page_size = 20  # Set numbers of items per page
     page_query_param = 'p'  # Set page query param name
+
+
+class KeysetPagination(BasePagination):
+    '''
+    Keyset(cursor) pagination over the newest first (created_at, id) ordering.
+    A page is fetched with a range condition on the (created_at, id) index
+    instead of COUNT(*) & OFFSET, so the latency stays flat on deep pages.
+    Querysets in any other order (e.g. by price or search rank) are refused
+    rather than silently re-ordered.
+    '''
+    page_size = 20
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+    unsupported_ordering_message = ('Only the newest first ordering can be paged '
+                                    'by cursor, page it with page numbers instead.')
+    # Querysets orderings the keyset follows
+    keyset_orderings = {(), ('-created_at',), ('-created_at', '-id')}
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if tuple(queryset.query.order_by) not in self.keyset_orderings:
+            raise ValidationError({self.cursor_query_param:
+                                   self.unsupported_ordering_message})
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        reverse, position = self.cursor if self.cursor else (False, None)
+
+        if reverse:
+            queryset = queryset.order_by('created_at', 'id')
+        else:
+            queryset = queryset.order_by('-created_at', '-id')
+
+        if position is not None:
+            created_at, pk = position
+            if reverse:
+                queryset = queryset.filter(
+                    Q(created_at__gte=created_at),
+                    Q(created_at__gt=created_at) | Q(id__gt=pk))
+            else:
+                queryset = queryset.filter(
+                    Q(created_at__lte=created_at),
+                    Q(created_at__lt=created_at) | Q(id__lt=pk))
+
+        # Fetch an extra item to know whether a following page exists
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_following = len(results) > self.page_size
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = position is not None
+            self.has_previous = has_following
+        else:
+            self.has_next = has_following
+            self.has_previous = position is not None
+
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data)
+        ]))
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if not self.page:
+            # Stepped back past the first item, restart from the newest
+            return replace_query_param(self.base_url, self.cursor_query_param, '')
+        return self.encode_cursor(False, self.get_position(self.page[-1]))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return replace_query_param(self.base_url, self.cursor_query_param, '')
+        return self.encode_cursor(True, self.get_position(self.page[0]))
+
+    @staticmethod
+    def get_position(item):
+        if isinstance(item, dict):
+            return item['created_at'], item['id']
+        return item.created_at, item.id
+
+    def decode_cursor(self, request):
+        '''Return (reverse, (created_at, id)) from the cursor param, if any'''
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            querystring = urlsafe_b64decode(encoded.encode('ascii')).decode('ascii')
+            tokens = parse.parse_qs(querystring)
+            reverse = bool(int(tokens.get('r', ['0'])[0]))
+            created_at = parse_datetime(tokens['c'][0])
+            pk = int(tokens['i'][0])
+        except (TypeError, ValueError, KeyError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if created_at is None:
+            raise NotFound(self.invalid_cursor_message)
+        return reverse, (created_at, pk)
+
+    def encode_cursor(self, reverse, position):
+        created_at, pk = position
+        tokens = {'c': created_at.isoformat(), 'i': pk}
+        if reverse:
+            tokens['r'] = '1'
+        querystring = parse.urlencode(tokens)
+        encoded = urlsafe_b64encode(querystring.encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'The pagination cursor value.',
+                'schema': {'type': 'string'},
+            },
+        ]
+
+
+class KeysetPaginationMixin:
+    '''
+    Opt-in keyset pagination for list views.
+    Page number pagination stays the default, and sending the `cursor`
+    query param (empty for the first page) switches to KeysetPagination.
+    '''
+    keyset_pagination_class = KeysetPagination
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            cursor_param = self.keyset_pagination_class.cursor_query_param
+            if cursor_param in self.request.query_params:
+                self._paginator = self.keyset_pagination_class()
+            elif self.pagination_class is None:
+                self._paginator = None
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
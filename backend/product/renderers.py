@@ -0,0 +1,91 @@
+'''
+Renderers of flat rows, encoded a chunk at a time.
+stream() encodes any iterable of dicts lazily, written to a spooled
+temporary file by product.exports, render() is what DRF uses for the
+error responses in these formats.
+'''
+import csv
+import io
+
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.renderers import BaseRenderer
+
+ROWS_PER_CHUNK = 500
+
+# Dates, times & decimals formatted like in the JSON API
+_encoder = DjangoJSONEncoder()
+
+# Starts of text cells spreadsheets would evaluate as formulas
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+class RowsRenderer(BaseRenderer):
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        rows = data if isinstance(data, list) else [data]
+        return b''.join(self.stream(rows))
+
+    def stream(self, rows):
+        '''Yield the encoded rows, ROWS_PER_CHUNK at a time'''
+        buffer = io.StringIO()
+        write = self.get_writer(buffer)
+        for count, row in enumerate(rows, start=1):
+            write(row)
+            if count % ROWS_PER_CHUNK == 0:
+                yield buffer.getvalue().encode(self.charset)
+                buffer.seek(0)
+                buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode(self.charset)
+
+    def get_writer(self, buffer):
+        '''Return a function writing a row to the buffer'''
+        raise NotImplementedError('.get_writer() must be implemented')
+
+
+def format_cell(value):
+    # CSV cell of a row value
+    if value is None:
+        return ''
+    if value is True or value is False:
+        return 'true' if value else 'false'
+    if isinstance(value, str):
+        # Quoted to be shown as text, e.g. a title like "=HYPERLINK(...)"
+        return "'" + value if value.startswith(FORMULA_PREFIXES) else value
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return ' '.join(map(format_cell, value))
+    return _encoder.default(value)
+
+
+class CSVRenderer(RowsRenderer):
+    '''CSV with a header row of the first row's keys'''
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def get_writer(self, buffer):
+        writer = csv.writer(buffer)
+        header = []
+
+        def write(row):
+            if not header:
+                header.extend(row.keys())
+                writer.writerow(header)
+            writer.writerow([format_cell(value) for value in row.values()])
+        return write
+
+
+class JSONLinesRenderer(RowsRenderer):
+    '''One JSON object per line'''
+    media_type = 'application/x-ndjson'
+    format = 'jsonl'
+
+    def get_writer(self, buffer):
+        encoder = DjangoJSONEncoder(ensure_ascii=False)
+
+        def write(row):
+            buffer.write(encoder.encode(row))
+            buffer.write('\n')
+        return write
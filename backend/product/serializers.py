@@ -1,7 +1,16 @@
+from operator import itemgetter
+
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.db.models import F, Max
+from django.utils.encoding import filepath_to_uri
 from rest_framework import serializers
 from rest_framework_recursive.fields import RecursiveField
 
 from core import models
+from product import stats as product_stats
+from product.images import schedule_variants
+from product.values import ValuesSerializer
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -19,21 +28,132 @@ class CategorySerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'children']
 
 
+def uploaded_images_field(**kwargs):
+    # Write only list of uploaded image files
+    return serializers.ListField(
+        child=serializers.FileField(
+            max_length=1_000_000,
+            allow_empty_file=False,
+            use_url=False
+        ),
+        write_only=True,
+        **kwargs)
+
+
+def add_product_images(product, files, first_position=0):
+    '''
+    Storing uploaded images of a product with a single bulk INSERT,
+    positioned from first_position in upload order.
+    Variants are generated once the surrounding transaction commits.
+    '''
+    product_images = models.ProductImage.objects.bulk_create([
+        models.ProductImage(product=product, image=file, position=position)
+        for position, file in enumerate(files, start=first_position)
+    ])
+    schedule_variants(product_image.id for product_image in product_images)
+    return product_images
+
+
+def get_image_url(name, request=None):
+    '''URL of a stored product image, absolute when a request is given'''
+    url = models.ProductImage._meta.get_field('image').storage.url(name)
+    return request.build_absolute_uri(url) if request else url
+
+
+def get_image_url_builder(request=None):
+    '''
+    Return a function building get_image_url(name, request) URLs,
+    for file system storages without parsing the base URL per name
+    '''
+    storage = models.ProductImage._meta.get_field('image').storage
+    if not isinstance(storage, FileSystemStorage):
+        return lambda name: get_image_url(name, request)
+    prefix = storage.base_url
+    if request is not None:
+        prefix = request.build_absolute_uri(prefix)
+    return lambda name: prefix + filepath_to_uri(name).lstrip('/')
+
+
+def get_srcset(variants, request=None):
+    '''Variant URLs by width, e.g. {"480w": {"webp": url, "jpeg": url}}'''
+    return {f'{width}w': {image_format: get_image_url(name, request)
+                          for image_format, name in formats.items()}
+            for width, formats in variants.items()}
+
+
 class ProductImageSerializer(serializers.ModelSerializer):
+    srcset = serializers.SerializerMethodField(read_only=True)
+
     class Meta:
         model = models.ProductImage
-        fields = ['image']
+        fields = ['id', 'image', 'srcset']
+
+    def get_srcset(self, product_image):
+        return get_srcset(product_image.variants, self.context.get('request'))
+
+
+class ProductImageUploadSerializer(serializers.Serializer):
+    '''Appending images to the product given in the context'''
+    uploaded_images = uploaded_images_field(allow_empty=False)
+
+    def create(self, validated_data):
+        product = self.context['product']
+        with transaction.atomic():
+            last = (models.ProductImage.objects
+                    .filter(product=product)
+                    .aggregate(last=Max('position'))['last'])
+            first_position = 0 if last is None else last + 1
+            return add_product_images(product,
+                                      validated_data['uploaded_images'],
+                                      first_position=first_position)
+
+
+class ProductImageOrderSerializer(serializers.Serializer):
+    '''Reordering the images of the product given in the context'''
+    order = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+
+    def validate_order(self, order):
+        image_ids = set(models.ProductImage.objects
+                        .filter(product=self.context['product'])
+                        .values_list('id', flat=True))
+        if len(order) != len(set(order)) or set(order) != image_ids:
+            raise serializers.ValidationError(
+                'Must list every image id of the product exactly once.')
+        return order
+
+    def create(self, validated_data):
+        product_images = [models.ProductImage(id=image_id, position=position)
+                          for position, image_id in enumerate(validated_data['order'])]
+        models.ProductImage.objects.bulk_update(product_images, ['position'])
+        return product_images
+
+
+def get_location(city):
+    '''Return the denormalized city, county & country fields of a product'''
+    if city is None:
+        return {'city': None, 'county_id': None, 'country_id': None}
+    return {'city': city,
+            'county_id': city.county_id,
+            'country_id': city.county.country_id}
+
+
+def get_default_city(user):
+    '''Return the city of the user's first address, if any'''
+    address = (models.Address.objects
+               .filter(user=user)
+               .select_related('city__county')
+               .order_by('id')
+               .first())
+    return address.city if address else None
 
 
 class ProductSerializer(serializers.ModelSerializer):
     images = ProductImageSerializer(many=True, read_only=True)
-    uploaded_images = serializers.ListField(
-        child=serializers.FileField(
-            max_length=1_000_000,
-            allow_empty_file=False,
-            use_url=False
-        ),
-        write_only=True)
+    uploaded_images = uploaded_images_field()
+    city = serializers.PrimaryKeyRelatedField(
+        queryset=models.City.objects.select_related('county'),
+        required=False,
+        allow_null=True)
 
     class Meta:
         model = models.Product
@@ -47,26 +167,145 @@ class ProductSerializer(serializers.ModelSerializer):
                   'uploaded_images',
                   'is_sold',
                   'bookmark_cnt',
+                  'city',
+                  'county',
+                  'country',
                   'created_at',
                   'modified_at'
                   ]
-        read_only_fields = ['id', 'seller', 'bookmark_cnt', 'is_sold']
+        read_only_fields = ['id', 'seller', 'bookmark_cnt', 'is_sold',
+                            'county', 'country']
 
     def create(self, validated_data):
         '''
         Creating a product
         - Passing current auth user to seller field and creating a new product.
         - Getting uploaded_images from validated_data and creating product images
+        - Locating the product in the seller's first address city unless given
         '''
 
         validated_data['seller'] = self.context['request'].user
         images = validated_data.pop('uploaded_images')
-        product = models.Product.objects.create(**validated_data)
-        for img in images:
-            models.ProductImage.objects.create(product=product, image=img)
+        city = validated_data.pop('city', None) or get_default_city(
+            validated_data['seller'])
+        validated_data.update(get_location(city))
+        with transaction.atomic():
+            product = models.Product.objects.create(**validated_data)
+            add_product_images(product, images)
         return product
 
 
+def get_favorite_flag(product, request):
+    '''
+    Whether the request user saved the product as a favorite.
+    Read from the `is_favorite` annotation when the queryset has it,
+    and always false for anonymous users.
+    '''
+    if hasattr(product, 'is_favorite'):
+        return product.is_favorite
+    if request is None or not request.user.is_authenticated:
+        return False
+    return models.Favorite.objects.filter(product=product, user=request.user).exists()
+
+
+class SparseFieldsMixin:
+    '''
+    Keeping only the fields listed in the `fields` context, if any,
+    so unused fields are neither looked up nor rendered.
+    '''
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = self.context.get('fields')
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class ProductListSerializer(SparseFieldsMixin, ProductSerializer):
+    favorite = serializers.SerializerMethodField(read_only=True)
+    thumbnail = serializers.SerializerMethodField(read_only=True)
+
+    # Compact representation the product list renders by default
+    CARD_FIELDS = ['id',
+                   'title',
+                   'price',
+                   'is_sold',
+                   'bookmark_cnt',
+                   'city',
+                   'created_at',
+                   'favorite',
+                   'thumbnail'
+                   ]
+
+    class Meta(ProductSerializer.Meta):
+        fields = ProductSerializer.Meta.fields + ['favorite', 'thumbnail']
+
+    @classmethod
+    def get_readable_fields(cls):
+        '''Names the `fields` query param may select'''
+        return [name for name in cls.Meta.fields if name != 'uploaded_images']
+
+    def get_favorite(self, product):
+        return get_favorite_flag(product, self.context.get('request'))
+
+    def get_thumbnail(self, product):
+        '''
+        URL of the first image, read from the `thumbnail_name` annotation
+        when the queryset has it, from the prefetched images otherwise
+        '''
+        if hasattr(product, 'thumbnail_name'):
+            name = product.thumbnail_name
+        else:
+            images = product.images.all()
+            name = images[0].image.name if images else None
+        if not name:
+            return None
+        return get_image_url(name, self.context.get('request'))
+
+
+class ProductListValuesSerializer(ValuesSerializer):
+    '''
+    ProductListSerializer fast path for list pages,
+    expecting the querysets of ProductListViewSet.get_queryset()
+    '''
+    serializer_class = ProductListSerializer
+
+    def get_favorite_getter(self):
+        request = self.context.get('request')
+        if request is not None and request.user.is_authenticated:
+            return ['is_favorite'], itemgetter('is_favorite')
+        return [], lambda row: False
+
+    def get_thumbnail_getter(self):
+        request = self.context.get('request')
+
+        def get_thumbnail(row):
+            name = row['thumbnail_name']
+            return get_image_url(name, request) if name else None
+        return ['thumbnail_name'], get_thumbnail
+
+    def get_images_getter(self):
+        return ['id'], lambda row: self.images.get(row['id'], [])
+
+    def prepare(self, rows):
+        '''Loading the images of every row with one query'''
+        if 'images' not in dict(self.plan):
+            return
+        request = self.context.get('request')
+        self.images = {}
+        product_images = (models.ProductImage.objects
+                          .filter(product__in=[row['id'] for row in rows])
+                          .values('id', 'product_id', 'image', 'variants'))
+        for image in product_images:
+            name = image['image']
+            self.images.setdefault(image['product_id'], []).append({
+                'id': image['id'],
+                'image': get_image_url(name, request) if name else None,
+                'srcset': get_srcset(image['variants'], request),
+            })
+
+
 class FavoriteSerializer(serializers.ModelSerializer):
     class Meta:
         model = models.Favorite
@@ -74,39 +313,95 @@ class FavoriteSerializer(serializers.ModelSerializer):
         read_only_fields = ['user']
 
     def create(self, validated_data):
+        '''
+        Saving a favorite and incrementing the product's bookmark_cnt
+        & daily favorites in the same transaction. The unique (user, product)
+        constraint rejects duplicates, so concurrent requests can't double count.
+        '''
         user = self.context['request'].user
         product = validated_data['product']
         try:
-            favorite = models.Favorite.objects.get(user=user, product=product)
+            with transaction.atomic():
+                favorite = models.Favorite.objects.create(user=user, product=product)
+                (models.Product.objects
+                 .filter(id=product.id)
+                 .update(bookmark_cnt=F('bookmark_cnt') + 1))
+                product_stats.record(product.id, favorites=1)
+        except IntegrityError:
             raise serializers.ValidationError(
                 {'message': 'Already saved as a favorite'})
-        except models.Favorite.DoesNotExist:
-            favorite = models.Favorite.objects.create(user=user, product=product)
-            return favorite
+        return favorite
+
+
+class FavoriteProductSerializer(ProductListSerializer):
+    '''Product card of a favorite, always saved by the request user'''
+
+    class Meta(ProductListSerializer.Meta):
+        fields = ProductListSerializer.CARD_FIELDS
+
+    def get_favorite(self, product):
+        return True
+
+
+class FavoriteListSerializer(serializers.ModelSerializer):
+    '''A favorite of the request user with the product card'''
+    product = FavoriteProductSerializer(read_only=True)
+
+    class Meta:
+        model = models.Favorite
+        fields = ['id', 'product', 'created_at']
 
 
 class ProductDetailSerializer(ProductSerializer):
     favorite = serializers.SerializerMethodField(read_only=True)
+    # Images are kept unless replaced, see the product images endpoints
+    uploaded_images = uploaded_images_field(required=False)
 
     class Meta(ProductSerializer.Meta):
         fields = ProductSerializer.Meta.fields + ['description', 'hit_cnt', 'favorite']
-        read_only_fields = ['id', 'seller', 'bookmark_cnt', 'hit_cnt']
+        read_only_fields = ['id', 'seller', 'bookmark_cnt', 'hit_cnt',
+                            'county', 'country']
 
     def get_favorite(self, product):
-        favorite = models.Favorite.objects.filter(
-            product=product,
-            user=self.context['request'].user).exists()
-        return favorite
+        return get_favorite_flag(product, self.context.get('request'))
 
     def update(self, instance, validated_data):
+        '''
+        Updating a product
+        - Replacing every image only when uploaded_images is given
+        - Keeping county & country in line with a changed city
+        '''
         images = validated_data.pop('uploaded_images', None)
+        if 'city' in validated_data:
+            validated_data.update(get_location(validated_data.pop('city')))
 
-        if images is not None:
-            models.ProductImage.objects.filter(product=instance).delete()
-            for img in images:
-                models.ProductImage.objects.create(product=instance, image=img)
+        with transaction.atomic():
+            if images is not None:
+                models.ProductImage.objects.filter(product=instance).delete()
+                add_product_images(instance, images)
 
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        instance.save()
+            for attr, value in validated_data.items():
+                setattr(instance, attr, value)
+            instance.save()
         return instance
+
+
+class ArchivedProductImageSerializer(ProductImageSerializer):
+    class Meta(ProductImageSerializer.Meta):
+        model = models.ArchivedProductImage
+
+
+class ArchivedProductSerializer(serializers.ModelSerializer):
+    '''Read only ProductDetailSerializer representation of an archived product'''
+    images = ArchivedProductImageSerializer(many=True, read_only=True)
+    favorite = serializers.SerializerMethodField(read_only=True)
+
+    class Meta:
+        model = models.ArchivedProduct
+        fields = [name for name in dict.fromkeys(ProductDetailSerializer.Meta.fields)
+                  if name != 'uploaded_images'] + ['archived_at']
+        read_only_fields = fields
+
+    def get_favorite(self, product):
+        # Favorites are dropped when archiving
+        return False
@@ -0,0 +1,32 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from mptt.signals import node_moved
+
+from core.models import Category, Product, ProductImage
+from product import list_cache
+from product.categories import bump_tree_version
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(node_moved, sender=Category)
+def invalidate_category_tree(sender, **kwargs):
+    '''Bump the tree version now, and again once the change is visible to others'''
+    bump_tree_version()
+    transaction.on_commit(bump_tree_version)
+    invalidate_list_cache('category')
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def invalidate_product_list(sender, **kwargs):
+    invalidate_list_cache('product')
+
+
+def invalidate_list_cache(tag):
+    # Again on commit, as pages may be rebuilt before the change is visible
+    list_cache.invalidate(tag)
+    transaction.on_commit(lambda: list_cache.invalidate(tag))
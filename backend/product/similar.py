@@ -0,0 +1,303 @@
+'''
+"Similar products" from a TF-IDF index.
+Unsold products are vectorized over their title (weighted double),
+description and category path into hashed term features, stored as a
+row normalized sparse matrix in .npy files and memory-mapped by every
+process. The matrix is kept both by row (CSR) and by feature (CSC), so
+cosine scores only read the feature columns of the queried product.
+
+The index lives in versioned sub directories of INDEX_DIR, CURRENT naming
+the live one, so a rewrite never changes files a reader has mapped.
+update_index() only re-vectorizes products modified since the last build,
+dropping sold & deleted rows, and rebuilds fully once the category tree
+structure changed. Configured with the PRODUCT_SIMILAR setting:
+- INDEX_DIR: directory of the index files
+- TOP_K: default number of neighbours
+'''
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+import zlib
+from collections import Counter, namedtuple
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from scipy import sparse
+
+from core.models import Product
+from product.categories import get_category_nodes, get_category_path
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'INDEX_DIR': '/vol/web/similar/',
+    'TOP_K': 10,
+}
+
+N_FEATURES = 2 ** 20  # Hashed feature space, collisions are negligible here
+TITLE_WEIGHT = 2
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+STOP_WORDS = frozenset(
+    'a an and are as at be by for from has have in is it its of on or that '
+    'the this to was were will with'.split())
+ARRAYS = ('ids', 'indptr', 'indices', 'tf', 'data', 'idf',
+          'col_indptr', 'col_indices', 'col_data')
+VECTOR_FIELDS = ('id', 'title', 'description', 'category_id')
+
+UpdateStats = namedtuple('UpdateStats', ['rows', 'vectorized', 'full', 'duration'])
+
+
+def get_options():
+    return {**DEFAULTS, **getattr(settings, 'PRODUCT_SIMILAR', {})}
+
+
+def _feature(token):
+    return zlib.crc32(token.encode()) % N_FEATURES
+
+
+def vectorize(product):
+    '''
+    Return sorted (feature indices, sublinear tf) of a product
+    given as a dict of VECTOR_FIELDS
+    '''
+    counts = Counter()
+    for text, weight in ((product['title'], TITLE_WEIGHT),
+                         (product['description'], 1)):
+        for token in TOKEN_PATTERN.findall(text.lower()):
+            if token not in STOP_WORDS and len(token) > 1:
+                counts[_feature(token)] += weight
+    # Every category up the tree is a feature, so siblings share the parent's
+    for node in get_category_path(product['category_id']):
+        counts[_feature(f'category:{node["id"]}')] += 1
+
+    indices = np.array(sorted(counts), dtype=np.int32)
+    tf = np.array([1 + math.log(counts[index]) for index in indices],
+                  dtype=np.float32)
+    return indices, tf
+
+
+class SimilarIndex:
+    '''A loaded, read-only version of the index'''
+
+    def __init__(self, path, meta, arrays):
+        self.path = path
+        self.meta = meta
+        self.ids = arrays['ids']
+        self.indptr = arrays['indptr']
+        self.indices = arrays['indices']
+        self.data = arrays['data']
+        self.idf = arrays['idf']
+        self.tf = sparse.csr_matrix(
+            (arrays['tf'], self.indices, self.indptr),
+            shape=(len(self.ids), N_FEATURES), copy=False)
+        self.columns = sparse.csc_matrix(
+            (arrays['col_data'], arrays['col_indices'], arrays['col_indptr']),
+            shape=(len(self.ids), N_FEATURES), copy=False)
+        self.positions = {product_id: position
+                          for position, product_id in enumerate(self.ids.tolist())}
+
+    @classmethod
+    def load(cls, path):
+        with open(os.path.join(path, 'meta.json')) as file:
+            meta = json.load(file)
+        arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r')
+                  for name in ARRAYS}
+        return cls(path, meta, arrays)
+
+    def query_vector(self, product_id):
+        '''Return (feature indices, normalized weights) of a product'''
+        position = self.positions.get(product_id)
+        if position is not None:
+            start, end = self.indptr[position], self.indptr[position + 1]
+            return self.indices[start:end], self.data[start:end]
+        # Not indexed yet (or sold), weighted with the index's idf on the fly
+        product = Product.objects.values(*VECTOR_FIELDS).get(id=product_id)
+        indices, tf = vectorize(product)
+        weights = tf * self.idf[indices]
+        norm = np.linalg.norm(weights)
+        if norm:
+            weights /= norm
+        return indices, weights
+
+    def neighbours(self, product_id, count):
+        '''Return up to count [(product_id, score)] of the nearest rows'''
+        indices, weights = self.query_vector(product_id)
+        if not len(indices):
+            return []
+        scores = self.columns[:, indices].dot(weights)
+        position = self.positions.get(product_id)
+        if position is not None:
+            scores[position] = 0  # Not similar to itself
+
+        count = min(count, len(scores))
+        if not count:
+            return []
+        top = np.argpartition(-scores, count - 1)[:count]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(int(self.ids[position]), float(scores[position]))
+                for position in top if scores[position] > 0]
+
+
+def get_categories_signature():
+    '''Digest of the category tree structure the category features depend on'''
+    structure = [(node['id'], node['parent_id'])
+                 for node in get_category_nodes().values()]
+    return hashlib.sha1(repr(structure).encode()).hexdigest()
+
+
+def _current_path(index_dir):
+    try:
+        with open(os.path.join(index_dir, 'CURRENT')) as file:
+            return os.path.join(index_dir, file.read().strip())
+    except FileNotFoundError:
+        return None
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    '''Return the live SimilarIndex, reloaded once a new version is written'''
+    global _index
+    path = _current_path(get_options()['INDEX_DIR'])
+    if path is None:
+        return None
+    if _index is None or _index.path != path:
+        with _index_lock:
+            if _index is None or _index.path != path:
+                _index = SimilarIndex.load(path)
+    return _index
+
+
+def get_similar_ids(product_id, count=None):
+    '''
+    Return ids of the products most similar to the product, best first.
+    Sold products are dropped, so a few more neighbours than needed are
+    ranked. Raise Product.DoesNotExist for an unknown, unindexed product.
+    '''
+    count = count or get_options()['TOP_K']
+    index = get_index()
+    if index is None:
+        return []
+    neighbours = [neighbour_id
+                  for neighbour_id, _ in index.neighbours(product_id, count * 2)]
+    unsold = set(Product.objects
+                 .filter(id__in=neighbours, is_sold=False)
+                 .values_list('id', flat=True))
+    return [neighbour_id for neighbour_id in neighbours
+            if neighbour_id in unsold][:count]
+
+
+def _write(index_dir, ids, tf, built_at, categories):
+    # Weight, normalize & write a new version, then point CURRENT to it
+    # Rows hold sorted, unique features, so df is a plain feature count
+    df = np.bincount(tf.indices, minlength=N_FEATURES)
+    idf = (np.log((1 + len(ids)) / (1 + df)) + 1).astype(np.float32)
+    data = tf.data * idf[tf.indices]
+    rows = np.repeat(np.arange(len(ids)), np.diff(tf.indptr))
+    norms = np.sqrt(np.bincount(rows, weights=data ** 2, minlength=len(ids)))
+    norms[norms == 0] = 1
+    data = (data / norms[rows]).astype(np.float32)
+    columns = sparse.csr_matrix((data, tf.indices, tf.indptr),
+                                shape=tf.shape).tocsc()
+
+    # Sortable by age, unique per writer
+    version = f'{time.time_ns():020d}-{uuid.uuid4().hex[:8]}'
+    path = os.path.join(index_dir, version)
+    os.makedirs(path)
+    arrays = {
+        'ids': np.asarray(ids, dtype=np.int64),
+        # Same index dtype for both, so scipy maps them without a copy
+        'indptr': tf.indptr.astype(np.int32),
+        'indices': tf.indices.astype(np.int32),
+        'tf': tf.data.astype(np.float32),
+        'data': data,
+        'idf': idf,
+        'col_indptr': columns.indptr.astype(np.int32),
+        'col_indices': columns.indices.astype(np.int32),
+        'col_data': columns.data.astype(np.float32),
+    }
+    for name, array in arrays.items():
+        np.save(os.path.join(path, f'{name}.npy'), array)
+    with open(os.path.join(path, 'meta.json'), 'w') as file:
+        json.dump({'built_at': built_at.isoformat(),
+                   'categories': categories}, file)
+
+    # Atomically switching readers to the new version
+    pointer = os.path.join(index_dir, f'CURRENT.{version}')
+    with open(pointer, 'w') as file:
+        file.write(version)
+    os.replace(pointer, os.path.join(index_dir, 'CURRENT'))
+    return path
+
+
+def _clean(index_dir, keep):
+    # Drop old versions, keeping the previous one for readers still mapping it
+    versions = sorted(name for name in os.listdir(index_dir)
+                      if os.path.isdir(os.path.join(index_dir, name)))
+    for name in versions[:-keep]:
+        shutil.rmtree(os.path.join(index_dir, name), ignore_errors=True)
+
+
+def _stack(rows):
+    # Build a tf CSR matrix from [(indices, tf)]
+    indptr = np.cumsum([0] + [len(indices) for indices, _ in rows], dtype=np.int32)
+    indices = (np.concatenate([indices for indices, _ in rows])
+               if rows else np.array([], dtype=np.int32))
+    tf = (np.concatenate([tf for _, tf in rows])
+          if rows else np.array([], dtype=np.float32))
+    return sparse.csr_matrix((tf, indices, indptr), shape=(len(rows), N_FEATURES))
+
+
+def update_index(rebuild=False):
+    '''
+    Bring the index up to date, re-vectorizing only products modified
+    since the last build, or every unsold product when rebuilding.
+    Return UpdateStats.
+    '''
+    start = time.perf_counter()
+    index_dir = get_options()['INDEX_DIR']
+    os.makedirs(index_dir, exist_ok=True)
+    built_at = timezone.now()
+    categories = get_categories_signature()
+
+    index = get_index()
+    full = (rebuild or index is None
+            or index.meta['categories'] != categories)
+    unsold = Product.objects.filter(is_sold=False)
+    if full:
+        changed = unsold
+        keep_ids, keep = [], sparse.csr_matrix((0, N_FEATURES), dtype=np.float32)
+    else:
+        changed = unsold.filter(
+            modified_at__gte=parse_datetime(index.meta['built_at']))
+        live = set(unsold.values_list('id', flat=True))
+        changed_ids = set(changed.values_list('id', flat=True))
+        mask = np.array([product_id in live and product_id not in changed_ids
+                         for product_id in index.ids.tolist()], dtype=bool)
+        keep_ids = index.ids[mask].tolist()
+        keep = index.tf[mask]
+
+    ids, rows = [], []
+    for product in changed.values(*VECTOR_FIELDS).iterator(chunk_size=2000):
+        ids.append(product['id'])
+        rows.append(vectorize(product))
+
+    tf = sparse.vstack([keep, _stack(rows)], format='csr')
+    _write(index_dir, keep_ids + ids, tf, built_at, categories)
+    _clean(index_dir, keep=2)
+    stats = UpdateStats(rows=len(keep_ids) + len(ids), vectorized=len(ids),
+                        full=full, duration=time.perf_counter() - start)
+    logger.info('Similar index updated: %d rows, %d vectorized (%.1f ms)',
+                stats.rows, stats.vectorized, stats.duration * 1000)
+    return stats
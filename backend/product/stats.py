@@ -0,0 +1,170 @@
+'''
+Per product & day activity rollups (ProductDailyStats).
+The write paths add to today's row of the product as they happen,
+with one INSERT ... ON CONFLICT DO UPDATE for any number of products:
+- views: flushed hit counts (product.counters)
+- favorites: favorites saved, minus the ones removed
+- chat_rooms: chat rooms opened
+- reservations: direct transactions created
+- sales: direct transactions completed, minus the ones reopened
+rebuild() recomputes everything but views from the source tables,
+for live products, the stats of archived products are kept as they were.
+'''
+import time
+from collections import defaultdict, namedtuple
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from core.models import (
+    ChatRoom,
+    DirectTransaction,
+    Favorite,
+    Product,
+    ProductDailyStats,
+)
+
+STAT_FIELDS = ['views', 'favorites', 'chat_rooms', 'reservations', 'sales']
+# Stats derived from rows still in the DB, every stat but views
+REBUILT_FIELDS = STAT_FIELDS[1:]
+# Longest dashboard period in days
+MAX_DAYS = 365
+
+RebuildStats = namedtuple('RebuildStats', ['rows', 'duration'])
+
+
+def _upsert(counts, replace=()):
+    '''
+    Write {(product_id, date): {stat: n}} with one statement, adding to
+    the stored stats, or replacing them for the stat names in replace.
+    '''
+    if not counts:
+        return
+    table = ProductDailyStats._meta.db_table
+    product_table = Product._meta.db_table
+    columns = ', '.join(STAT_FIELDS)
+    # Typed placeholders, VALUES parameters are text to postgres otherwise
+    row = '(%s::bigint, %s::date' + ', %s::integer' * len(STAT_FIELDS) + ')'
+    values = ', '.join([row] * len(counts))
+    updates = ', '.join(
+        f'{name} = EXCLUDED.{name}' if name in replace
+        else f'{name} = {table}.{name} + EXCLUDED.{name}'
+        for name in STAT_FIELDS)
+    params = []
+    # Locking rows in the same order in every transaction
+    for (product_id, date), stats in sorted(counts.items()):
+        params += [product_id, date] + [stats.get(name, 0) for name in STAT_FIELDS]
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (product_id, seller_id, date, {columns}) '
+            f'SELECT p.id, p.seller_id, v.date, '
+            f'{", ".join(f"v.{name}" for name in STAT_FIELDS)} '
+            f'FROM (VALUES {values}) AS v(product_id, date, {columns}) '
+            f'JOIN {product_table} p ON p.id = v.product_id '
+            f'ON CONFLICT (product_id, date) DO UPDATE SET {updates}',
+            params)
+
+
+def record_many(counts, date=None):
+    '''Add {product_id: {stat: n}} to the products' stats of the day'''
+    date = date or timezone.localdate()
+    _upsert({(product_id, date): stats for product_id, stats in counts.items()})
+
+
+def record(product_id, **stats):
+    '''Add the stats, e.g. favorites=1, to the product's stats of the day'''
+    record_many({product_id: stats})
+
+
+def get_seller_stats(seller, days):
+    '''
+    Return the seller's stats of the last days, today included:
+    totals, one entry per day & one per product with any activity.
+    Summed per day & per product by a single GROUPING SETS query
+    over an index only scan of the seller's rows.
+    '''
+    until = timezone.localdate()
+    since = until - timedelta(days=days - 1)
+    sums = ', '.join(f'SUM({name})::bigint' for name in STAT_FIELDS)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT product_id, date, {sums} '
+            f'FROM {ProductDailyStats._meta.db_table} '
+            f'WHERE seller_id = %s AND date >= %s '
+            f'GROUP BY GROUPING SETS ((product_id), (date))',
+            [seller.id, since])
+        rows = cursor.fetchall()
+
+    def fill(values):
+        return dict(zip(STAT_FIELDS, values))
+
+    by_date, products = {}, []
+    for product_id, date, *values in rows:
+        if product_id is None:
+            by_date[date] = fill(values)
+        else:
+            products.append({'product': product_id, **fill(values)})
+    products.sort(key=lambda stats: (-stats['views'], -stats['product']))
+    empty = dict.fromkeys(STAT_FIELDS, 0)
+    return {
+        'since': since,
+        'until': until,
+        'totals': {name: sum(stats[name] for stats in by_date.values())
+                   for name in STAT_FIELDS},
+        'days': [{'date': date, **by_date.get(date, empty)}
+                 for date in (since + timedelta(days=offset)
+                              for offset in range(days))],
+        'products': products,
+    }
+
+
+def _count_by_date(queryset, product, date, since):
+    # {(product_id, date): count} of the queryset rows
+    if since is not None:
+        queryset = queryset.filter(**{f'{date}__date__gte': since})
+    rows = (queryset
+            .annotate(day=TruncDate(date))
+            .values_list(product, 'day')
+            .annotate(count=Count('pk'))
+            .order_by())
+    return {(product_id, day): count for product_id, day, count in rows}
+
+
+def rebuild(since=None):
+    '''
+    Recompute favorites, chat rooms, reservations & sales from the
+    source tables, from the since date or for the whole history,
+    returning RebuildStats. Views only exist in the rollups and are kept.
+    Favorites removed & sales reopened before the rebuild aren't counted.
+    Archived products are left alone, their favorites were dropped.
+    '''
+    start = time.perf_counter()
+    sources = {
+        'favorites': _count_by_date(Favorite.objects.all(),
+                                    'product_id', 'created_at', since),
+        'chat_rooms': _count_by_date(ChatRoom.objects.all(),
+                                     'product_id', 'created_at', since),
+        'reservations': _count_by_date(DirectTransaction.objects.all(),
+                                       'chatroom__product_id', 'created_at', since),
+        # Completion time approximated by the last modification
+        'sales': _count_by_date(DirectTransaction.objects.filter(status='complete'),
+                                'chatroom__product_id', 'modified_at', since),
+    }
+    counts = defaultdict(dict)
+    for name, source in sources.items():
+        for key, count in source.items():
+            counts[key][name] = count
+
+    stale = ProductDailyStats.objects.filter(
+        product_id__in=Product.objects.values('id'))
+    if since is not None:
+        stale = stale.filter(date__gte=since)
+    with transaction.atomic():
+        stale.update(**{name: 0 for name in REBUILT_FIELDS})
+        _upsert(counts, replace=REBUILT_FIELDS)
+        stale.filter(**{name: 0 for name in STAT_FIELDS}).delete()
+    return RebuildStats(rows=len(counts), duration=time.perf_counter() - start)
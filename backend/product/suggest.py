@@ -0,0 +1,264 @@
+'''
+Search box suggestions: distinct titles of unsold products & category
+names with a word starting with the typed query, e.g. "cam" or
+"red cam" for "Red camera bag". Titles starting with the query come
+first, then the most bookmarked.
+
+Titles are looked up through a pluggable backend:
+- TrigramSuggestBackend: a word boundary regex served by the pg_trgm
+  GIN index of unsold titles, see migration 0014
+- PrefixSuggestBackend: an in-process sorted index of every word start
+  suffix of the titles searched with bisect, rebuilt from Product.title,
+  for databases without pg_trgm
+
+Results are cached per query & tag versions (see product.list_cache),
+fetched along with the cached results of the query's shorter prefixes.
+The prefix index is rebuilt once the product tag version changes, which
+it does at least every VERSION_TIMEOUT.
+While typing, a complete result of a shorter prefix is narrowed down
+without any lookup.
+Configured with the PRODUCT_SUGGEST setting:
+- BACKEND: dotted path of the title backend, 'auto' for the trigram one
+  when its index exists
+- LIMIT: number of titles & categories suggested at most
+- MIN_LENGTH: characters needed before suggesting anything
+- CACHE_TIMEOUT: seconds a result is cached
+- REBUILD_INTERVAL: seconds between rebuilds of a stale prefix index
+'''
+import hashlib
+import heapq
+import re
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.db import connection
+from django.db.models import BooleanField, ExpressionWrapper, Max, Q
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from core.models import Product
+from product import list_cache
+from product.categories import get_category_nodes
+
+DEFAULTS = {
+    'BACKEND': 'auto',
+    'LIMIT': 10,
+    'MIN_LENGTH': 1,
+    'CACHE_TIMEOUT': 60,
+    'REBUILD_INTERVAL': 60,
+}
+
+TRIGRAM_INDEX = 'product_title_trgm_idx'
+WORD_START = re.compile(r'\b\w')
+MAX_QUERY_LENGTH = 64
+
+
+def get_options():
+    return {**DEFAULTS, **getattr(settings, 'PRODUCT_SUGGEST', {})}
+
+
+def normalize(query):
+    '''Case folded query with single spaces, cut to MAX_QUERY_LENGTH'''
+    return ' '.join(query.casefold().split())[:MAX_QUERY_LENGTH]
+
+
+def get_word_starts(text):
+    '''Return the suffixes of the normalized text starting at a word'''
+    text = normalize(text)
+    return [text[match.start():] for match in WORD_START.finditer(text)]
+
+
+def matches(text, query):
+    '''Whether a word of the text starts with the normalized query'''
+    return any(suffix.startswith(query) for suffix in get_word_starts(text))
+
+
+def rank(suggestions, query, limit):
+    '''
+    Return the top limit [title, popularity] of the suggestions matching
+    the query, the ones starting with it first, then the most popular
+    '''
+    return heapq.nsmallest(
+        limit,
+        ([title, popularity] for title, popularity in suggestions
+         if matches(title, query)),
+        key=lambda item: (not normalize(item[0]).startswith(query),
+                          -item[1], item[0]))
+
+
+class TrigramSuggestBackend:
+    '''Matching unsold titles in the DB through the pg_trgm index'''
+
+    def __init__(self, options):
+        pass
+
+    def suggest(self, query, limit):
+        '''Return up to limit [title, popularity] of the normalized query'''
+        # Postgres \m matches at the start of a word
+        pattern = r'\m' + r'\s+'.join(map(re.escape, query.split(' ')))
+        rows = (Product.objects
+                .filter(is_sold=False, title__iregex=pattern)
+                .values('title')
+                .annotate(popularity=Max('bookmark_cnt'),
+                          starts=ExpressionWrapper(Q(title__istartswith=query),
+                                                   output_field=BooleanField()))
+                .order_by('-starts', '-popularity', 'title')
+                .values_list('title', 'popularity'))
+        return [list(row) for row in rows[:limit]]
+
+
+class PrefixSuggestBackend:
+    '''
+    Matching unsold titles in process, from a sorted list of every
+    (word start suffix, title) searched with bisect like a prefix trie.
+    Rebuilt once the product tag changed, REBUILD_INTERVAL apart at most.
+    '''
+
+    def __init__(self, options):
+        self.rebuild_interval = options['REBUILD_INTERVAL']
+        self._lock = threading.Lock()
+        self._keys = self._entries = None
+        self._version = None
+        self._built_at = 0.0
+
+    def build(self):
+        '''Index the titles of unsold products'''
+        popularity = {}
+        rows = (Product.objects
+                .filter(is_sold=False)
+                .values_list('title', 'bookmark_cnt')
+                .iterator(chunk_size=5000))
+        for title, bookmark_cnt in rows:
+            popularity[title] = max(popularity.get(title, 0), bookmark_cnt)
+        # Sorted (suffix, title, whether the suffix is the whole title)
+        entries = sorted((suffix, title, len(suffix) == len(normalize(title)))
+                         for title in popularity
+                         for suffix in get_word_starts(title))
+        self._keys = [suffix for suffix, _, _ in entries]
+        self._entries = [(title, popularity[title], starts)
+                         for _, title, starts in entries]
+
+    def _ensure_built(self):
+        version = list_cache.get_tag_versions()[list_cache.TAGS.index('product')]
+        if self._keys is not None and (
+                version == self._version
+                or time.monotonic() - self._built_at < self.rebuild_interval):
+            return
+        with self._lock:
+            if self._keys is None or version != self._version:
+                self.build()
+                self._version = version
+                self._built_at = time.monotonic()
+
+    def suggest(self, query, limit):
+        self._ensure_built()
+        keys, entries = self._keys, self._entries
+        start = bisect_left(keys, query)
+        end = bisect_left(keys, query + '\U0010ffff', lo=start)
+        popular, starting = {}, set()
+        for title, popularity, starts in entries[start:end]:
+            popular[title] = popularity
+            if starts:
+                starting.add(title)
+        top = heapq.nsmallest(limit, popular, key=lambda title: (
+            title not in starting, -popular[title], title))
+        return [[title, popular[title]] for title in top]
+
+
+def has_trigram_index():
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1 FROM pg_indexes WHERE indexname = %s',
+                       [TRIGRAM_INDEX])
+        return cursor.fetchone() is not None
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    '''Return the process wide title backend built from PRODUCT_SUGGEST'''
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                options = get_options()
+                path = options['BACKEND']
+                if path == 'auto':
+                    path = ('product.suggest.TrigramSuggestBackend'
+                            if connection.vendor == 'postgresql' and has_trigram_index()
+                            else 'product.suggest.PrefixSuggestBackend')
+                _backend = import_string(path)(options)
+    return _backend
+
+
+@receiver(setting_changed)
+def reset_backend(setting, **kwargs):
+    global _backend
+    if setting == 'PRODUCT_SUGGEST':
+        _backend = None
+
+
+def suggest_categories(query, limit):
+    '''Return up to limit active {id, name} categories matching the query'''
+    found = [(not normalize(node['name']).startswith(query), node['name'], node_id)
+             for node_id, node in get_category_nodes().items()
+             if node['is_active'] and matches(node['name'], query)]
+    return [{'id': node_id, 'name': name}
+            for _, name, node_id in heapq.nsmallest(limit, found)]
+
+
+def _cache_key(query):
+    digest = hashlib.sha1(query.encode()).hexdigest()
+    return f'product_suggest:{digest}'
+
+
+def get_suggestions(query):
+    '''
+    Return {'query', 'titles', 'categories'} suggested for the query,
+    and whether it was answered from the cache, as (data, cache status)
+    with the cache status HIT, PREFIX (narrowed down) or MISS
+    '''
+    options = get_options()
+    limit = options['LIMIT']
+    query = normalize(query)
+    if not query or len(query) < options['MIN_LENGTH']:
+        return {'query': query, 'titles': [], 'categories': []}, 'MISS'
+
+    versions = list_cache.get_tag_versions()
+    # The query's cached result & the ones of its prefixes in one round trip
+    keys = [_cache_key(query[:end])
+            for end in range(max(options['MIN_LENGTH'], 1), len(query) + 1)]
+    entries = cache.get_many(keys)
+
+    def fresh(key):
+        entry = entries.get(key)
+        return entry if entry is not None and entry['versions'] == versions else None
+
+    exact = fresh(keys[-1])
+    if exact is not None:
+        return exact['data'], 'HIT'
+
+    # Longest prefix first, the fewest titles to narrow down
+    for key in reversed(keys[:-1]):
+        entry = fresh(key)
+        if entry is not None and entry['complete']:
+            titles, status = rank(entry['titles'], query, limit), 'PREFIX'
+            break
+    else:
+        titles, status = get_backend().suggest(query, limit), 'MISS'
+
+    data = {'query': query,
+            'titles': [title for title, _ in titles],
+            'categories': suggest_categories(query, limit)}
+    cache.set(keys[-1], {'versions': versions,
+                         'data': data,
+                         'titles': titles,
+                         # Fewer than limit titles are every match
+                         'complete': len(titles) < limit},
+              options['CACHE_TIMEOUT'])
+    return data, status
@@ -1,9 +1,13 @@
+import time
+from unittest.mock import patch
+
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 
 from core.models import Category
+from product import categories
 from product.serializers import CategorySerializer
 
 CATEGORY_URL = reverse('product:category-list')
@@ -94,3 +98,102 @@ class PrivateCategoryAPITest(APITestCase):
         res = self.client.delete(detail_url(category.id))
         self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
         self.assertFalse(Category.objects.filter(id=category.id).exists())
+
+
+class CategoryTreeAPITest(APITestCase):
+    '''Test the cached category tree listing'''
+
+    def setUp(self):
+        self.electronics = Category.objects.create(name='Electronics')
+        self.phones = Category.objects.create(name='Phones', parent=self.electronics)
+        self.android = Category.objects.create(name='Android', parent=self.phones)
+        self.laptops = Category.objects.create(name='Laptops', parent=self.electronics)
+        self.books = Category.objects.create(name='Books')
+
+    def test_tree_matches_serializer(self):
+        '''Test the built tree has the same shape as CategorySerializer'''
+        roots = Category.objects.root_nodes()
+        serializer = CategorySerializer(roots, many=True)
+
+        res = self.client.get(CATEGORY_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json()['results'], serializer.data)
+
+    def test_tree_single_query_and_cached(self):
+        '''Test the tree built from one query, then served from the cache'''
+        for i in range(30):
+            Category.objects.create(name=f'Sub {i}', parent=self.laptops)
+
+        with self.assertNumQueries(1):
+            self.client.get(CATEGORY_URL)
+        with self.assertNumQueries(0):
+            self.client.get(CATEGORY_URL)
+
+    def test_tree_invalidated_on_change(self):
+        '''Test saving, moving and deleting a category refreshes the tree'''
+        self.client.get(CATEGORY_URL)
+
+        self.android.name = 'Android phones'
+        self.android.save()
+        res = self.client.get(CATEGORY_URL, {'root': self.phones.id})
+        self.assertEqual(res.data['results'][0]['children'][0]['name'],
+                         'Android phones')
+
+        self.android.move_to(self.books)
+        res = self.client.get(CATEGORY_URL, {'root': self.books.id})
+        self.assertEqual(res.data['results'][0]['children'][0]['id'],
+                         self.android.id)
+
+        self.android.delete()
+        res = self.client.get(CATEGORY_URL, {'root': self.books.id})
+        self.assertEqual(res.data['results'][0]['children'], [])
+
+    def test_tree_refreshed_once_the_version_expires(self):
+        '''Test changes from other processes served once the version expires'''
+        self.client.get(CATEGORY_URL)
+        # Another process' change, the local cache isn't invalidated
+        Category.objects.filter(id=self.books.id).update(name='Novels')
+        res = self.client.get(CATEGORY_URL, {'root': self.books.id})
+        self.assertEqual(res.data['results'][0]['name'], 'Books')
+
+        later = time.time() + categories.TREE_VERSION_TIMEOUT + 1
+        with patch('time.time', return_value=later):
+            res = self.client.get(CATEGORY_URL, {'root': self.books.id})
+
+        self.assertEqual(res.data['results'][0]['name'], 'Novels')
+
+    def test_tree_root_and_depth(self):
+        '''Test loading a subtree limited by depth'''
+        res = self.client.get(CATEGORY_URL, {'root': self.electronics.id,
+                                             'depth': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        root = res.data['results'][0]
+        self.assertEqual(root['id'], self.electronics.id)
+        self.assertEqual([child['id'] for child in root['children']],
+                         [self.laptops.id, self.phones.id])
+        self.assertEqual(root['children'][1]['children'], [])
+
+    def test_deep_depths_share_the_full_tree(self):
+        '''Test depths past the deepest level cached as the full tree'''
+        res = self.client.get(CATEGORY_URL)
+        self.client.get(CATEGORY_URL, {'depth': 3})
+        version = categories.get_tree_version()
+        entries = set(categories._local_cache[version])
+
+        for depth in (4, 1000, 10 ** 9):
+            with self.assertNumQueries(0):
+                deep = self.client.get(CATEGORY_URL, {'depth': depth})
+            self.assertEqual(deep.data, res.data)
+            self.assertEqual(deep['ETag'], res['ETag'])
+
+        self.assertEqual(set(categories._local_cache[version]), entries)
+
+    def test_tree_invalid_params(self):
+        '''Test returning errors for an unknown root or an invalid depth'''
+        res = self.client.get(CATEGORY_URL, {'root': self.books.id + 100})
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+        res = self.client.get(CATEGORY_URL, {'depth': 0})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,169 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from core.models import Category, Favorite, Product, ProductImage
+from product.counters import get_hit_counter
+
+CATEGORY_URL = reverse('product:category-list')
+
+
+def detail_url(product_id):
+    # Create and return a product detail URL
+    return reverse("product:product-detail", args=[product_id])
+
+
+def create_user(email='user@example.com', password='test123123123'):
+    # Create & Return a user
+    return get_user_model().objects.create_user(email=email, password=password)
+
+
+class ProductConditionalGetAPITest(APITestCase):
+    '''Test ETag validation of product detail'''
+
+    def setUp(self):
+        self.user = create_user()
+        self.client.force_authenticate(self.user)
+        category = Category.objects.create(name='Test Category')
+        self.product = Product.objects.create(
+            seller=self.user,
+            category=category,
+            title='test_product',
+            price=Decimal('10.00'),
+            description='test description'
+        )
+        self.url = detail_url(self.product.id)
+
+    def get_etag(self):
+        res = self.client.get(self.url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res['ETag']
+
+    def test_validators_returned(self):
+        '''Test a weak ETag set, without a Last-Modified missing favorite changes'''
+        res = self.client.get(self.url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res['ETag'].startswith('W/"'))
+        self.assertNotIn('Last-Modified', res)
+        self.assertIn('Authorization', res['Vary'])
+
+    def test_not_modified_from_one_query(self):
+        '''Test a matching If-None-Match answered with 304 from one query'''
+        etag = self.get_etag()
+
+        with self.assertNumQueries(1):
+            res = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], etag)
+        self.assertEqual(res.content, b'')
+
+    def test_not_modified_still_counts_hit(self):
+        '''Test a 304 still counted as a product view'''
+        etag = self.get_etag()
+        self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        get_hit_counter().flush()
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.hit_cnt, 2)
+
+    @override_settings(HIT_COUNTER={'MAX_PENDING': 1})
+    def test_not_modified_across_counter_flushes(self):
+        '''Test counted views & bookmarks leaving the ETag unchanged'''
+        etag = self.get_etag()
+        Product.objects.filter(id=self.product.id).update(bookmark_cnt=3)
+
+        res = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.hit_cnt, 2)
+
+    def test_if_modified_since_ignored(self):
+        '''Test If-Modified-Since never answered with a stale 304'''
+        self.client.get(self.url)
+        Favorite.objects.create(user=self.user, product=self.product)
+
+        res = self.client.get(self.url,
+                              HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.data['favorite'])
+
+    def test_etag_changes(self):
+        '''Test the ETag changing with everything the body depends on'''
+        changes = [
+            lambda: Favorite.objects.create(user=self.user, product=self.product),
+            lambda: ProductImage.objects.create(product=self.product,
+                                                image='uploads/products/a.jpg'),
+            lambda: ProductImage.objects.update(
+                variants={'160': {'jpeg': 'uploads/products/a_160w.jpg'}}),
+            lambda: self.product.save(),
+        ]
+        etags = [self.get_etag()]
+        for change in changes:
+            change()
+            etags.append(self.get_etag())
+
+        self.assertEqual(len(set(etags)), len(etags))
+
+    def test_etag_per_user(self):
+        '''Test the user's favorite flag part of the ETag'''
+        Favorite.objects.create(user=self.user, product=self.product)
+        etag = self.get_etag()
+
+        self.client.force_authenticate(create_user(email='other@example.com'))
+        res = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse(res.data['favorite'])
+
+    def test_unknown_product(self):
+        '''Test missing products not found before any conditional check'''
+        res = self.client.get(detail_url(0), HTTP_IF_NONE_MATCH='*')
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class CategoryConditionalGetAPITest(APITestCase):
+    '''Test ETag on the category tree'''
+
+    def setUp(self):
+        cache.clear()
+        self.root = Category.objects.create(name='Electronics')
+        Category.objects.create(name='Phones', parent=self.root)
+        Category.objects.create(name='Books')
+
+    def test_not_modified_without_query(self):
+        '''Test a matching If-None-Match answered from the tree cache'''
+        etag = self.client.get(CATEGORY_URL)['ETag']
+
+        with self.assertNumQueries(0):
+            res = self.client.get(CATEGORY_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_etag_per_params(self):
+        '''Test each tree shape & page having its own ETag'''
+        etags = {self.client.get(CATEGORY_URL, params)['ETag']
+                 for params in ({}, {'depth': 1}, {'root': self.root.id}, {'p': 1})}
+
+        self.assertEqual(len(etags), 4)
+
+    def test_etag_changes_with_tree(self):
+        '''Test the ETag changing once the tree changes'''
+        etag = self.client.get(CATEGORY_URL)['ETag']
+        Category.objects.create(name='Garden')
+
+        res = self.client.get(CATEGORY_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+        self.assertEqual(len(res.data['results']), 3)
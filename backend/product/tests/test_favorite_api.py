@@ -5,7 +5,10 @@ from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 
-from core.models import Category, Favorite, Product
+from core.models import Category, Favorite, Product, ProductImage
+
+PRODUCT_URL = reverse('product:product-list')
+FAVORITE_LIST_URL = reverse('product:favorite-list')
 
 
 def favorite_url(product_id):
@@ -13,6 +16,11 @@ def favorite_url(product_id):
     return reverse("product:favorite", args=[product_id])
 
 
+def detail_url(product_id):
+    # Create and return a product detail URL
+    return reverse("product:product-detail", args=[product_id])
+
+
 def create_user(email='user@example.com', password='test123123123'):
     # Create & Return a user
     return get_user_model().objects.create_user(email=email, password=password)
@@ -61,6 +69,13 @@ class PrivateFavoriteAPITest(APITestCase):
         favorite = Favorite.objects.first()
         self.assertEqual(self.user, favorite.user)
         self.assertEqual(product, favorite.product)
+        product.refresh_from_db()
+        self.assertEqual(product.bookmark_cnt, 1)
+
+        res = self.client.post(favorite_url(product.id))
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        product.refresh_from_db()
+        self.assertEqual(product.bookmark_cnt, 1)
 
     def test_favorite_delete(self):
         category = Category.objects.create(name='Test Category')
@@ -82,3 +97,144 @@ class PrivateFavoriteAPITest(APITestCase):
         cnt = Favorite.objects.count()
         self.assertEqual(cnt, 0)
         self.assertEqual(favorite.user, self.user)
+
+    def test_favorite_bookmark_cnt_round_trip(self):
+        '''Test bookmark_cnt following favorite create & delete'''
+        category = Category.objects.create(name='Test Category')
+        product = Product.objects.create(
+            seller=self.user,
+            category=category,
+            title='test_product',
+            price=Decimal('10.00'),
+            description='test description'
+        )
+
+        self.client.post(favorite_url(product.id))
+        res = self.client.delete(favorite_url(product.id))
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        product.refresh_from_db()
+        self.assertEqual(product.bookmark_cnt, 0)
+
+        res = self.client.delete(favorite_url(product.id))
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        product.refresh_from_db()
+        self.assertEqual(product.bookmark_cnt, 0)
+
+
+class FavoriteFlagAPITest(APITestCase):
+    '''Test the favorite flag on product list & detail'''
+
+    def setUp(self):
+        self.user = create_user()
+        category = Category.objects.create(name='Test Category')
+        self.products = [Product.objects.create(
+            seller=self.user,
+            category=category,
+            title=f'test_product_{i}',
+            price=Decimal('10.00'),
+            description='test description'
+        ) for i in range(5)]
+        Favorite.objects.create(user=self.user, product=self.products[1])
+        Favorite.objects.create(user=create_user(email='other@example.com'),
+                                product=self.products[2])
+
+    def test_list_flags_without_query_per_product(self):
+        '''Test the list flagging the user's favorites in constant queries'''
+        self.client.force_authenticate(self.user)
+
+        # count, page (with EXISTS)
+        with self.assertNumQueries(2):
+            res = self.client.get(PRODUCT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        flags = {item['id']: item['favorite'] for item in res.data['results']}
+        self.assertEqual(flags, {product.id: product == self.products[1]
+                                 for product in self.products})
+
+    def test_detail_flag(self):
+        '''Test the detail flag for the user'''
+        self.client.force_authenticate(self.user)
+
+        res = self.client.get(detail_url(self.products[1].id))
+        self.assertTrue(res.data['favorite'])
+
+        res = self.client.get(detail_url(self.products[2].id))
+        self.assertFalse(res.data['favorite'])
+
+    def test_anonymous_flags_false(self):
+        '''Test anonymous users getting false instead of an error'''
+        res = self.client.get(PRODUCT_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse(any(item['favorite'] for item in res.data['results']))
+
+        res = self.client.get(detail_url(self.products[1].id))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse(res.data['favorite'])
+
+
+class FavoriteListAPITest(APITestCase):
+    '''Test listing the user's favorites'''
+
+    def setUp(self):
+        self.user = create_user()
+        self.other = create_user(email='other@example.com')
+        self.category = Category.objects.create(name='Test Category')
+        self.products = [self.create_product(f'test_product_{i}') for i in range(3)]
+        for product in (self.products[2], self.products[0]):
+            Favorite.objects.create(user=self.user, product=product)
+        Favorite.objects.create(user=self.other, product=self.products[1])
+        ProductImage.objects.create(product=self.products[0],
+                                    image='uploads/products/b.jpg', position=1)
+        ProductImage.objects.create(product=self.products[0],
+                                    image='uploads/products/a.jpg', position=0)
+
+    def create_product(self, title):
+        return Product.objects.create(seller=self.other,
+                                      category=self.category,
+                                      title=title,
+                                      price=Decimal('10.00'),
+                                      description='test description')
+
+    def test_auth_required(self):
+        '''Test auth required for the favorites list'''
+        res = self.client.get(FAVORITE_LIST_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_list_favorites(self):
+        '''Test only the user's favorites listed, newest first'''
+        self.client.force_authenticate(self.user)
+
+        res = self.client.get(FAVORITE_LIST_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['count'], 2)
+        products = [item['product'] for item in res.data['results']]
+        self.assertEqual([product['id'] for product in products],
+                         [self.products[0].id, self.products[2].id])
+        self.assertTrue(all(product['favorite'] for product in products))
+        self.assertTrue(products[0]['thumbnail'].endswith('uploads/products/a.jpg'))
+        self.assertIsNone(products[1]['thumbnail'])
+        self.assertNotIn('description', products[0])
+
+    def test_constant_queries(self):
+        '''Test a page loaded with the same queries whatever its size'''
+        self.client.force_authenticate(self.user)
+        for i in range(10):
+            Favorite.objects.create(user=self.user,
+                                    product=self.create_product(f'more_{i}'))
+
+        # count, page joined with the products, images
+        with self.assertNumQueries(3):
+            res = self.client.get(FAVORITE_LIST_URL)
+        self.assertEqual(len(res.data['results']), 12)
+
+    def test_cursor_pagination(self):
+        '''Test the favorites paged by cursor'''
+        self.client.force_authenticate(self.user)
+
+        res = self.client.get(FAVORITE_LIST_URL, {'cursor': ''})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('count', res.data)
+        self.assertEqual([item['product']['id'] for item in res.data['results']],
+                         [self.products[0].id, self.products[2].id])
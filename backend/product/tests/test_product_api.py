@@ -1,13 +1,19 @@
 import tempfile
+import threading
 from decimal import Decimal
+from unittest.mock import patch
 
 from django.contrib.auth import get_user_model
+from django.db import DatabaseError
+from django.test import override_settings
 from django.urls import reverse
 from PIL import Image
 from rest_framework import status
 from rest_framework.test import APITestCase
 
 from core.models import Category, Product
+from product import categories
+from product.counters import HitCounter, LocalHitCounterBackend, get_hit_counter
 from product.serializers import ProductSerializer
 
 PRODUCT_URL = reverse('product:product-list')
@@ -157,3 +163,190 @@ class PrivateProductAPITest(APITestCase):
         res = self.client.delete(detail_url(product.id))
         self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
         self.assertFalse(Product.objects.filter(id=product.id).exists())
+
+
+class KeysetPaginationAPITest(APITestCase):
+    '''Test opt-in keyset pagination on the product list'''
+
+    def setUp(self):
+        self.user = create_user()
+        category = Category.objects.create(name='Test Category')
+        self.products = [
+            Product.objects.create(
+                seller=self.user,
+                category=category,
+                title=f'product_{i}',
+                price=Decimal('10.00'),
+                description='test description'
+            ) for i in range(45)
+        ]
+        # Sharing a timestamp forces the id tie-breaker to be used
+        Product.objects.filter(id__in=[p.id for p in self.products[15:25]]) \
+            .update(created_at=self.products[15].created_at)
+
+    def test_walk_forward_and_back(self):
+        '''Test walking pages with next & previous cursors'''
+        expected = list(Product.objects
+                        .order_by('-created_at', '-id')
+                        .values_list('id', flat=True))
+
+        res = self.client.get(PRODUCT_URL, {'cursor': ''})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('count', res.data)
+        self.assertIsNone(res.data['previous'])
+
+        seen, pages = [], []
+        while True:
+            ids = [item['id'] for item in res.data['results']]
+            seen += ids
+            pages.append(ids)
+            if not res.data['next']:
+                break
+            res = self.client.get(res.data['next'])
+        self.assertEqual(seen, expected)
+        self.assertEqual([len(ids) for ids in pages], [20, 20, 5])
+
+        res = self.client.get(res.data['previous'])
+        self.assertEqual([item['id'] for item in res.data['results']], pages[1])
+
+    def test_page_number_pagination_by_default(self):
+        '''Test page number pagination kept without the cursor param'''
+        res = self.client.get(PRODUCT_URL, {'p': 2})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['count'], 45)
+
+    def test_invalid_cursor(self):
+        '''Test returning not found for a malformed cursor'''
+        res = self.client.get(PRODUCT_URL, {'cursor': 'not-a-cursor'})
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_cursor_with_other_orderings_rejected(self):
+        '''Test cursors refused for sorts & searches they can't follow'''
+        for params in ({'ordering': 'price'}, {'ordering': '-bookmark_cnt'},
+                       {'q': 'test'}):
+            with self.subTest(params=params):
+                res = self.client.get(PRODUCT_URL, {'cursor': '', **params})
+                self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+                self.assertIn('cursor', res.data)
+
+        res = self.client.get(PRODUCT_URL, {'cursor': '', 'ordering': '-created_at'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+
+class CategoryTreeFilterAPITest(APITestCase):
+    '''Test filtering products by a category subtree'''
+
+    def setUp(self):
+        self.user = create_user()
+        self.electronics = Category.objects.create(name='Electronics')
+        self.phones = Category.objects.create(name='Phones', parent=self.electronics)
+        self.retired = Category.objects.create(name='Retired',
+                                               parent=self.electronics,
+                                               is_active=False)
+        self.pagers = Category.objects.create(name='Pagers', parent=self.retired)
+        self.books = Category.objects.create(name='Books')
+
+    def create_product(self, category):
+        return Product.objects.create(
+            seller=self.user,
+            category=category,
+            title='test_product',
+            price=Decimal('10.00'),
+            description='test description'
+        )
+
+    def test_filter_includes_descendants(self):
+        '''Test products of subcategories included, inactive subtrees excluded'''
+        in_root = self.create_product(self.electronics)
+        in_child = self.create_product(self.phones)
+        self.create_product(self.retired)
+        self.create_product(self.pagers)
+        self.create_product(self.books)
+
+        res = self.client.get(PRODUCT_URL, {'category_tree': self.electronics.id})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        ids = {item['id'] for item in res.data['results']}
+        self.assertEqual(ids, {in_root.id, in_child.id})
+
+    def test_filter_unknown_category(self):
+        '''Test an unknown category matching no products'''
+        self.create_product(self.books)
+
+        res = self.client.get(PRODUCT_URL, {'category_tree': self.books.id + 100})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'], [])
+
+    def test_unknown_categories_not_memoized(self):
+        '''Test unknown category ids leaving the in process cache as it was'''
+        categories.get_descendant_ids(self.books.id)
+        entries = dict(categories._local_cache[categories.get_tree_version()])
+
+        for category_id in range(self.books.id + 1, self.books.id + 50):
+            self.assertEqual(categories.get_descendant_ids(category_id), [])
+            self.assertEqual(categories.get_category_path(category_id), [])
+
+        self.assertEqual(categories._local_cache[categories.get_tree_version()],
+                         entries)
+
+
+@override_settings(HIT_COUNTER={'FLUSH_INTERVAL': 3600, 'MAX_PENDING': 2})
+class ProductHitCounterAPITest(APITestCase):
+    '''Test product detail views counted through the hit buffer'''
+
+    def test_retrieve_counts_hits(self):
+        '''Test views buffered, then flushed once enough products are pending'''
+        user = create_user()
+        self.client.force_authenticate(user)
+        category = Category.objects.create(name='Test Category')
+        first, second = [Product.objects.create(
+            seller=user,
+            category=category,
+            title='test_product',
+            price=Decimal('10.00'),
+            description='test description'
+        ) for _ in range(2)]
+
+        self.client.get(detail_url(first.id))
+        self.client.get(detail_url(first.id))
+        first.refresh_from_db()
+        self.assertEqual(first.hit_cnt, 0)
+
+        self.client.get(detail_url(second.id))
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.hit_cnt, second.hit_cnt), (2, 1))
+
+    def test_failed_flush_kept_quietly(self):
+        '''Test a failing flush neither failing the view nor losing hits'''
+        user = create_user()
+        category = Category.objects.create(name='Test Category')
+        products = [Product.objects.create(
+            seller=user,
+            category=category,
+            title='test_product',
+            price=Decimal('10.00'),
+            description='test description'
+        ) for _ in range(2)]
+
+        with patch('product.stats.record_many', side_effect=DatabaseError), \
+                self.assertLogs('product.counters', 'ERROR'):
+            for product in products:
+                res = self.client.get(detail_url(product.id))
+                self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(get_hit_counter().flush().hits, 2)
+
+    def test_flushed_periodically(self):
+        '''Test a started counter flushing every interval without any view'''
+        counter = HitCounter(LocalHitCounterBackend({}),
+                             flush_interval=0.01, max_pending=1000)
+        flushed = threading.Event()
+
+        with patch.object(counter, 'flush', side_effect=flushed.set):
+            counter.start()
+            try:
+                self.assertTrue(flushed.wait(5))
+            finally:
+                counter.stop()
@@ -0,0 +1,171 @@
+from datetime import timedelta
+from io import StringIO
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from core import models
+from core.storage import is_referenced
+from product.archive import archive_products, archive_sold_products
+from product.stats import STAT_FIELDS, rebuild, record
+
+
+def detail_url(product_id):
+    return reverse('product:product-detail', args=[product_id])
+
+
+def create_user(email='user@example.com', password='test123123123', **extra):
+    # Create & Return a user
+    return get_user_model().objects.create_user(email=email, password=password,
+                                                **extra)
+
+
+class ProductArchiveTest(APITestCase):
+    '''Test moving sold products to the archive'''
+
+    def setUp(self):
+        self.seller = create_user(nickname='seller')
+        self.buyer = create_user(email='buyer@example.com', nickname='buyer')
+        county = models.County.objects.create(
+            name='Kent', country=models.Country.objects.create(name='UK'))
+        self.city = models.City.objects.create(name='Dover', county=county)
+        self.category = models.Category.objects.create(name='Books')
+        self.product = self.create_product('sold', is_sold=True)
+        self.images = [
+            models.ProductImage.objects.create(
+                product=self.product, image='uploads/products/b.jpg', position=1,
+                variants={'480': {'webp': 'uploads/products/b-480.webp'}}),
+            models.ProductImage.objects.create(
+                product=self.product, image='uploads/products/a.jpg', position=0),
+        ]
+        models.Favorite.objects.create(user=self.buyer, product=self.product)
+        self.room = models.ChatRoom.objects.create(product=self.product,
+                                                   seller=self.seller,
+                                                   buyer=self.buyer)
+        self.transaction = models.DirectTransaction.objects.create(
+            chatroom=self.room, location=self.city, location_detail='station',
+            time=timezone.now(), status='complete')
+        models.Review.objects.create(transaction=self.transaction,
+                                     reviewer=self.buyer, receiver=self.seller,
+                                     review='great', rating=5)
+        record(self.product.id, views=3)
+
+    def create_product(self, title, **extra):
+        return models.Product.objects.create(seller=self.seller,
+                                             category=self.category,
+                                             title=title,
+                                             price=Decimal('10.50'),
+                                             description='desc',
+                                             city=self.city,
+                                             **extra)
+
+    def test_archive_moves_rows(self):
+        '''Test the product & its images moved under the same ids'''
+        self.assertEqual(archive_products([self.product.id]), (1, 2))
+
+        self.assertFalse(models.Product.objects.filter(id=self.product.id).exists())
+        self.assertFalse(models.ProductImage.objects.exists())
+        archived = models.ArchivedProduct.objects.get(id=self.product.id)
+        self.assertEqual((archived.title, archived.price, archived.seller,
+                          archived.city, archived.created_at),
+                         (self.product.title, self.product.price, self.seller,
+                          self.city, self.product.created_at))
+        self.assertEqual([image.id for image in archived.images.all()],
+                         [self.images[1].id, self.images[0].id])
+        self.assertEqual(archived.images.get(position=1).variants,
+                         self.images[0].variants)
+
+    def test_references_resolved(self):
+        '''Test chat rooms, stats, transactions & reviews still resolved'''
+        archive_products([self.product.id])
+
+        room = models.ChatRoom.objects.get(id=self.room.id)
+        self.assertEqual(room.listing.title, 'sold')
+        self.assertFalse(models.Favorite.objects.exists())
+        self.assertTrue(models.ProductDailyStats.objects
+                        .filter(product_id=self.product.id).exists())
+
+        self.client.force_authenticate(self.buyer)
+        transaction_url = reverse('transaction:direct-transaction-list')
+        for params in ({}, {'cursor': ''}):
+            res = self.client.get(transaction_url, params)
+            self.assertEqual([(row['title'], row['price'])
+                              for row in res.data['results']],
+                             [('sold', '10.50')])
+        res = self.client.get(reverse('transaction:direct-transaction-detail',
+                                      args=[self.transaction.id]))
+        self.assertEqual(res.data['title'], 'sold')
+        res = self.client.get(reverse('review:review-list'))
+        self.assertEqual(res.data['results'][0]['product_title'], 'sold')
+
+    def test_stats_survive_rebuild(self):
+        '''Test rebuilding the stats keeping the ones of archived products'''
+        rebuild()
+        stats = models.ProductDailyStats.objects.filter(product_id=self.product.id)
+        before = list(stats.values(*STAT_FIELDS))
+        self.assertEqual(before, [{'views': 3, 'favorites': 1, 'chat_rooms': 1,
+                                   'reservations': 1, 'sales': 1}])
+        archive_products([self.product.id])
+
+        call_command('rebuild_product_stats', stdout=StringIO())
+
+        self.assertEqual(list(stats.values(*STAT_FIELDS)), before)
+
+    def test_detail_falls_through(self):
+        '''Test archived products served read only by the detail endpoint'''
+        archive_products([self.product.id])
+        self.client.force_authenticate(self.seller)
+
+        res = self.client.get(detail_url(self.product.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['title'], 'sold')
+        self.assertFalse(res.data['favorite'])
+        self.assertIsNotNone(res.data['archived_at'])
+        self.assertEqual([image['id'] for image in res.data['images']],
+                         [self.images[1].id, self.images[0].id])
+
+        res = self.client.get(detail_url(self.product.id),
+                              HTTP_IF_NONE_MATCH=res['ETag'])
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        res = self.client.patch(detail_url(self.product.id), {'title': 'new'})
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        for product_id in (0, 'abc'):
+            self.assertEqual(self.client.get(detail_url(product_id)).status_code,
+                             status.HTTP_404_NOT_FOUND)
+
+    def test_image_files_kept(self):
+        '''Test archived images still counted as references of their files'''
+        archive_products([self.product.id])
+
+        self.assertTrue(is_referenced('uploads/products/a.jpg'))
+
+    def test_archive_sold_products(self):
+        '''Test only products sold & unmodified since the cutoff archived'''
+        self.create_product('recently sold', is_sold=True)
+        unsold = self.create_product('unsold')
+        models.Product.objects.filter(id__in=[self.product.id, unsold.id]).update(
+            modified_at=timezone.now() - timedelta(days=31))
+
+        stats = archive_sold_products(after_days=30)
+
+        self.assertEqual((stats.products, stats.images), (1, 2))
+        self.assertEqual(set(models.Product.objects.values_list('title', flat=True)),
+                         {'recently sold', 'unsold'})
+
+    def test_constant_queries_per_batch(self):
+        '''Test a batch moved with the same queries, whatever its size'''
+        def run(count):
+            ids = [self.create_product(f'product {i}', is_sold=True).id
+                   for i in range(count)]
+            with self.assertNumQueries(8):
+                archive_products(ids)
+
+        run(1)
+        run(50)
@@ -0,0 +1,180 @@
+import csv
+import io
+import json
+from decimal import Decimal
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.asgi import get_asgi_application
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core.models import Category, Product, ProductImage
+from product import renderers
+from product.serializers import get_image_url, get_image_url_builder
+
+EXPORT_URL = reverse('product:product-export')
+
+
+def create_user(email='user@example.com', password='test123123123', **extra):
+    # Create & Return a user
+    return get_user_model().objects.create_user(email=email, password=password,
+                                                **extra)
+
+
+class PublicProductExportAPITest(APITestCase):
+    '''Test unauthenticated export requests'''
+
+    def test_auth_required(self):
+        '''Test auth required for exporting products'''
+        res = self.client.get(EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateProductExportAPITest(APITestCase):
+    '''Test streaming product exports'''
+
+    def setUp(self):
+        self.user = create_user()
+        self.other = create_user(email='other@example.com')
+        self.client.force_authenticate(self.user)
+        books = Category.objects.create(name='Books')
+        comics = Category.objects.create(name='Comics', parent=books)
+        self.product = self.create_product(self.user, comics, 'first')
+        self.create_product(self.user, books, 'second, "quoted"')
+        self.create_product(self.other, books, 'other')
+        ProductImage.objects.create(product=self.product,
+                                    image='uploads/products/b.jpg', position=1)
+        ProductImage.objects.create(product=self.product,
+                                    image='uploads/products/a.jpg', position=0)
+
+    def create_product(self, seller, category, title):
+        return Product.objects.create(seller=seller,
+                                      category=category,
+                                      title=title,
+                                      price=Decimal('10.50'),
+                                      description='multi\nline')
+
+    def get_content(self, res):
+        self.assertTrue(res.streaming)
+        return b''.join(res.streaming_content).decode()
+
+    def test_export_csv(self):
+        '''Test the user's products streamed as CSV by default'''
+        res = self.client.get(EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('products.csv', res['Content-Disposition'])
+        rows = list(csv.DictReader(io.StringIO(self.get_content(res))))
+        self.assertEqual([row['title'] for row in rows],
+                         ['first', 'second, "quoted"'])
+        self.assertEqual(rows[0]['category'], 'Books > Comics')
+        self.assertEqual(rows[0]['images'].split(' '), [
+            'http://testserver/static/media/uploads/products/a.jpg',
+            'http://testserver/static/media/uploads/products/b.jpg'])
+        self.assertEqual(rows[0]['price'], '10.50')
+        self.assertEqual(rows[0]['description'], 'multi\nline')
+        self.assertEqual(rows[0]['is_sold'], 'false')
+        self.assertEqual(rows[1]['images'], '')
+
+    def test_export_jsonl(self):
+        '''Test products streamed as JSON lines'''
+        res = self.client.get(EXPORT_URL, {'format': 'jsonl'})
+
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        rows = [json.loads(line) for line in self.get_content(res).splitlines()]
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]['id'], self.product.id)
+        self.assertEqual(rows[0]['price'], '10.50')
+        self.assertEqual(len(rows[0]['images']), 2)
+        self.assertIsNone(rows[0]['city'])
+
+    def test_staff_export(self):
+        '''Test staff exporting every product, or a single seller's'''
+        self.client.force_authenticate(create_user(email='staff@example.com',
+                                                   is_staff=True))
+
+        res = self.client.get(EXPORT_URL, {'format': 'jsonl'})
+        self.assertEqual(len(self.get_content(res).splitlines()), 3)
+
+        res = self.client.get(EXPORT_URL, {'format': 'jsonl',
+                                           'seller': self.other.id})
+        self.assertEqual([json.loads(line)['title']
+                          for line in self.get_content(res).splitlines()],
+                         ['other'])
+
+    def test_export_through_asgi(self):
+        '''Test the whole export sent by the ASGI handler we deploy'''
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+
+        # Keeping the test transaction's connection open, like the test client
+        for signal in (request_started, request_finished):
+            signal.disconnect(close_old_connections)
+            self.addCleanup(signal.connect, close_old_connections)
+        token = AccessToken.for_user(self.user)
+        async_to_sync(get_asgi_application())({
+            'type': 'http',
+            'method': 'GET',
+            'path': EXPORT_URL,
+            'query_string': b'format=jsonl',
+            'headers': [(b'host', b'testserver'),
+                        (b'authorization', f'Bearer {token}'.encode())],
+        }, receive, send)
+
+        self.assertEqual(messages[0]['status'], status.HTTP_200_OK)
+        body = b''.join(message.get('body', b'') for message in messages[1:])
+        self.assertEqual([json.loads(line)['title'] for line in body.splitlines()],
+                         ['first', 'second, "quoted"'])
+
+    def test_csv_formulas_escaped(self):
+        '''Test CSV text cells starting like a formula prefixed with a quote'''
+        for title in ('=1+2', '+1', '-1', '@SUM(A1)'):
+            self.create_product(self.user, self.product.category, title)
+
+        res = self.client.get(EXPORT_URL)
+
+        rows = list(csv.DictReader(io.StringIO(self.get_content(res))))
+        self.assertEqual([row['title'] for row in rows[2:]],
+                         ["'=1+2", "'+1", "'-1", "'@SUM(A1)"])
+        res = self.client.get(EXPORT_URL, {'format': 'jsonl'})
+        self.assertEqual(json.loads(self.get_content(res).splitlines()[2])['title'],
+                         '=1+2')
+
+    def test_unknown_format(self):
+        '''Test unsupported formats not found'''
+        res = self.client.get(EXPORT_URL, {'format': 'xml'})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_streamed_in_chunks(self):
+        '''Test rows encoded a chunk at a time'''
+        rows = ({'id': i} for i in range(renderers.ROWS_PER_CHUNK * 2 + 1))
+
+        chunks = list(renderers.JSONLinesRenderer().stream(rows))
+
+        self.assertEqual([chunk.count(b'\n') for chunk in chunks],
+                         [renderers.ROWS_PER_CHUNK, renderers.ROWS_PER_CHUNK, 1])
+
+    def test_image_url_builder(self):
+        '''Test export image URLs built like everywhere else'''
+        request = Request(APIRequestFactory().get(EXPORT_URL))
+        names = ['uploads/products/a.jpg', 'uploads/products/with space é.jpg',
+                 'uploads/products/a%20b?.jpg']
+
+        for req in (None, request):
+            build = get_image_url_builder(req)
+            self.assertEqual([build(name) for name in names],
+                             [get_image_url(name, req) for name in names])
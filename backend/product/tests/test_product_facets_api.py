@@ -0,0 +1,81 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from core.models import Category, Product
+
+FACETS_URL = reverse('product:product-facets')
+
+
+def create_user(email='user@example.com', password='test123123123'):
+    # Create & Return a user
+    return get_user_model().objects.create_user(email=email, password=password)
+
+
+class ProductFacetsAPITest(APITestCase):
+    '''Test faceted product counts'''
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user()
+        self.electronics = Category.objects.create(name='Electronics')
+        self.phones = Category.objects.create(name='Phones', parent=self.electronics)
+        self.books = Category.objects.create(name='Books')
+        for category, price, is_sold in [(self.electronics, '5.00', False),
+                                         (self.phones, '10.00', False),
+                                         (self.phones, '99.99', True),
+                                         (self.phones, '750.00', False),
+                                         (self.books, '8.50', False)]:
+            Product.objects.create(seller=self.user,
+                                   category=category,
+                                   title='test_product',
+                                   price=Decimal(price),
+                                   description='test description',
+                                   is_sold=is_sold)
+
+    def test_facets_single_query(self):
+        '''Test every facet computed from one grouped query'''
+        Category.objects.all()[0].save()  # Make sure the tree isn't cached
+
+        # tree nodes & the grouped counts
+        with self.assertNumQueries(2):
+            res = self.client.get(FACETS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        categories = {item['id']: item['count'] for item in res.data['categories']}
+        self.assertEqual(categories, {self.electronics.id: 4,
+                                      self.phones.id: 3,
+                                      self.books.id: 1})
+        self.assertEqual(res.data['is_sold'], [{'value': False, 'count': 4},
+                                               {'value': True, 'count': 1}])
+        self.assertEqual([(item['min'], item['max'], item['count'])
+                          for item in res.data['price']],
+                         [('0.00', '10.00', 2),
+                          ('10.00', '50.00', 1),
+                          ('50.00', '100.00', 1),
+                          ('100.00', '500.00', 0),
+                          ('500.00', None, 1)])
+
+    def test_facets_follow_filters(self):
+        '''Test facets counting only products matching the filters'''
+        res = self.client.get(FACETS_URL, {'category_tree': self.electronics.id,
+                                           'is_sold': False})
+
+        categories = {item['id']: item['count'] for item in res.data['categories']}
+        self.assertEqual(categories, {self.electronics.id: 3, self.phones.id: 2})
+
+    def test_facets_cached_per_normalized_filters(self):
+        '''Test the same filters in another order served from the cache'''
+        params = {'is_sold': False, 'category': self.phones.id}
+        self.client.get(FACETS_URL, params)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(
+                f'{FACETS_URL}?category={self.phones.id}&is_sold=False&p=3')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['categories'][-1]['count'], 2)
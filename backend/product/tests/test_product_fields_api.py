@@ -0,0 +1,118 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from core.models import Category, Product, ProductImage
+from product.serializers import ProductListSerializer, ProductListValuesSerializer
+from product.values import MAX_COLUMN_PLANS, compile_column_plan
+
+PRODUCT_URL = reverse('product:product-list')
+
+
+def create_user(email='user@example.com', password='test123123123'):
+    # Create & Return a user
+    return get_user_model().objects.create_user(email=email, password=password)
+
+
+class ProductSparseFieldsAPITest(APITestCase):
+    '''Test the card representation & sparse fieldsets of the product list'''
+
+    def setUp(self):
+        self.user = create_user()
+        category = Category.objects.create(name='Test Category')
+        self.products = [Product.objects.create(
+            seller=self.user,
+            category=category,
+            title=f'test_product_{i}',
+            price=Decimal('10.00'),
+            description='a long test description'
+        ) for i in range(3)]
+        ProductImage.objects.create(product=self.products[0],
+                                    image='uploads/products/second.jpg',
+                                    position=1)
+        ProductImage.objects.create(product=self.products[0],
+                                    image='uploads/products/first.jpg',
+                                    position=0)
+
+    def test_card_by_default(self):
+        '''Test the list rendering the compact card fields'''
+        res = self.client.get(PRODUCT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        item = res.data['results'][-1]
+        self.assertEqual(list(item), ProductListSerializer.CARD_FIELDS)
+        self.assertEqual(item['thumbnail'],
+                         'http://testserver/static/media/uploads/products/first.jpg')
+        self.assertIsNone(res.data['results'][0]['thumbnail'])
+
+    def test_card_skips_images_and_description(self):
+        '''Test the card neither prefetching images nor loading descriptions'''
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(PRODUCT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(queries), 2)  # count, page
+        self.assertNotIn('"description"', queries[-1]['sql'])
+
+    def test_selected_fields(self):
+        '''Test only the selected fields rendered'''
+        res = self.client.get(PRODUCT_URL, {'fields': 'id,title,description'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'][0], {
+            'id': self.products[2].id,
+            'title': 'test_product_2',
+            'description': 'a long test description',
+        })
+
+    def test_selection_order_and_repeats_share_a_plan(self):
+        '''Test reordered & repeated selections rendered alike from one plan'''
+        self.client.get(PRODUCT_URL, {'fields': 'id,title'})
+        misses = compile_column_plan.cache_info().misses
+
+        for fields in ('title,id', 'id,id,title', 'title, id ,title'):
+            res = self.client.get(PRODUCT_URL, {'fields': fields})
+            self.assertEqual(list(res.data['results'][0]), ['id', 'title'])
+
+        self.assertEqual(compile_column_plan.cache_info().misses, misses)
+
+    def test_plans_bounded(self):
+        '''Test at most MAX_COLUMN_PLANS selections' plans kept'''
+        names = ['id', 'title', 'price', 'description', 'is_sold',
+                 'bookmark_cnt', 'created_at', 'modified_at', 'city']
+        for mask in range(1, MAX_COLUMN_PLANS + 50):
+            ProductListValuesSerializer.get_column_plan(
+                tuple(name for bit, name in enumerate(names) if mask >> bit & 1))
+
+        self.assertEqual(compile_column_plan.cache_info().currsize, MAX_COLUMN_PLANS)
+
+    def test_images_prefetched_when_selected(self):
+        '''Test images loaded with one prefetch query when selected'''
+        with self.assertNumQueries(3):  # count, page, images
+            res = self.client.get(PRODUCT_URL, {'fields': 'id,images'})
+
+        images = res.data['results'][-1]['images']
+        self.assertEqual([image['image'] for image in images],
+                         ['http://testserver/static/media/uploads/products/first.jpg',
+                          'http://testserver/static/media/uploads/products/second.jpg'])
+
+    def test_keyset_pagination_with_fields(self):
+        '''Test cursors built without loading created_at per item'''
+        with self.assertNumQueries(1):
+            res = self.client.get(PRODUCT_URL, {'cursor': '', 'fields': 'title'})
+
+        self.assertEqual(len(res.data['results']), 3)
+        self.assertEqual(list(res.data['results'][0]), ['title'])
+
+    def test_unknown_field_rejected(self):
+        '''Test unknown or write only fields rejected'''
+        for fields in ('id,secret', 'uploaded_images'):
+            with self.subTest(fields=fields):
+                res = self.client.get(PRODUCT_URL, {'fields': fields})
+
+                self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
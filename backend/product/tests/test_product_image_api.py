@@ -0,0 +1,238 @@
+import shutil
+import tempfile
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from core.models import Category, Product, ProductImage
+from product.images import generate_variants
+
+PRODUCT_URL = reverse('product:product-list')
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def tearDownModule():
+    shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+
+def detail_url(product_id):
+    # Create and return a product detail URL
+    return reverse("product:product-detail", args=[product_id])
+
+
+def create_user(email='user@example.com', password='test123123123'):
+    # Create & Return a user
+    return get_user_model().objects.create_user(email=email, password=password)
+
+
+def image_upload(size=(1200, 600), name='test.jpg'):
+    # Create & Return an uploaded JPEG file
+    file = tempfile.SpooledTemporaryFile()
+    Image.new('RGB', size, 'red').save(file, 'JPEG')
+    file.seek(0)
+    return SimpleUploadedFile(name, file.read(), content_type='image/jpeg')
+
+
+class SyncExecutor:
+    # Running submitted work right away instead of on the worker pool
+    def submit(self, fn, *args):
+        fn(*args)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ProductImageVariantTest(APITestCase):
+    '''Test responsive product image variants'''
+
+    def setUp(self):
+        self.user = create_user()
+        self.client.force_authenticate(self.user)
+        self.category = Category.objects.create(name='Test Category')
+        self.product = Product.objects.create(
+            seller=self.user,
+            category=self.category,
+            title='test_product',
+            price=Decimal('10.00'),
+            description='test description'
+        )
+
+    def test_generate_variants(self):
+        '''Test every width generated in WebP & JPEG'''
+        product_image = ProductImage.objects.create(product=self.product,
+                                                    image=image_upload())
+
+        variants = generate_variants(product_image.id)
+
+        self.assertEqual(sorted(variants, key=int), ['160', '480', '1080'])
+        storage = product_image.image.storage
+        for width, formats in variants.items():
+            self.assertEqual(set(formats), {'webp', 'jpeg'})
+            with storage.open(formats['webp']) as file:
+                self.assertEqual(Image.open(file).size,
+                                 (int(width), int(width) // 2))
+        product_image.refresh_from_db()
+        self.assertEqual(product_image.variants, variants)
+
+    def test_generate_variants_never_upscales(self):
+        '''Test a small original getting a single variant at its own width'''
+        product_image = ProductImage.objects.create(
+            product=self.product, image=image_upload(size=(100, 80)))
+
+        variants = generate_variants(product_image.id)
+
+        self.assertEqual(list(variants), ['100'])
+
+    def test_upload_returns_before_resizing(self):
+        '''Test variants generated after the upload commits and exposed as srcset'''
+        payload = {
+            'category': self.category.id,
+            'title': 'test_product',
+            'price': Decimal('10.00'),
+            'description': 'test description',
+            'uploaded_images': [image_upload()],
+        }
+        with patch('product.images.get_executor', return_value=SyncExecutor()), \
+                patch('product.images.close_old_connections'):
+            with self.captureOnCommitCallbacks() as callbacks:
+                res = self.client.post(PRODUCT_URL, payload, format='multipart')
+
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(res.data['images'][0]['srcset'], {})
+            # Variants scheduling, besides the list cache invalidation
+            self.assertEqual(len(callbacks), 2)
+            for callback in callbacks:
+                callback()
+
+        res = self.client.get(detail_url(res.data['id']))
+        srcset = res.data['images'][0]['srcset']
+        self.assertEqual(set(srcset), {'160w', '480w', '1080w'})
+        self.assertTrue(srcset['480w']['webp'].startswith('http://testserver/'))
+        self.assertTrue(srcset['480w']['webp'].endswith('.webp'))
+
+
+def images_url(product_id):
+    # Create and return a product images URL
+    return reverse('product:product-images', args=[product_id])
+
+
+def image_detail_url(product_id, image_id):
+    # Create and return a product image detail URL
+    return reverse('product:product-image-detail', args=[product_id, image_id])
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ProductImageAPITest(APITestCase):
+    '''Test bulk & incremental product image editing'''
+
+    def setUp(self):
+        self.user = create_user()
+        self.client.force_authenticate(self.user)
+        self.category = Category.objects.create(name='Test Category')
+        self.product = Product.objects.create(
+            seller=self.user,
+            category=self.category,
+            title='test_product',
+            price=Decimal('10.00'),
+            description='test description'
+        )
+        self.images = ProductImage.objects.bulk_create([
+            ProductImage(product=self.product, image=image_upload(name=f'{i}.jpg'),
+                         position=i)
+            for i in range(3)
+        ])
+
+    def image_ids(self):
+        return list(ProductImage.objects
+                    .filter(product=self.product)
+                    .values_list('id', flat=True))
+
+    def test_create_inserts_images_in_bulk(self):
+        '''Test every uploaded image written with a single INSERT'''
+        payload = {
+            'category': self.category.id,
+            'title': 'test_product',
+            'price': Decimal('10.00'),
+            'description': 'test description',
+            'uploaded_images': [image_upload(name=f'{i}.jpg') for i in range(3)],
+        }
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.post(PRODUCT_URL, payload, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        inserts = [query for query in queries
+                   if query['sql'].startswith('INSERT INTO "core_productimage"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(len(res.data['images']), 3)
+        stored = ProductImage.objects.filter(product_id=res.data['id'])
+        self.assertEqual([image.position for image in stored], [0, 1, 2])
+        for image in stored:
+            self.assertTrue(image.image.storage.exists(image.image.name))
+
+    def test_update_without_images_keeps_them(self):
+        '''Test updating other fields leaving the images untouched'''
+        res = self.client.patch(detail_url(self.product.id), {'title': 'updated'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.image_ids(), [image.id for image in self.images])
+
+    def test_add_images(self):
+        '''Test appending images after the current ones'''
+        payload = {'uploaded_images': [image_upload(name='new.jpg')]}
+        res = self.client.post(images_url(self.product.id), payload,
+                               format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        ids = self.image_ids()
+        self.assertEqual(len(ids), 4)
+        self.assertEqual(ids[:3], [image.id for image in self.images])
+        self.assertEqual([item['id'] for item in res.data], ids)
+
+    def test_reorder_images(self):
+        '''Test reordering images by id'''
+        order = [image.id for image in reversed(self.images)]
+        res = self.client.patch(images_url(self.product.id), {'order': order},
+                                format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.image_ids(), order)
+        res = self.client.get(detail_url(self.product.id))
+        self.assertEqual([item['id'] for item in res.data['images']], order)
+
+    def test_reorder_requires_every_image(self):
+        '''Test rejecting an order missing or repeating images'''
+        for order in ([self.images[0].id],
+                      [self.images[0].id] * 3,
+                      [image.id for image in self.images] + [0]):
+            res = self.client.patch(images_url(self.product.id), {'order': order},
+                                    format='json')
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_remove_image(self):
+        '''Test removing a single image'''
+        res = self.client.delete(image_detail_url(self.product.id,
+                                                  self.images[1].id))
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.image_ids(), [self.images[0].id, self.images[2].id])
+
+        res = self.client.delete(image_detail_url(self.product.id,
+                                                  self.images[1].id))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_other_user_cannot_edit_images(self):
+        '''Test returning error when other user edits the images'''
+        self.client.force_authenticate(create_user(email='other@example.com'))
+
+        res = self.client.delete(image_detail_url(self.product.id,
+                                                  self.images[0].id))
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(len(self.image_ids()), 3)
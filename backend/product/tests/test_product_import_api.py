@@ -0,0 +1,175 @@
+import io
+import json
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError, connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from core.models import Address, Category, City, Country, County, Product
+from product.imports import SAVE_ERROR_MESSAGE, import_products
+
+IMPORT_URL = reverse('product:product-import')
+
+
+def create_user(email='user@example.com', password='test123123123'):
+    # Create & Return a user
+    return get_user_model().objects.create_user(email=email, password=password)
+
+
+def upload(content, name='products.csv'):
+    # Create & Return an uploaded file of the content
+    return SimpleUploadedFile(name, content.encode(), content_type='text/plain')
+
+
+class PublicProductImportAPITest(APITestCase):
+    '''Test unauthenticated import requests'''
+
+    def test_auth_required(self):
+        '''Test auth required for importing products'''
+        res = self.client.post(IMPORT_URL, {'file': upload('title\n')})
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateProductImportAPITest(APITestCase):
+    '''Test importing products in bulk'''
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user()
+        self.client.force_authenticate(self.user)
+        county = County.objects.create(name='Kent',
+                                       country=Country.objects.create(name='UK'))
+        self.home = City.objects.create(name='Dover', county=county)
+        self.city = City.objects.create(name='Canterbury', county=county)
+        Address.objects.create(user=self.user, name='home', post_code='CT16',
+                               city=self.home, street_address1='1 Street',
+                               street_address2='')
+        self.books = Category.objects.create(name='Books')
+        self.comics = Category.objects.create(name='Comics', parent=self.books)
+        self.toys = Category.objects.create(name='Toys')
+        Category.objects.create(name='TOYS')
+
+    def test_import_csv(self):
+        '''Test valid rows created & invalid ones reported by line'''
+        content = (
+            'title,price,description,category,city,is_sold\n'
+            f'by name,10.00,desc,Toys,{self.city.id},\n'
+            'by name case,1.5,desc,comics,,true\n'
+            f'by id,3,desc,{self.books.id},,\n'
+            'ambiguous,3,desc,toys,,\n'
+            'unknown,3,desc,Garden,,\n'
+            'no price,,desc,Toys,,\n'
+            'bad city,3,desc,Toys,0,\n'
+        )
+        res = self.client.post(IMPORT_URL, {'file': upload(content)})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual((res.data['rows'], res.data['created'],
+                          res.data['error_count']), (7, 3, 4))
+        self.assertEqual([error['line'] for error in res.data['errors']],
+                         [5, 6, 7, 8])
+        self.assertIn('category', res.data['errors'][0]['errors'])
+        self.assertIn('price', res.data['errors'][2]['errors'])
+        self.assertIn('city', res.data['errors'][3]['errors'])
+
+        products = {product.title: product
+                    for product in Product.objects.filter(seller=self.user)}
+        self.assertEqual(products['by name'].category, self.toys)
+        self.assertEqual(products['by name'].city, self.city)
+        self.assertEqual(products['by name case'].category, self.comics)
+        self.assertTrue(products['by name case'].is_sold)
+        self.assertEqual(products['by id'].city, self.home)
+        self.assertEqual(products['by id'].country_id, self.home.county.country_id)
+
+    def test_import_jsonl(self):
+        '''Test JSON lines imported with broken lines reported'''
+        lines = [json.dumps({'title': 'first', 'price': 2.5, 'description': 'desc',
+                             'category': 'Toys'}),
+                 '',
+                 '{"title": broken',
+                 json.dumps(['not', 'an', 'object']),
+                 json.dumps({'title': 'second', 'price': '3', 'description': 'd',
+                             'category': 'books'})]
+
+        res = self.client.post(IMPORT_URL, {'file': upload('\n'.join(lines),
+                                                           name='products.jsonl')})
+
+        self.assertEqual(res.data['created'], 2)
+        self.assertEqual([error['line'] for error in res.data['errors']], [3, 4])
+        self.assertEqual(set(Product.objects.values_list('title', flat=True)),
+                         {'first', 'second'})
+
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=0)
+    def test_unreadable_rest_reported(self):
+        '''Test rows before an undecodable part kept, and the rest reported'''
+        content = (b'title,price,description,category\n'
+                   b'fine,1,desc,Toys\n'
+                   b'\xff\xfe,1,desc,Toys\n')
+
+        res = self.client.post(IMPORT_URL, {
+            'file': SimpleUploadedFile('products.csv', content)})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['created'], 1)
+        self.assertIn('Unreadable file',
+                      res.data['errors'][0]['errors']['non_field_errors'][0])
+
+    def test_save_errors_not_disclosed(self):
+        '''Test rows of a failed batch reported without the DB error'''
+        error = DatabaseError('relation "core_product" violates secret_constraint')
+
+        with patch.object(Product.objects, 'bulk_create', side_effect=error), \
+                self.assertLogs('product.imports', 'ERROR'):
+            res = self.client.post(IMPORT_URL, {'file': upload(
+                'title,price,description,category\nnew,1,desc,Toys\n')})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['created'], 0)
+        self.assertEqual(res.data['errors'][0]['errors']['non_field_errors'],
+                         [SAVE_ERROR_MESSAGE])
+        self.assertNotIn('secret_constraint', res.content.decode())
+
+    def test_import_invalidates_list_cache(self):
+        '''Test imported products showing up in cached list pages'''
+        self.client.logout()
+        self.client.get(reverse('product:product-list'))
+        self.client.force_authenticate(self.user)
+        self.client.post(IMPORT_URL, {'file': upload(
+            'title,price,description,category\nnew,1,desc,Toys\n')})
+        self.client.logout()
+
+        res = self.client.get(reverse('product:product-list'))
+
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_format_errors(self):
+        '''Test missing files and unsupported formats rejected'''
+        for data in ({}, {'file': upload('x', name='products.xml')},
+                     {'file': upload('x'), 'format': 'xml'}):
+            with self.subTest(data=data):
+                res = self.client.post(IMPORT_URL, data)
+
+                self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_queries_per_batch(self):
+        '''Test a constant number of queries per batch, whatever its size'''
+        def run(count):
+            rows = ''.join(f'product {i},1,desc,Comics,{self.city.id}\n'
+                           for i in range(count))
+            file = io.BytesIO(f'title,price,description,category,city\n{rows}'.encode())
+            with CaptureQueriesContext(connection) as queries:
+                stats = import_products(self.user, file, 'csv', batch_size=100)
+            self.assertEqual(stats.created, count)
+            return len(queries)
+
+        run(1)  # Loads the category tree once
+        self.assertEqual(run(2), run(100))
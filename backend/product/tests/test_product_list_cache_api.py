@@ -0,0 +1,164 @@
+import threading
+import time
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase
+
+from core.models import Category, Product, ProductImage
+from product import list_cache
+
+PRODUCT_URL = reverse('product:product-list')
+
+
+def create_user(email='user@example.com', password='test123123123'):
+    # Create & Return a user
+    return get_user_model().objects.create_user(email=email, password=password)
+
+
+class ProductListCacheAPITest(APITestCase):
+    '''Test the anonymous product list response cache'''
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user()
+        self.category = Category.objects.create(name='Test Category')
+        self.product = self.create_product('first')
+
+    def create_product(self, title):
+        return Product.objects.create(seller=self.user,
+                                      category=self.category,
+                                      title=title,
+                                      price=Decimal('10.00'),
+                                      description='test description')
+
+    def get_titles(self, res):
+        return [item['title'] for item in res.data['results']]
+
+    def test_anonymous_pages_cached(self):
+        '''Test a repeated anonymous request served without any query'''
+        res = self.client.get(PRODUCT_URL)
+        self.assertEqual(res['X-Cache'], 'MISS')
+
+        with self.assertNumQueries(0):
+            res = self.client.get(PRODUCT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['X-Cache'], 'HIT')
+        self.assertEqual(self.get_titles(res), ['first'])
+
+    def test_params_normalized(self):
+        '''Test param order not mattering, while values do'''
+        self.client.get(PRODUCT_URL, {'is_sold': 'false', 'ordering': 'price'})
+
+        res = self.client.get(f'{PRODUCT_URL}?ordering=price&is_sold=false')
+        self.assertEqual(res['X-Cache'], 'HIT')
+        res = self.client.get(PRODUCT_URL, {'is_sold': 'true', 'ordering': 'price'})
+        self.assertEqual(res['X-Cache'], 'MISS')
+
+    def test_authenticated_not_cached(self):
+        '''Test authenticated users always served fresh pages'''
+        self.client.get(PRODUCT_URL)
+        self.client.force_authenticate(self.user)
+
+        res = self.client.get(PRODUCT_URL)
+
+        self.assertNotIn('X-Cache', res)
+        self.assertIn('favorite', res.data['results'][0])
+
+    def test_invalidated_by_signals(self):
+        '''Test product, image & category changes turning pages stale'''
+        changes = [
+            lambda: self.create_product('second'),
+            lambda: ProductImage.objects.create(product=self.product,
+                                                image='uploads/products/a.jpg'),
+            lambda: Category.objects.create(name='Other Category'),
+            lambda: self.product.delete(),
+        ]
+        for change in changes:
+            self.client.get(PRODUCT_URL)
+            change()
+
+            res = self.client.get(PRODUCT_URL)
+
+            self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(self.get_titles(res), ['second'])
+
+    def test_stale_served_while_rebuilding(self):
+        '''Test a stale page served while another request holds the rebuild lock'''
+        self.client.get(PRODUCT_URL)
+        self.create_product('second')
+        request = Request(APIRequestFactory().get(PRODUCT_URL))
+        cache.add(f'{list_cache.get_cache_key(request)}:lock', 1)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(PRODUCT_URL)
+
+        self.assertEqual(res['X-Cache'], 'STALE')
+        self.assertEqual(self.get_titles(res), ['first'])
+
+    @override_settings(PRODUCT_LIST_CACHE={'TIMEOUT': 0})
+    def test_expired_rebuilt(self):
+        '''Test pages past their timeout rebuilt'''
+        self.client.get(PRODUCT_URL)
+        Product.objects.filter(id=self.product.id).update(title='renamed')
+
+        res = self.client.get(PRODUCT_URL)
+
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(self.get_titles(res), ['renamed'])
+
+    @override_settings(PRODUCT_LIST_CACHE={'VERSION_TIMEOUT': 60})
+    def test_tag_versions_expire(self):
+        '''Test tag versions renewed after their timeout'''
+        versions = list_cache.get_tag_versions()
+        self.assertEqual(list_cache.get_tag_versions(), versions)
+
+        with patch('time.time', return_value=time.time() + 61):
+            self.assertNotEqual(list_cache.get_tag_versions(), versions)
+
+
+class ProductListCacheSingleFlightTest(SimpleTestCase):
+    '''Test concurrent misses building a page once'''
+
+    def setUp(self):
+        cache.clear()
+        self.request = Request(APIRequestFactory().get(PRODUCT_URL))
+
+    def test_concurrent_misses_build_once(self):
+        '''Test requests missing together waiting for a single build'''
+        calls = []
+
+        def build():
+            calls.append(1)
+            time.sleep(0.2)
+            return {'results': []}
+
+        statuses = []
+        threads = [threading.Thread(
+            target=lambda: statuses.append(list_cache.get_page(self.request, build)[1]))
+            for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(statuses), ['HIT'] * 7 + ['MISS'])
+
+    @override_settings(PRODUCT_LIST_CACHE={'WAIT': 0})
+    def test_gives_up_waiting(self):
+        '''Test a request building the page itself once the wait is over'''
+        cache.add(f'{list_cache.get_cache_key(self.request)}:lock', 1)
+
+        with patch('product.list_cache.time.sleep') as sleep:
+            data, cache_status = list_cache.get_page(self.request, lambda: {'p': 1})
+
+        self.assertEqual((data, cache_status), ({'p': 1}, 'MISS'))
+        sleep.assert_not_called()
@@ -0,0 +1,177 @@
+import shutil
+import tempfile
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from django.urls import reverse
+from PIL import Image
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from core.models import Address, Category, City, Country, County, Product
+
+PRODUCT_URL = reverse('product:product-list')
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def tearDownModule():
+    shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+
+def detail_url(product_id):
+    # Create and return a product detail URL
+    return reverse("product:product-detail", args=[product_id])
+
+
+def create_user(email='user@example.com', password='test123123123'):
+    # Create & Return a user
+    return get_user_model().objects.create_user(email=email, password=password)
+
+
+def image_upload(name='test.jpg'):
+    # Create & Return an uploaded JPEG file
+    file = tempfile.SpooledTemporaryFile()
+    Image.new('RGB', (10, 10), 'red').save(file, 'JPEG')
+    file.seek(0)
+    return SimpleUploadedFile(name, file.read(), content_type='image/jpeg')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ProductLocationAPITest(APITestCase):
+    '''Test product location defaults & the near filter'''
+
+    def setUp(self):
+        self.user = create_user()
+        self.client.force_authenticate(self.user)
+        self.category = Category.objects.create(name='Test Category')
+
+        uk = Country.objects.create(name='UK')
+        france = Country.objects.create(name='France')
+        kent = County.objects.create(name='Kent', country=uk)
+        surrey = County.objects.create(name='Surrey', country=uk)
+        paris_region = County.objects.create(name='Ile-de-France', country=france)
+        self.dover = City.objects.create(name='Dover', county=kent)
+        self.canterbury = City.objects.create(name='Canterbury', county=kent)
+        self.guildford = City.objects.create(name='Guildford', county=surrey)
+        self.paris = City.objects.create(name='Paris', county=paris_region)
+
+    def create_product(self, city, title='test_product'):
+        return Product.objects.create(seller=self.user,
+                                      category=self.category,
+                                      title=title,
+                                      price=Decimal('10.00'),
+                                      description='test description',
+                                      city=city,
+                                      county_id=city.county_id,
+                                      country_id=city.county.country_id)
+
+    def test_create_defaults_to_seller_address(self):
+        '''Test a new product located at the seller's first address'''
+        for name, city in [('Home', self.dover), ('Work', self.paris)]:
+            Address.objects.create(user=self.user, name=name, post_code='CT16',
+                                   city=city, street_address1='1 Street',
+                                   street_address2='')
+        payload = {
+            'category': self.category.id,
+            'title': 'test_product',
+            'price': Decimal('10.00'),
+            'description': 'test description',
+            'uploaded_images': [image_upload()],
+        }
+
+        res = self.client.post(PRODUCT_URL, payload, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        product = Product.objects.get(id=res.data['id'])
+        self.assertEqual(product.city, self.dover)
+        self.assertEqual(product.county, self.dover.county)
+        self.assertEqual(product.country, self.dover.county.country)
+
+    def test_create_with_city(self):
+        '''Test a given city overriding the seller's address'''
+        payload = {
+            'category': self.category.id,
+            'title': 'test_product',
+            'price': Decimal('10.00'),
+            'description': 'test description',
+            'city': self.paris.id,
+            'uploaded_images': [image_upload()],
+        }
+
+        res = self.client.post(PRODUCT_URL, payload, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data['city'], self.paris.id)
+        self.assertEqual(res.data['country'], self.paris.county.country_id)
+
+    def test_update_city_updates_county_country(self):
+        '''Test changing the city keeps county & country in line'''
+        product = self.create_product(self.dover)
+
+        res = self.client.patch(detail_url(product.id), {'city': self.paris.id})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        product.refresh_from_db()
+        self.assertEqual(product.county, self.paris.county)
+        self.assertEqual(product.country, self.paris.county.country)
+
+    def test_update_county_country_ignored(self):
+        '''Test county & country only derived from the city'''
+        product = self.create_product(self.dover)
+
+        res = self.client.patch(detail_url(product.id),
+                                {'county': self.paris.county_id,
+                                 'country': self.paris.county.country_id})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        product.refresh_from_db()
+        self.assertEqual(product.county, self.dover.county)
+        self.assertEqual(product.country, self.dover.county.country)
+
+    def test_near_scopes(self):
+        '''Test near filter by city, county & country'''
+        dover = self.create_product(self.dover)
+        canterbury = self.create_product(self.canterbury)
+        guildford = self.create_product(self.guildford)
+        self.create_product(self.paris)
+
+        cases = {
+            'city': [dover.id],
+            'county': [canterbury.id, dover.id],
+            'country': [guildford.id, canterbury.id, dover.id],
+        }
+        for scope, expected in cases.items():
+            with self.subTest(scope=scope):
+                res = self.client.get(PRODUCT_URL,
+                                      {'near': self.dover.id, 'scope': scope})
+
+                self.assertEqual(res.status_code, status.HTTP_200_OK)
+                ids = [item['id'] for item in res.data['results']]
+                self.assertEqual(ids, expected)
+
+    def test_near_defaults_to_city(self):
+        '''Test near without scope matching the city only'''
+        dover = self.create_product(self.dover)
+        self.create_product(self.canterbury)
+
+        res = self.client.get(PRODUCT_URL, {'near': self.dover.id})
+
+        ids = [item['id'] for item in res.data['results']]
+        self.assertEqual(ids, [dover.id])
+
+    def test_near_unknown_city(self):
+        '''Test near an unknown city matching nothing'''
+        self.create_product(self.dover)
+
+        res = self.client.get(PRODUCT_URL, {'near': 0})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'], [])
+
+    def test_invalid_scope(self):
+        '''Test an unknown scope rejected'''
+        res = self.client.get(PRODUCT_URL, {'near': self.dover.id, 'scope': 'world'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,92 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db.models import F
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from core.models import Category, Product
+
+PRODUCT_URL = reverse('product:product-list')
+
+
+def create_user(email='user@example.com', password='test123123123'):
+    # Create & Return a user
+    return get_user_model().objects.create_user(email=email, password=password)
+
+
+def create_product(seller, category, **params):
+    # Create & Return a product
+    defaults = {
+        'title': 'test_product',
+        'price': Decimal('10.00'),
+        'description': 'test description',
+    }
+    defaults.update(params)
+    return Product.objects.create(seller=seller, category=category, **defaults)
+
+
+class ProductSearchAPITest(APITestCase):
+    '''Test full-text product search'''
+
+    def setUp(self):
+        self.user = create_user()
+        self.category = Category.objects.create(name='Test Category')
+
+    def test_search_vector_maintained(self):
+        '''Test search vector populated on insert and refreshed on update'''
+        product = create_product(self.user, self.category, title='Vintage lamp')
+
+        self.assertTrue(Product.objects.filter(
+            id=product.id, search_vector='lamp').exists())
+
+        product.title = 'Oak desk'
+        product.save()
+        self.assertFalse(Product.objects.filter(
+            id=product.id, search_vector='lamp').exists())
+        self.assertTrue(Product.objects.filter(
+            id=product.id, search_vector='desk').exists())
+
+    def test_search_vector_kept_on_counter_updates(self):
+        '''Test the search vector only recomputed when the text is updated'''
+        product = create_product(self.user, self.category, title='Vintage lamp')
+        products = Product.objects.filter(id=product.id)
+        products.update(search_vector=None)
+
+        products.update(hit_cnt=F('hit_cnt') + 1, bookmark_cnt=1)
+        self.assertIsNone(products.values_list('search_vector', flat=True)[0])
+
+        products.update(description='Brass base')
+        self.assertTrue(products.filter(search_vector='brass').exists())
+
+    def test_search_ranks_title_above_description(self):
+        '''Test title matches ranked above description only matches'''
+        by_description = create_product(self.user, self.category,
+                                        title='Wooden chair',
+                                        description='Comes with a bike lock')
+        by_title = create_product(self.user, self.category,
+                                  title='Road bike',
+                                  description='Barely ridden')
+        create_product(self.user, self.category, title='Kettle')
+
+        res = self.client.get(PRODUCT_URL, {'q': 'bikes'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        ids = [item['id'] for item in res.data['results']]
+        self.assertEqual(ids, [by_title.id, by_description.id])
+
+    def test_search_combined_with_filters(self):
+        '''Test search combined with category and is_sold filters'''
+        other_category = Category.objects.create(name='Other Category')
+        expected = create_product(self.user, self.category, title='Red bike')
+        create_product(self.user, self.category, title='Blue bike', is_sold=True)
+        create_product(self.user, other_category, title='Green bike')
+
+        res = self.client.get(PRODUCT_URL, {'q': 'bike',
+                                            'category': self.category.id,
+                                            'is_sold': False})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        ids = [item['id'] for item in res.data['results']]
+        self.assertEqual(ids, [expected.id])
@@ -0,0 +1,106 @@
+import shutil
+import tempfile
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from core.models import Category, Product
+from product.similar import get_similar_ids, update_index
+
+INDEX_DIR = tempfile.mkdtemp()
+
+
+def tearDownModule():
+    shutil.rmtree(INDEX_DIR, ignore_errors=True)
+
+
+def similar_url(product_id):
+    # Create and return a similar products URL
+    return reverse('product:product-similar', args=[product_id])
+
+
+def create_user(email='user@example.com', password='test123123123'):
+    # Create & Return a user
+    return get_user_model().objects.create_user(email=email, password=password)
+
+
+@override_settings(PRODUCT_SIMILAR={'INDEX_DIR': INDEX_DIR, 'TOP_K': 3})
+class ProductSimilarAPITest(APITestCase):
+    '''Test TF-IDF similar product recommendations'''
+
+    def setUp(self):
+        self.user = create_user()
+        self.bikes = Category.objects.create(name='Bikes')
+        self.kitchen = Category.objects.create(name='Kitchen')
+        self.road_bike = self.create_product('Road bike', 'Carbon frame road bike')
+        self.gravel_bike = self.create_product('Gravel bike', 'Steel frame bike')
+        self.bike_lights = self.create_product('Bike lights', 'Front and rear')
+        self.kettle = self.create_product('Kettle', 'Electric kettle',
+                                          category=self.kitchen)
+        update_index(rebuild=True)
+
+    def create_product(self, title, description, category=None, **params):
+        return Product.objects.create(seller=self.user,
+                                      category=category or self.bikes,
+                                      title=title,
+                                      price=Decimal('10.00'),
+                                      description=description,
+                                      **params)
+
+    def test_similar_products(self):
+        '''Test neighbours ranked by similarity, without the product itself'''
+        res = self.client.get(similar_url(self.road_bike.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        ids = [item['id'] for item in res.data]
+        self.assertEqual(ids, [self.gravel_bike.id, self.bike_lights.id])
+        self.assertIn('favorite', res.data[0])
+
+    def test_sold_filtered_out(self):
+        '''Test products sold since the index was built left out'''
+        Product.objects.filter(id=self.gravel_bike.id).update(is_sold=True)
+
+        self.assertEqual(get_similar_ids(self.road_bike.id), [self.bike_lights.id])
+
+    def test_incremental_update(self):
+        '''Test only modified products re-vectorized, sold & deleted ones dropped'''
+        self.kettle.title = 'Kettle bike'
+        self.kettle.save()
+        self.bike_lights.is_sold = True
+        self.bike_lights.save()
+        self.gravel_bike.delete()
+
+        stats = update_index()
+
+        self.assertFalse(stats.full)
+        self.assertEqual(stats.vectorized, 1)
+        self.assertEqual(stats.rows, 2)
+        self.assertEqual(get_similar_ids(self.road_bike.id), [self.kettle.id])
+
+    def test_category_change_rebuilds(self):
+        '''Test moving categories around rebuilds the whole index'''
+        Category.objects.create(name='Cycling')
+
+        stats = update_index()
+
+        self.assertTrue(stats.full)
+        self.assertEqual(stats.vectorized, 4)
+
+    def test_unindexed_product(self):
+        '''Test a product added after the last update vectorized on the fly'''
+        mountain_bike = self.create_product('Mountain bike', 'Steel frame')
+
+        res = self.client.get(similar_url(mountain_bike.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data[0]['id'], self.gravel_bike.id)
+
+    def test_unknown_product(self):
+        '''Test similar products of a missing product not found'''
+        res = self.client.get(similar_url(0))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,111 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from core.models import Category, Product
+from product.filters import PRODUCT_ORDERINGS
+
+PRODUCT_URL = reverse('product:product-list')
+
+
+def create_user(email='user@example.com', password='test123123123'):
+    # Create & Return a user
+    return get_user_model().objects.create_user(email=email, password=password)
+
+
+def create_product(seller, category, **params):
+    # Create & Return a product
+    defaults = {
+        'title': 'test_product',
+        'price': Decimal('10.00'),
+        'description': 'test description',
+    }
+    defaults.update(params)
+    return Product.objects.create(seller=seller, category=category, **defaults)
+
+
+class ProductPriceSortAPITest(APITestCase):
+    '''Test price range filters & sort options of the product list'''
+
+    def setUp(self):
+        self.user = create_user()
+        self.category = Category.objects.create(name='Test Category')
+        self.cheap = create_product(self.user, self.category, price=Decimal('5.00'))
+        self.middle = create_product(self.user, self.category,
+                                     price=Decimal('50.00'), bookmark_cnt=3)
+        self.pricey = create_product(self.user, self.category,
+                                     price=Decimal('500.00'), bookmark_cnt=1)
+
+    def get_ids(self, params):
+        res = self.client.get(PRODUCT_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [item['id'] for item in res.data['results']]
+
+    def test_price_range(self):
+        '''Test min_price & max_price inclusive bounds'''
+        ids = self.get_ids({'min_price': '5', 'max_price': '50', 'ordering': 'price'})
+
+        self.assertEqual(ids, [self.cheap.id, self.middle.id])
+
+    def test_orderings(self):
+        '''Test every supported ordering'''
+        cases = {
+            'price': [self.cheap.id, self.middle.id, self.pricey.id],
+            '-price': [self.pricey.id, self.middle.id, self.cheap.id],
+            '-created_at': [self.pricey.id, self.middle.id, self.cheap.id],
+            '-bookmark_cnt': [self.middle.id, self.pricey.id, self.cheap.id],
+        }
+        for ordering, expected in cases.items():
+            with self.subTest(ordering=ordering):
+                self.assertEqual(self.get_ids({'ordering': ordering}), expected)
+
+    def test_price_ties_broken_by_id(self):
+        '''Test products of the same price keep a stable order'''
+        same = create_product(self.user, self.category, price=Decimal('50.00'))
+
+        ids = self.get_ids({'ordering': '-price'})
+
+        self.assertEqual(ids, [self.pricey.id, same.id, self.middle.id, self.cheap.id])
+
+    def test_unsupported_ordering_rejected(self):
+        '''Test ordering by a field without index is rejected'''
+        res = self.client.get(PRODUCT_URL, {'ordering': 'hit_cnt'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ProductSortIndexTest(APITestCase):
+    '''Test every filter & sort combination is served by an index'''
+
+    FILTERS = [
+        {},
+        {'is_sold': False},
+        {'is_sold': False, 'category_id': 1},
+        {'category_id': 1},
+        {'price__gte': Decimal('10'), 'price__lte': Decimal('100')},
+        {'is_sold': False, 'price__gte': Decimal('10')},
+        {'is_sold': False, 'category_id': 1, 'price__lte': Decimal('100')},
+    ]
+
+    def explain(self, queryset):
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Make the planner avoid sequential scans & sorts whenever it can
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('SET LOCAL enable_sort = off')
+            return queryset.explain()
+
+    def test_index_scans(self):
+        '''Test plans use an index scan without a sort step'''
+        for filters in self.FILTERS:
+            for ordering in PRODUCT_ORDERINGS.values():
+                with self.subTest(filters=filters, ordering=ordering):
+                    queryset = Product.objects.filter(**filters).order_by(*ordering)
+                    plan = self.explain(queryset[:20])
+
+                    self.assertIn('Index', plan)
+                    self.assertNotIn('Seq Scan', plan)
+                    self.assertNotIn('Sort', plan)
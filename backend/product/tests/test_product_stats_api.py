@@ -0,0 +1,176 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from core.models import (
+    Category,
+    ChatRoom,
+    City,
+    Country,
+    County,
+    Product,
+    ProductDailyStats,
+)
+from product.counters import get_hit_counter
+from product.stats import STAT_FIELDS, record_many
+
+STATS_URL = reverse('product:product-mine-stats')
+CHAT_ROOMS_URL = reverse('chat_rooms')
+TRANSACTION_URL = reverse('transaction:direct-transaction-list')
+
+
+def favorite_url(product_id):
+    return reverse('product:favorite', args=[product_id])
+
+
+def transaction_url(transaction_id):
+    return reverse('transaction:direct-transaction-detail', args=[transaction_id])
+
+
+def create_user(email='user@example.com', password='test123123123', **extra):
+    # Create & Return a user
+    return get_user_model().objects.create_user(email=email, password=password,
+                                                **extra)
+
+
+def get_stats(product):
+    # Today's {stat: n} of the product
+    return (ProductDailyStats.objects
+            .filter(product=product, date=timezone.localdate())
+            .values(*STAT_FIELDS)
+            .get())
+
+
+class PublicProductStatsAPITest(APITestCase):
+    '''Test unauthenticated stats requests'''
+
+    def test_auth_required(self):
+        '''Test auth required for the seller dashboard'''
+        res = self.client.get(STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateProductStatsAPITest(APITestCase):
+    '''Test the daily stats rollups & the seller dashboard'''
+
+    def setUp(self):
+        self.seller = create_user(nickname='seller')
+        self.buyer = create_user(email='buyer@example.com', nickname='buyer')
+        self.client.force_authenticate(self.buyer)
+        category = Category.objects.create(name='Books')
+        self.products = [Product.objects.create(seller=self.seller,
+                                                category=category,
+                                                title=f'product {i}',
+                                                price=Decimal('10.00'),
+                                                description='desc')
+                         for i in range(3)]
+        self.product = self.products[0]
+
+    def test_favorites_recorded(self):
+        '''Test favorites saved & removed added to the day's stats'''
+        self.client.post(favorite_url(self.product.id))
+        self.assertEqual(get_stats(self.product)['favorites'], 1)
+
+        self.client.delete(favorite_url(self.product.id))
+        self.assertEqual(get_stats(self.product)['favorites'], 0)
+
+    def test_views_recorded(self):
+        '''Test flushed hits added to the day's stats'''
+        counter = get_hit_counter()
+        counter.backend.add({self.product.id: 3, self.products[1].id: 1})
+        counter.flush()
+        counter.backend.add({self.product.id: 2})
+        counter.flush()
+
+        self.assertEqual(get_stats(self.product)['views'], 5)
+        self.assertEqual(get_stats(self.products[1])['views'], 1)
+
+    def test_chat_rooms_and_transactions_recorded(self):
+        '''Test chat rooms, reservations & sales added to the day's stats'''
+        county = County.objects.create(name='Kent',
+                                       country=Country.objects.create(name='UK'))
+        city = City.objects.create(name='Dover', county=county)
+
+        self.client.post(CHAT_ROOMS_URL, {'product_id': self.product.id})
+        room = ChatRoom.objects.get()
+        res = self.client.post(TRANSACTION_URL, {'chatroom': room.id,
+                                                 'time': '2024-02-22-13:30',
+                                                 'location': city.id,
+                                                 'location_detail': 'station',
+                                                 'status': 'reserved'})
+        self.assertEqual(get_stats(self.product), {
+            'views': 0, 'favorites': 0, 'chat_rooms': 1,
+            'reservations': 1, 'sales': 0})
+
+        self.client.patch(transaction_url(res.data['id']), {'status': 'complete'})
+        self.client.patch(transaction_url(res.data['id']),
+                          {'location_detail': 'platform'})
+        self.assertEqual(get_stats(self.product)['sales'], 1)
+
+        self.client.patch(transaction_url(res.data['id']), {'status': 'reserved'})
+        self.assertEqual(get_stats(self.product)['sales'], 0)
+
+    def test_dashboard(self):
+        '''Test totals, zero filled days & products of the last days'''
+        today = timezone.localdate()
+        record_many({self.product.id: {'views': 2, 'favorites': 1},
+                     self.products[1].id: {'views': 5, 'sales': 1}})
+        record_many({self.product.id: {'views': 4, 'chat_rooms': 2}},
+                    date=today - timedelta(days=2))
+        record_many({self.products[2].id: {'views': 100}},
+                    date=today - timedelta(days=7))
+        other = Product.objects.create(seller=self.buyer,
+                                       category=self.product.category,
+                                       title='other', price=Decimal('1.00'),
+                                       description='desc')
+        record_many({other.id: {'views': 50}})
+        self.client.force_authenticate(self.seller)
+
+        with self.assertNumQueries(1):
+            res = self.client.get(STATS_URL, {'days': 7})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['since'], today - timedelta(days=6))
+        self.assertEqual(res.data['until'], today)
+        self.assertEqual(res.data['totals'], {'views': 11, 'favorites': 1,
+                                              'chat_rooms': 2, 'reservations': 0,
+                                              'sales': 1})
+        self.assertEqual(len(res.data['days']), 7)
+        self.assertEqual([day['views'] for day in res.data['days']],
+                         [0, 0, 0, 0, 4, 0, 7])
+        self.assertEqual([(product['product'], product['views'])
+                          for product in res.data['products']],
+                         [(self.product.id, 6), (self.products[1].id, 5)])
+
+    def test_days_validated(self):
+        '''Test the period limited to 1 to 365 days'''
+        self.client.force_authenticate(self.seller)
+        for days in ('0', '366', 'week'):
+            with self.subTest(days=days):
+                res = self.client.get(STATS_URL, {'days': days})
+
+                self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+                self.assertIn('days', res.data)
+
+    def test_read_with_index_only_scan(self):
+        '''Test the dashboard query covered by the (seller, date) index'''
+        queryset = (ProductDailyStats.objects
+                    .filter(seller=self.seller, date__gte=timezone.localdate())
+                    .values_list('product_id', 'date', *STAT_FIELDS))
+        sql, params = queryset.query.sql_with_params()
+
+        with connection.cursor() as cursor:
+            # Tiny test tables are otherwise always scanned sequentially
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('SET LOCAL enable_bitmapscan = off')
+            cursor.execute(f'EXPLAIN {sql}', params)
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+
+        self.assertIn('Index Only Scan using product_stats_seller_date_idx', plan)
@@ -0,0 +1,109 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from core.models import Category, Product
+from product.suggest import PrefixSuggestBackend, TrigramSuggestBackend
+
+SUGGEST_URL = reverse('product:suggest')
+PREFIX_BACKEND = 'product.suggest.PrefixSuggestBackend'
+
+
+class ProductSuggestAPITest(APITestCase):
+    '''Test the search box suggestions'''
+
+    def setUp(self):
+        cache.clear()
+        self.seller = get_user_model().objects.create_user(email='user@example.com',
+                                                           password='test123123123')
+        self.category = Category.objects.create(name='Cameras')
+        Category.objects.create(name='Camping', parent=self.category)
+        Category.objects.create(name='Old cameras', is_active=False)
+        for title, bookmark_cnt, is_sold in [('Red camera bag', 1, False),
+                                             ('Camera tripod', 5, False),
+                                             ('Camera tripod', 2, False),
+                                             ('Vintage Camera', 9, False),
+                                             ('Camping chair', 0, False),
+                                             ('Camera strap', 50, True)]:
+            self.create_product(title, bookmark_cnt=bookmark_cnt, is_sold=is_sold)
+
+    def create_product(self, title, **extra):
+        return Product.objects.create(seller=self.seller,
+                                      category=self.category,
+                                      title=title,
+                                      price=Decimal('10.00'),
+                                      description='desc',
+                                      **extra)
+
+    def suggest(self, query):
+        res = self.client.get(SUGGEST_URL, {'q': query})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res
+
+    def test_suggest(self):
+        '''Test distinct unsold titles starting with the query ranked first'''
+        res = self.suggest('  CAM ')
+
+        self.assertEqual(res.data['query'], 'cam')
+        self.assertEqual(res.data['titles'], ['Camera tripod', 'Camping chair',
+                                              'Vintage Camera', 'Red camera bag'])
+        self.assertEqual([category['name'] for category in res.data['categories']],
+                         ['Cameras', 'Camping'])
+        self.assertIn('public', res['Cache-Control'])
+        self.assertIn('max-age=60', res['Cache-Control'])
+
+    def test_word_prefixes(self):
+        '''Test queries matched at the start of words only'''
+        self.assertEqual(self.suggest('red   cam').data['titles'], ['Red camera bag'])
+        self.assertEqual(self.suggest('camera b').data['titles'], ['Red camera bag'])
+        self.assertEqual(self.suggest('amera').data['titles'], [])
+        self.assertEqual(self.suggest('').data['titles'], [])
+
+    @override_settings(PRODUCT_SUGGEST={'BACKEND': PREFIX_BACKEND})
+    def test_cached_per_prefix(self):
+        '''Test longer queries narrowed down from a complete prefix result'''
+        self.assertEqual(self.suggest('c')['X-Cache'], 'MISS')
+
+        with self.assertNumQueries(0):
+            res = self.suggest('cam')
+        self.assertEqual(res['X-Cache'], 'PREFIX')
+        self.assertEqual(res.data['titles'], ['Camera tripod', 'Camping chair',
+                                              'Vintage Camera', 'Red camera bag'])
+        self.assertEqual(self.suggest('cam')['X-Cache'], 'HIT')
+
+    @override_settings(PRODUCT_SUGGEST={'LIMIT': 2})
+    def test_incomplete_prefix_not_narrowed(self):
+        '''Test a prefix result cut by the limit not reused'''
+        self.suggest('c')
+
+        res = self.suggest('red')
+
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data['titles'], ['Red camera bag'])
+        self.assertEqual(len(self.suggest('ca').data['categories']), 2)
+
+    @override_settings(PRODUCT_SUGGEST={'BACKEND': PREFIX_BACKEND,
+                                        'REBUILD_INTERVAL': 0})
+    def test_invalidated_by_product_changes(self):
+        '''Test saved products showing up in the following suggestions'''
+        self.suggest('cam')
+        self.create_product('Camcorder', bookmark_cnt=100)
+
+        res = self.suggest('cam')
+
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data['titles'][0], 'Camcorder')
+
+    def test_backends_agree(self):
+        '''Test the trigram & prefix index backends suggesting the same titles'''
+        options = {'REBUILD_INTERVAL': 60}
+        prefix, trigram = PrefixSuggestBackend(options), TrigramSuggestBackend(options)
+
+        for query in ('c', 'cam', 'camera', 'camera t', 'red c', 'tri', 'x'):
+            with self.subTest(query=query):
+                self.assertEqual(prefix.suggest(query, 3), trigram.suggest(query, 3))
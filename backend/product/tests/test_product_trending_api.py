@@ -0,0 +1,119 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from core.models import Category, ChatRoom, Product, ProductTrend
+from product.trending import refresh_trending
+
+TRENDING_URL = reverse('product:product-trending')
+
+
+def create_user(email='user@example.com', password='test123123123', **params):
+    # Create & Return a user
+    return get_user_model().objects.create_user(
+        email=email, password=password, **params)
+
+
+@override_settings(PRODUCT_TRENDING={
+    'SIZE': 10,
+    'HALF_LIFE_HOURS': 24,
+    'CHAT_WINDOW_HOURS': 48,
+    'WEIGHTS': {'hits': 1, 'bookmarks': 5, 'chats': 10},
+})
+class ProductTrendingAPITest(APITestCase):
+    '''Test the trending products ranking & feed'''
+
+    def setUp(self):
+        self.seller = create_user(nickname='seller')
+        self.buyers = [create_user(email=f'buyer{i}@example.com', nickname=f'b{i}')
+                       for i in range(3)]
+        self.category = Category.objects.create(name='Test Category')
+
+    def create_product(self, age=timedelta(), **params):
+        product = Product.objects.create(seller=self.seller,
+                                         category=self.category,
+                                         title='test_product',
+                                         price=Decimal('10.00'),
+                                         description='test description',
+                                         **params)
+        # created_at is auto_now_add, so backdate it with an update
+        Product.objects.filter(id=product.id).update(
+            created_at=timezone.now() - age)
+        return product
+
+    def open_chats(self, product, count, age=timedelta()):
+        for buyer in self.buyers[:count]:
+            room = ChatRoom.objects.create(product=product,
+                                           seller=self.seller,
+                                           buyer=buyer)
+            ChatRoom.objects.filter(id=room.id).update(
+                created_at=timezone.now() - age)
+
+    def get_ids(self):
+        res = self.client.get(TRENDING_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [item['id'] for item in res.data['results']]
+
+    def test_ranking(self):
+        '''Test products ranked by weighted, decayed signals'''
+        hits = self.create_product(hit_cnt=20)
+        bookmarks = self.create_product(bookmark_cnt=5)
+        chats = self.create_product()
+        self.open_chats(chats, 3)
+        old_hits = self.create_product(hit_cnt=20, age=timedelta(hours=48))
+        self.create_product(hit_cnt=1000, is_sold=True)
+        self.create_product()  # No signals at all
+
+        stats = refresh_trending()
+
+        self.assertEqual(stats.products, 4)
+        self.assertEqual(self.get_ids(),
+                         [chats.id, bookmarks.id, hits.id, old_hits.id])
+        trend = ProductTrend.objects.get(product=old_hits)
+        self.assertAlmostEqual(trend.score, 5, places=3)  # Two half lives
+
+    def test_old_chats_ignored(self):
+        '''Test chat rooms outside the window not counted'''
+        product = self.create_product()
+        self.open_chats(product, 2, age=timedelta(hours=72))
+
+        refresh_trending()
+
+        self.assertEqual(self.get_ids(), [])
+
+    def test_refresh_replaces_ranking(self):
+        '''Test a refresh drops products which stopped trending'''
+        product = self.create_product(hit_cnt=10)
+        refresh_trending()
+        Product.objects.filter(id=product.id).update(hit_cnt=0)
+
+        refresh_trending()
+
+        self.assertFalse(ProductTrend.objects.exists())
+
+    def test_sold_after_refresh_hidden(self):
+        '''Test products sold since the last refresh left out of the feed'''
+        product = self.create_product(hit_cnt=10)
+        refresh_trending()
+        Product.objects.filter(id=product.id).update(is_sold=True)
+
+        self.assertEqual(self.get_ids(), [])
+
+    def test_feed_reads_ranking_only(self):
+        '''Test serving the feed never aggregates chat rooms'''
+        for i in range(5):
+            product = self.create_product(hit_cnt=i + 1)
+            self.open_chats(product, 2)
+        refresh_trending()
+
+        # count, page of products
+        with self.assertNumQueries(2):
+            res = self.client.get(TRENDING_URL)
+
+        self.assertEqual(len(res.data['results']), 5)
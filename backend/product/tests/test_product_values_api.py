@@ -0,0 +1,97 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, APITestCase, force_authenticate
+
+from core.models import Category, City, Country, County, Favorite, Product, ProductImage
+from product.serializers import ProductListSerializer, ProductListValuesSerializer
+from product.views import ProductListViewSet
+
+PRODUCT_URL = reverse('product:product-list')
+
+
+def create_user(email='user@example.com', password='test123123123'):
+    # Create & Return a user
+    return get_user_model().objects.create_user(email=email, password=password)
+
+
+def get_view(params, user=None):
+    # Create & Return a product list view set up for the request
+    request = APIRequestFactory().get(PRODUCT_URL, params)
+    if user is not None:
+        force_authenticate(request, user)
+    view = ProductListViewSet(action_map={'get': 'list'}, action='list',
+                              args=(), kwargs={}, format_kwarg=None)
+    view.request = view.initialize_request(request)
+    return view
+
+
+class ProductListValuesSerializerTest(APITestCase):
+    '''Test the values fast path rendering the same JSON as the serializer'''
+
+    def setUp(self):
+        self.user = create_user()
+        category = Category.objects.create(name='Test Category')
+        county = County.objects.create(name='Kent',
+                                       country=Country.objects.create(name='UK'))
+        city = City.objects.create(name='Dover', county=county)
+        products = [
+            Product.objects.create(seller=self.user, category=category,
+                                   title='café ☕', price=Decimal('123.50'),
+                                   description='"quoted"\nline', city=city,
+                                   county=county, country=county.country),
+            Product.objects.create(seller=self.user, category=category,
+                                   title='no city',
+                                   price=Decimal('0.99'), description='',
+                                   is_sold=True, bookmark_cnt=7),
+            Product.objects.create(seller=self.user, category=category,
+                                   title='plain', price=Decimal('10.00'),
+                                   description='test description'),
+        ]
+        ProductImage.objects.create(product=products[0],
+                                    image='uploads/products/second.jpg',
+                                    position=1)
+        ProductImage.objects.create(
+            product=products[0], image='uploads/products/first.jpg', position=0,
+            variants={'160': {'webp': 'uploads/products/first_160w.webp',
+                              'jpeg': 'uploads/products/first_160w.jpg'}})
+        ProductImage.objects.create(product=products[2],
+                                    image='uploads/products/other.jpg')
+        Favorite.objects.create(user=self.user, product=products[2])
+
+    def assertSameJSON(self, params, user=None):
+        view = get_view(params, user)
+        queryset = view.get_queryset()
+        context = view.get_serializer_context()
+        expected = ProductListSerializer(queryset, many=True, context=context).data
+
+        values = ProductListValuesSerializer(context=context)
+        data = values.to_representation(values.project(queryset))
+
+        renderer = JSONRenderer()
+        self.assertEqual(renderer.render(data), renderer.render(expected))
+
+    def test_card_fields(self):
+        '''Test the default card fields rendered identically'''
+        self.assertSameJSON({})
+        self.assertSameJSON({}, self.user)
+
+    def test_every_field(self):
+        '''Test every readable field, images included, rendered identically'''
+        fields = ','.join(ProductListSerializer.get_readable_fields())
+
+        self.assertSameJSON({'fields': fields})
+        self.assertSameJSON({'fields': fields}, self.user)
+
+    def test_single_images_query(self):
+        '''Test images loaded for the whole page with one query'''
+        view = get_view({'fields': 'id,images'})
+        values = view.get_values_serializer()
+        rows = list(values.project(view.get_queryset()))
+
+        with self.assertNumQueries(1):
+            data = values.to_representation(rows)
+
+        self.assertEqual([len(item['images']) for item in data], [1, 0, 2])
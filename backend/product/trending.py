@@ -0,0 +1,87 @@
+'''
+Trending products ranking.
+A product's score is its weighted hits & bookmarks, decayed by the product's
+age, plus its chat rooms opened within the window, each decayed by its own
+age. Scores are computed with one SQL query by the refresh_trending command
+and stored in the small ProductTrend table, so serving the feed is an index
+read joined by primary key. Configured with the PRODUCT_TRENDING setting:
+- SIZE: number of products kept
+- HALF_LIFE_HOURS: hours for a signal to lose half its weight
+- CHAT_WINDOW_HOURS: age of the oldest chat room counted
+- WEIGHTS: {'hits', 'bookmarks', 'chats'} multipliers
+'''
+import time
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, FloatField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Extract, Power
+from django.utils import timezone
+
+from core.models import ChatRoom, Product, ProductTrend
+
+DEFAULTS = {
+    'SIZE': 200,
+    'HALF_LIFE_HOURS': 48,
+    'CHAT_WINDOW_HOURS': 7 * 24,
+    'WEIGHTS': {'hits': 1, 'bookmarks': 5, 'chats': 10},
+}
+
+RefreshStats = namedtuple('RefreshStats', ['products', 'duration'])
+
+
+def get_options():
+    return {**DEFAULTS, **getattr(settings, 'PRODUCT_TRENDING', {})}
+
+
+def _decay(field, now, half_life):
+    # 0.5 ** (age / half_life), 1 for a brand new row
+    age = Value(now.timestamp()) - Extract(field, 'epoch')
+    return Power(Value(0.5), age / Value(half_life.total_seconds()))
+
+
+def get_scored_products(now=None):
+    '''Return [(product_id, score)] of the top unsold products, best first'''
+    options = get_options()
+    weights = options['WEIGHTS']
+    now = now or timezone.now()
+    half_life = timedelta(hours=options['HALF_LIFE_HOURS'])
+
+    chats = (ChatRoom.objects
+             .filter(product=OuterRef('pk'),
+                     created_at__gte=now - timedelta(
+                         hours=options['CHAT_WINDOW_HOURS']))
+             .order_by()
+             .values('product')
+             .annotate(total=Sum(_decay('created_at', now, half_life)))
+             .values('total'))
+    score = ((F('hit_cnt') * Value(float(weights['hits']))
+              + F('bookmark_cnt') * Value(float(weights['bookmarks'])))
+             * _decay('created_at', now, half_life)
+             + Coalesce(Subquery(chats, output_field=FloatField()), Value(0.0))
+             * Value(float(weights['chats'])))
+
+    return list(Product.objects
+                .filter(is_sold=False)
+                .annotate(score=score)
+                .filter(score__gt=0)
+                .order_by('-score', '-id')
+                .values_list('id', 'score')[:options['SIZE']])
+
+
+def refresh_trending(now=None):
+    '''Replace the ProductTrend table with fresh scores, returning RefreshStats'''
+    start = time.perf_counter()
+    now = now or timezone.now()
+    trends = [ProductTrend(product_id=product_id, rank=rank, score=score,
+                           computed_at=now)
+              for rank, (product_id, score)
+              in enumerate(get_scored_products(now), start=1)]
+
+    # Readers see either the old or the new ranking
+    with transaction.atomic():
+        ProductTrend.objects.all().delete()
+        ProductTrend.objects.bulk_create(trends)
+    return RefreshStats(products=len(trends), duration=time.perf_counter() - start)
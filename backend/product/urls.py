@@ -13,5 +13,7 @@ app_name = 'product'
 
 urlpatterns = [
     path('', include(router.urls)),
-    path('products/<id>/favorite/', views.FavoriteAPIView.as_view(), name='favorite')
+    path('products/<id>/favorite/', views.FavoriteAPIView.as_view(), name='favorite'),
+    path('favorites/', views.FavoriteListAPIView.as_view(), name='favorite-list'),
+    path('suggest/', views.SuggestAPIView.as_view(), name='suggest'),
     ]
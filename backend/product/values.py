@@ -0,0 +1,160 @@
+'''
+Read-only fast path for list pages.
+A ValuesSerializer renders `.values()` rows instead of model instances,
+through a field plan compiled once per field selection from the
+ModelSerializer it mirrors, so the output stays identical to it.
+'''
+from functools import lru_cache
+from operator import itemgetter
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from rest_framework import serializers
+from rest_framework.response import Response
+
+# Serializer fields returning values of these model columns unchanged
+IDENTITY_FIELDS = [
+    (serializers.CharField, (models.CharField, models.TextField)),
+    (serializers.IntegerField, (models.IntegerField,)),
+    (serializers.BooleanField, (models.BooleanField,)),
+]
+
+# Compiled column plans kept at most, any client can ask for any ?fields=
+MAX_COLUMN_PLANS = 256
+
+
+def get_model_field(model, source_attrs):
+    '''Return the model field a dotted serializer source points to, if any'''
+    field = None
+    for attr in source_attrs:
+        if model is None:
+            return None
+        try:
+            field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            return None
+        model = field.related_model
+    return field
+
+
+def get_column_getter(field, model_field):
+    '''Return (column, row getter) applying the field's representation'''
+    key = '__'.join(field.source_attrs)
+    get = itemgetter(key)
+    if isinstance(field, serializers.PrimaryKeyRelatedField):
+        # The column already holds the pk the field would render
+        if field.pk_field is None:
+            return key, get
+        to_representation = field.pk_field.to_representation
+    elif any(isinstance(field, field_class)
+             and isinstance(model_field, model_field_classes)
+             for field_class, model_field_classes in IDENTITY_FIELDS):
+        return key, get
+    else:
+        to_representation = field.to_representation
+
+    def getter(row):
+        value = get(row)
+        return None if value is None else to_representation(value)
+    return key, getter
+
+
+@lru_cache(maxsize=MAX_COLUMN_PLANS)
+def compile_column_plan(values_serializer_class, fields):
+    '''Compile the column plan of ValuesSerializer.get_column_plan()'''
+    context = {'fields': fields} if fields is not None else {}
+    serializer = values_serializer_class.serializer_class(context=context)
+    model = serializer.Meta.model
+    columns, plan = [], []
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        model_field = get_model_field(model, field.source_attrs)
+        if (hasattr(values_serializer_class, f'get_{name}_getter')
+                or model_field is None
+                or isinstance(field, serializers.BaseSerializer)):
+            plan.append((name, None))
+            continue
+        key, getter = get_column_getter(field, model_field)
+        columns.append(key)
+        plan.append((name, getter))
+    return columns, plan
+
+
+class ValuesSerializer:
+    '''
+    Rendering rows of serializer_class's readable fields from `.values()`.
+    Fields read off a model column are compiled generically, any other
+    field needs a `get_<name>_getter()` method returning
+    (columns, getter) where getter takes a row.
+    Rows can be loaded before rendering by overriding prepare().
+    '''
+    serializer_class = None
+
+    def __init__(self, context=None):
+        self.context = context or {}
+        fields = self.context.get('fields')
+        columns, plan = self.get_column_plan(tuple(fields) if fields else None)
+        self.columns = list(columns)
+        self.plan = []
+        for name, getter in plan:
+            if getter is None:
+                extra_columns, getter = getattr(self, f'get_{name}_getter')()
+                self.columns.extend(extra_columns)
+            self.plan.append((name, getter))
+
+    @classmethod
+    def get_column_plan(cls, fields):
+        '''
+        Return the (columns, [(name, getter)]) of the selected fields,
+        compiled once per selection. getter is None for the fields
+        without a column, left to the get_<name>_getter() methods.
+        '''
+        if fields is not None:
+            # Rendered in the serializer's order anyway, so reorderings &
+            # repeats of a selection share its plan
+            fields = tuple(sorted(set(fields)))
+        return compile_column_plan(cls, fields)
+
+    def project(self, queryset, *columns):
+        '''Return the queryset's rows as dicts of the needed columns'''
+        return (queryset
+                .prefetch_related(None)
+                .values(*dict.fromkeys([*self.columns, *columns])))
+
+    def prepare(self, rows):
+        '''Loading whatever the getters need for the rows of a page'''
+
+    def to_representation(self, rows):
+        rows = list(rows)
+        self.prepare(rows)
+        plan = self.plan
+        return [{name: getter(row) for name, getter in plan} for row in rows]
+
+
+class ValuesListMixin:
+    '''
+    Rendering list pages with values_serializer_class instead of the
+    serializer. values_columns are loaded on top of the rendered ones,
+    e.g. for the keyset pagination.
+    '''
+    values_serializer_class = None
+    values_columns = ('id', 'created_at')
+
+    def get_values_serializer(self):
+        return self.values_serializer_class(context=self.get_serializer_context())
+
+    def list_values(self, queryset, paginator=None):
+        '''Return the paginated response of the queryset's rows'''
+        serializer = self.get_values_serializer()
+        queryset = serializer.project(queryset, *self.values_columns)
+        paginator = paginator or self.paginator
+        page = None
+        if paginator is not None:
+            page = paginator.paginate_queryset(queryset, self.request, view=self)
+        if page is None:
+            return Response(serializer.to_representation(queryset))
+        return paginator.get_paginated_response(serializer.to_representation(page))
+
+    def list(self, request, *args, **kwargs):
+        return self.list_values(self.filter_queryset(self.get_queryset()))
@@ -1,15 +1,63 @@
+import hashlib
+
+from django.db import transaction
+from django.db.models import Count, Exists, F, Max, OuterRef, Q, Subquery
+from django.http import FileResponse
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+from django.utils.http import http_date, quote_etag
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import generics, mixins, status, viewsets
-from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import (
+    AllowAny,
+    IsAuthenticated,
+    IsAuthenticatedOrReadOnly,
+)
 from rest_framework.response import Response
 from rest_framework.serializers import ValidationError
+from rest_framework.views import APIView
 from rest_framework_simplejwt.authentication import JWTAuthentication
 
 from address.permissions import IsAdminOrReadOnly
 from core import models
-from product import serializers
-from product.pagination import CustomPagination
+from product import list_cache, renderers, serializers
+from product import stats as product_stats
+from product.archive import get_archived_product
+from product.categories import get_category_tree, get_category_tree_etag
+from product.counters import get_hit_counter
+from product.exports import get_export_queryset, get_export_rows, write_export
+from product.facets import get_facets
+from product.filters import ProductFilter, ProductOrderingFilter, ProductSearchFilter
+from product.imports import get_format, import_products
+from product.pagination import CustomPagination, KeysetPaginationMixin
 from product.permissions import IsSellerOrAdminElseReadOnly
+from product.similar import get_similar_ids
+from product.suggest import get_options as get_suggest_options
+from product.suggest import get_suggestions
+from product.values import ValuesListMixin
+
+
+def set_validators(response, etag, last_modified=None):
+    '''Setting the ETag & Last-Modified (a unix timestamp) headers'''
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def get_not_modified_response(request, etag, last_modified=None):
+    '''Return a 304 response when the request's validators match, None otherwise'''
+    response = get_conditional_response(request, etag=etag,
+                                        last_modified=last_modified)
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
 
 
 class CategoryListViewSet(viewsets.GenericViewSet,
@@ -21,6 +69,44 @@ class CategoryListViewSet(viewsets.GenericViewSet,
     permission_classes = [IsAdminOrReadOnly]
     queryset = models.Category.objects.root_nodes()
 
+    def list(self, request, *args, **kwargs):
+        '''
+        Listing the tree from the cached single query build.
+        - root: start from the given category instead of the root nodes
+        - depth: limit the number of levels returned
+        '''
+        root = self._get_int_param('root', minimum=1)
+        depth = self._get_int_param('depth', minimum=1)
+        try:
+            tree_etag = get_category_tree_etag(root=root, depth=depth)
+        except models.Category.DoesNotExist:
+            raise NotFound({'root': 'Category not found.'})
+
+        # Answering conditional requests before paginating or serializing
+        page_number = request.query_params.get(self.paginator.page_query_param, '')
+        etag = quote_etag(f'{tree_etag}-{page_number}')
+        response = get_not_modified_response(request, etag)
+        if response is not None:
+            return response
+
+        tree = get_category_tree(root=root, depth=depth)
+        page = self.paginate_queryset(tree)
+        if page is not None:
+            return set_validators(self.get_paginated_response(page), etag)
+        return set_validators(Response(tree), etag)
+
+    def _get_int_param(self, name, minimum):
+        value = self.request.query_params.get(name)
+        if value in (None, ''):
+            return None
+        try:
+            value = int(value)
+        except ValueError:
+            raise ValidationError({name: 'A valid integer is required.'})
+        if value < minimum:
+            raise ValidationError({name: f'Ensure this value is >= {minimum}.'})
+        return value
+
 
 class CategoryDetailViewSet(viewsets.GenericViewSet,
                             mixins.RetrieveModelMixin,
@@ -32,7 +118,26 @@ class CategoryDetailViewSet(viewsets.GenericViewSet,
     queryset = models.Category.objects.all()
 
 
-class ProductListViewSet(viewsets.GenericViewSet,
+class FavoriteFlagMixin:
+    '''
+    Annotating `is_favorite` for the request user with one EXISTS subquery,
+    so a whole page gets the flag without a query per product.
+    '''
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user = self.request.user
+        if user.is_authenticated:
+            favorites = models.Favorite.objects.filter(product=OuterRef('pk'),
+                                                       user=user)
+            queryset = queryset.annotate(is_favorite=Exists(favorites))
+        return queryset
+
+
+class ProductListViewSet(KeysetPaginationMixin,
+                         FavoriteFlagMixin,
+                         ValuesListMixin,
+                         viewsets.GenericViewSet,
                          mixins.ListModelMixin,
                          mixins.CreateModelMixin):
     '''
@@ -41,19 +146,173 @@ class ProductListViewSet(viewsets.GenericViewSet,
     and process the image in serializer's custom methods
     '''
     serializer_class = serializers.ProductSerializer
+    # List pages are rendered from .values() rows
+    values_serializer_class = serializers.ProductListValuesSerializer
     pagination_class = CustomPagination
     permission_classes = [IsAuthenticatedOrReadOnly]
     authentication_classes = [JWTAuthentication]
     queryset = (models.Product.objects
                 .select_related('seller', 'category')
                 .prefetch_related('images')
+                .defer('search_vector')
                 .all().order_by('-created_at')
                 )
-    filter_backends = [DjangoFilterBackend]
-    filterset_fields = ['category', 'is_sold']
+    filter_backends = [DjangoFilterBackend, ProductSearchFilter, ProductOrderingFilter]
+    filterset_class = ProductFilter
+    # Serializer fields without a Product column of their own
+    computed_fields = {'images', 'favorite', 'thumbnail'}
+
+    def get_serializer_class(self):
+        if self.action in ('list', 'trending'):
+            return serializers.ProductListSerializer
+        return serializers.ProductSerializer
+
+    def get_requested_fields(self):
+        '''Fields selected with the `fields` param, the card fields by default'''
+        if not hasattr(self, '_requested_fields'):
+            param = self.request.query_params.get('fields')
+            if not param:
+                fields = serializers.ProductListSerializer.CARD_FIELDS
+            else:
+                fields = [name.strip() for name in param.split(',') if name.strip()]
+                readable = serializers.ProductListSerializer.get_readable_fields()
+                unknown = [name for name in fields if name not in readable]
+                if unknown:
+                    raise ValidationError({
+                        'fields': f'Unknown fields: {", ".join(unknown)}. '
+                                  f'Choose from {", ".join(readable)}.'})
+            self._requested_fields = fields
+        return self._requested_fields
+
+    def get_queryset(self):
+        '''
+        Loading only the columns of the requested fields on list actions,
+        and the images only when they are rendered
+        '''
+        queryset = super().get_queryset()
+        if self.action not in ('list', 'trending'):
+            return queryset
+
+        fields = self.get_requested_fields()
+        # id & created_at are always needed by the keyset pagination
+        columns = {'id', 'created_at'}.union(
+            name for name in fields if name not in self.computed_fields)
+        queryset = queryset.select_related(None).only(*columns)
+        if 'images' not in fields:
+            queryset = queryset.prefetch_related(None)
+        if 'thumbnail' in fields:
+            first_image = (models.ProductImage.objects
+                           .filter(product=OuterRef('pk'))
+                           .order_by('position', 'id')
+                           .values('image')[:1])
+            queryset = queryset.annotate(thumbnail_name=Subquery(first_image))
+        return queryset
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action in ('list', 'trending'):
+            context['fields'] = self.get_requested_fields()
+        return context
+
+    def list(self, request, *args, **kwargs):
+        '''Anonymous pages are served from the shared response cache'''
+        if not list_cache.is_cacheable(request):
+            return super().list(request, *args, **kwargs)
+
+        data, cache_status = list_cache.get_page(
+            request, lambda: super(ProductListViewSet, self).list(
+                request, *args, **kwargs).data)
+        return Response(data, headers={'X-Cache': cache_status})
 
+    @action(detail=False)
+    def trending(self, request, *args, **kwargs):
+        '''
+        Trending unsold products, read from the ranking
+        the refresh_trending command keeps up to date
+        '''
+        queryset = (self.get_queryset()
+                    .filter(trend__isnull=False, is_sold=False)
+                    .order_by('trend__rank'))
+        # Page numbers only, the ranking has no created_at keyset
+        return self.list_values(queryset, paginator=CustomPagination())
+
+    @action(detail=False, methods=['post'], url_path='import', url_name='import',
+            parser_classes=[MultiPartParser])
+    def import_products(self, request, *args, **kwargs):
+        '''
+        Importing the request user's products from an uploaded CSV or
+        JSON lines `file`, reporting the rows created and the invalid ones.
+        The format is guessed from the file name unless `format` is given.
+        '''
+        file = request.FILES.get('file')
+        if file is None:
+            raise ValidationError({'file': 'No file was submitted.'})
+        try:
+            file_format = get_format(file.name, request.data.get('format'))
+        except ValueError as error:
+            raise ValidationError({'format': str(error)})
+
+        stats = import_products(request.user, file.open('rb'), file_format)
+        return Response({'rows': stats.rows,
+                         'created': stats.created,
+                         'error_count': stats.error_count,
+                         'errors': stats.errors,
+                         'rows_per_second': round(stats.rows_per_second)})
+
+    @action(detail=False, permission_classes=[IsAuthenticated],
+            renderer_classes=[renderers.CSVRenderer, renderers.JSONLinesRenderer])
+    def export(self, request, *args, **kwargs):
+        '''
+        Sending the request user's products as CSV or JSON lines
+        (`format` param), every product for staff users, who may narrow
+        it down to a `seller` id
+        '''
+        seller = request.user
+        if request.user.is_staff:
+            seller = request.query_params.get('seller') or None
+            if seller is not None and not seller.isdigit():
+                raise ValidationError({'seller': 'A valid integer is required.'})
+        rows = get_export_rows(get_export_queryset(seller), request)
+
+        renderer = request.accepted_renderer
+        return FileResponse(
+            write_export(rows, renderer),
+            as_attachment=True,
+            filename=f'products.{renderer.format}',
+            content_type=f'{renderer.media_type}; charset={renderer.charset}')
+
+    @action(detail=False, url_path='mine/stats', url_name='mine-stats',
+            permission_classes=[IsAuthenticated])
+    def stats(self, request, *args, **kwargs):
+        '''
+        Seller dashboard of the request user's products over the last
+        `days`(1 to 365, 30 by default), read from the daily rollups
+        '''
+        days = request.query_params.get('days') or '30'
+        try:
+            days = int(days)
+        except ValueError:
+            raise ValidationError({'days': 'A valid integer is required.'})
+        max_days = product_stats.MAX_DAYS
+        if not 1 <= days <= max_days:
+            raise ValidationError({
+                'days': f'Ensure this value is between 1 and {max_days}.'})
+        return Response(product_stats.get_seller_stats(request.user, days))
 
-class ProductDetailViewSet(viewsets.GenericViewSet,
+    @action(detail=False)
+    def facets(self, request, *args, **kwargs):
+        '''
+        Category(rolled up the tree), sold status & price bucket counts
+        of the products matching the current filters
+        '''
+        facets = get_facets(
+            request.query_params,
+            lambda: self.filter_queryset(models.Product.objects.all()))
+        return Response(facets)
+
+
+class ProductDetailViewSet(FavoriteFlagMixin,
+                           viewsets.GenericViewSet,
                            mixins.RetrieveModelMixin,
                            mixins.UpdateModelMixin,
                            mixins.DestroyModelMixin):
@@ -65,11 +324,137 @@ class ProductDetailViewSet(viewsets.GenericViewSet,
     queryset = (models.Product.objects
                 .select_related('seller', 'category')
                 .prefetch_related('images')
+                .defer('search_vector')
                 .all()
                 )
     permission_classes = [IsSellerOrAdminElseReadOnly]
     authentication_classes = [JWTAuthentication]
 
+    def get_validators(self):
+        '''
+        Return the weak ETag of the product from one query over everything
+        its representation depends on: the row, its images (added, removed or
+        given variants) and the user's favorite. hit_cnt & bookmark_cnt are
+        left out, every view bumps hit_cnt and a body differing only by
+        counters is still a valid copy. No Last-Modified is derived,
+        favorites change the body without touching modified_at.
+        Raise NotFound for an unknown product.
+        '''
+        try:
+            queryset = models.Product.objects.filter(pk=int(self.kwargs['pk']))
+        except ValueError:
+            raise NotFound()
+        fields = ['id', 'modified_at', 'image_count', 'last_image',
+                  'pending_variants']
+        if self.request.user.is_authenticated:
+            queryset = queryset.annotate(is_favorite=Exists(
+                models.Favorite.objects.filter(product=OuterRef('pk'),
+                                               user=self.request.user)))
+            fields.append('is_favorite')
+        state = (queryset
+                 .annotate(image_count=Count('images'),
+                           last_image=Max('images__id'),
+                           pending_variants=Count('images',
+                                                  filter=Q(images__variants={})))
+                 .values(*fields)
+                 .first())
+        if state is None:
+            raise NotFound()
+
+        digest = hashlib.sha1(repr(sorted(state.items())).encode()).hexdigest()
+        return 'W/' + quote_etag(digest)
+
+    def retrieve(self, request, *args, **kwargs):
+        '''
+        Retrieving a product, counting the view through the hit buffer,
+        or its archived copy once archived.
+        Conditional requests are answered with 304 before serializing.
+        '''
+        try:
+            product_id = int(kwargs['pk'])
+        except ValueError:
+            raise NotFound()
+        try:
+            etag = self.get_validators()
+        except NotFound:
+            return self.retrieve_archived(request, product_id)
+        get_hit_counter().incr(product_id)
+        response = get_not_modified_response(request, etag)
+        if response is None:
+            instance = self.get_object()
+            serializer = self.get_serializer(instance)
+            response = set_validators(Response(serializer.data), etag)
+        # The favorite flag differs per user
+        patch_vary_headers(response, ['Authorization'])
+        return response
+
+    def retrieve_archived(self, request, product_id):
+        '''Archived products never change, validated by their archival time'''
+        product = get_archived_product(product_id)
+        if product is None:
+            raise NotFound()
+        etag = quote_etag(f'archived-{product.id}')
+        last_modified = int(product.archived_at.timestamp())
+        response = get_not_modified_response(request, etag, last_modified)
+        if response is not None:
+            return response
+        serializer = serializers.ArchivedProductSerializer(
+            product, context=self.get_serializer_context())
+        return set_validators(Response(serializer.data), etag, last_modified)
+
+    @action(detail=True)
+    def similar(self, request, pk=None, *args, **kwargs):
+        '''Unsold products most similar to the product, best first'''
+        try:
+            ids = get_similar_ids(int(pk))
+        except (ValueError, models.Product.DoesNotExist):
+            raise NotFound()
+        products = self.get_queryset().in_bulk(ids)
+        serializer = serializers.ProductListSerializer(
+            [products[product_id] for product_id in ids if product_id in products],
+            many=True,
+            context=self.get_serializer_context())
+        return Response(serializer.data)
+
+    @action(detail=True, methods=['post', 'patch'])
+    def images(self, request, *args, **kwargs):
+        '''
+        Editing a product's images without re-uploading the others
+        - POST: appending uploaded_images after the current images
+        - PATCH: reordering with `order`, the list of every image id
+        '''
+        product = self.get_object()
+        context = {**self.get_serializer_context(), 'product': product}
+        if request.method == 'POST':
+            serializer = serializers.ProductImageUploadSerializer(
+                data=request.data, context=context)
+        else:
+            serializer = serializers.ProductImageOrderSerializer(
+                data=request.data, context=context)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        product.save(update_fields=['modified_at'])
+
+        images = models.ProductImage.objects.filter(product=product)
+        data = serializers.ProductImageSerializer(images, many=True,
+                                                  context=context).data
+        if request.method == 'POST':
+            return Response(data, status=status.HTTP_201_CREATED)
+        return Response(data)
+
+    @action(detail=True, methods=['delete'],
+            url_path=r'images/(?P<image_id>[0-9]+)', url_name='image-detail')
+    def image_detail(self, request, image_id, *args, **kwargs):
+        '''Removing a single image of the product'''
+        product = self.get_object()
+        deleted, _ = (models.ProductImage.objects
+                      .filter(product=product, id=image_id)
+                      .delete())
+        if not deleted:
+            raise NotFound({'message': 'Image not found.'})
+        product.save(update_fields=['modified_at'])
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
 
 class FavoriteAPIView(generics.GenericAPIView,
                       mixins.CreateModelMixin,
@@ -94,12 +479,57 @@ class FavoriteAPIView(generics.GenericAPIView,
             return Response(error.detail, status=status.HTTP_400_BAD_REQUEST)
 
     def delete(self, request, *args, **kwargs):
+        '''
+        Removing a favorite and decrementing the product's bookmark_cnt
+        & daily favorites in the same transaction,
+        only when a row was actually deleted.
+        '''
         product_id = self.kwargs.get('id')
-        try:
-            favorite = models.Favorite.objects.get(product=product_id,
-                                                   user=request.user)
-            self.perform_destroy(favorite)
-            return Response({'message': 'Favorite removed'},
-                            status=status.HTTP_204_NO_CONTENT)
-        except models.Favorite.DoesNotExist:
-            raise ValidationError({'message': 'Not saved as a favorite'})
+        with transaction.atomic():
+            deleted, _ = (models.Favorite.objects
+                          .filter(product=product_id, user=request.user)
+                          .delete())
+            if not deleted:
+                raise ValidationError({'message': 'Not saved as a favorite'})
+            (models.Product.objects
+             .filter(id=product_id)
+             .update(bookmark_cnt=F('bookmark_cnt') - 1))
+            product_stats.record(product_id, favorites=-1)
+        return Response({'message': 'Favorite removed'},
+                        status=status.HTTP_204_NO_CONTENT)
+
+
+class FavoriteListAPIView(KeysetPaginationMixin, generics.ListAPIView):
+    '''
+    The request user's favorites, newest first, read through the
+    (user, created_at) index with the products joined in & their images
+    prefetched, so a page takes the same queries whatever its size
+    '''
+    serializer_class = serializers.FavoriteListSerializer
+    pagination_class = CustomPagination
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [JWTAuthentication]
+
+    def get_queryset(self):
+        return (models.Favorite.objects
+                .filter(user=self.request.user)
+                .select_related('product')
+                .defer('product__search_vector', 'product__description')
+                .prefetch_related('product__images')
+                .order_by('-created_at', '-id'))
+
+
+class SuggestAPIView(APIView):
+    '''
+    Search box suggestions for `q`, titles & categories with a word
+    starting with it. The same for every user, so no authentication.
+    '''
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        data, cache_status = get_suggestions(request.query_params.get('q', ''))
+        response = Response(data, headers={'X-Cache': cache_status})
+        patch_cache_control(response, public=True,
+                            max_age=get_suggest_options()['CACHE_TIMEOUT'])
+        return response
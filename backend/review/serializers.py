@@ -9,7 +9,7 @@ class ReviewSerializer(serializers.ModelSerializer):
     '''
 
     product_title = serializers.CharField(
-        source='transaction.chatroom.product.title',
+        source='transaction.chatroom.listing.title',
         read_only=True
     )
 
@@ -6,11 +6,11 @@ from rest_framework.serializers import ValidationError
 from rest_framework_simplejwt.authentication import JWTAuthentication
 
 from core.models import DirectTransaction, Review
-from product.pagination import CustomPagination
+from product.pagination import CustomPagination, KeysetPaginationMixin
 from review.serializers import ReviewSerializer
 
 
-class ReviewListAPIView(generics.ListAPIView):
+class ReviewListAPIView(KeysetPaginationMixin, generics.ListAPIView):
     '''View for listing user's reviews'''
     serializer_class = ReviewSerializer
     pagination_class = CustomPagination
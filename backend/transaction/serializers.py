@@ -1,9 +1,13 @@
 from datetime import datetime
 
+from django.db import transaction
 from django.utils import timezone
 from rest_framework import serializers
 
 from core.models import DirectTransaction
+from product import stats as product_stats
+from product.archive import get_listings
+from product.values import ValuesSerializer
 
 
 class CustomDateTimeField(serializers.Field):
@@ -33,9 +37,9 @@ class DirectTransactionSerializer(serializers.ModelSerializer):
     Serializer for DirectTransaction model.
     """
     title = serializers.CharField(
-        source='chatroom.product.title', read_only=True)
+        source='chatroom.listing.title', read_only=True)
     price = serializers.CharField(
-        source='chatroom.product.price', read_only=True)
+        source='chatroom.listing.price', read_only=True)
     time = CustomDateTimeField()
 
     class Meta:
@@ -56,6 +60,25 @@ class DirectTransactionSerializer(serializers.ModelSerializer):
                             'created_at',
                             'modified_at']
 
+    def create(self, validated_data):
+        # Counting the reservation, and the sale when created complete
+        with transaction.atomic():
+            instance = super().create(validated_data)
+            product_stats.record(instance.chatroom.product_id, reservations=1,
+                                 sales=int(instance.status == 'complete'))
+        return instance
+
+    def update(self, instance, validated_data):
+        # Counting the sale when completed, uncounting it when reopened
+        was_complete = instance.status == 'complete'
+        with transaction.atomic():
+            instance = super().update(instance, validated_data)
+            is_complete = instance.status == 'complete'
+            if is_complete != was_complete:
+                product_stats.record(instance.chatroom.product_id,
+                                     sales=1 if is_complete else -1)
+        return instance
+
     def to_representation(self, instance):
         # Custom representation of DirectTransaction instance
         representation = super().to_representation(instance)
@@ -65,3 +88,33 @@ class DirectTransactionSerializer(serializers.ModelSerializer):
         representation['modified_at'] = (instance.modified_at
                                          .strftime("%Y-%m-%d-%H:%M:%S"))
         return representation
+
+
+def format_timestamp(value):
+    return value.strftime("%Y-%m-%d-%H:%M:%S")
+
+
+class DirectTransactionValuesSerializer(ValuesSerializer):
+    """
+    DirectTransactionSerializer fast path for transaction list pages.
+    """
+    serializer_class = DirectTransactionSerializer
+
+    def get_title_getter(self):
+        return (['chatroom__product_id'],
+                lambda row: self.listings[row['chatroom__product_id']]['title'])
+
+    def get_price_getter(self):
+        return (['chatroom__product_id'],
+                lambda row: str(self.listings[row['chatroom__product_id']]['price']))
+
+    def prepare(self, rows):
+        '''Loading the listings, archived or not, of every row'''
+        self.listings = get_listings({row['chatroom__product_id'] for row in rows},
+                                     'title', 'price')
+
+    def get_created_at_getter(self):
+        return ['created_at'], lambda row: format_timestamp(row['created_at'])
+
+    def get_modified_at_getter(self):
+        return ['modified_at'], lambda row: format_timestamp(row['modified_at'])
@@ -5,9 +5,11 @@ from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django.utils import timezone
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APITestCase
 
 from core import models
+from transaction.serializers import DirectTransactionSerializer
 
 TRANSACTION_URL = reverse('transaction:direct-transaction-list')
 
@@ -85,6 +87,16 @@ class PrivateDirectTransactionAPITest(APITestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(len(res.data['results']), 1)
 
+    def test_list_rendered_as_serializer(self):
+        '''Test list pages rendering the same JSON as the serializer'''
+        res = self.client.get(TRANSACTION_URL, {'cursor': ''})
+
+        expected = DirectTransactionSerializer(
+            models.DirectTransaction.objects.order_by('-created_at'), many=True).data
+        renderer = JSONRenderer()
+        self.assertEqual(renderer.render(res.data['results']),
+                         renderer.render(expected))
+
     def test_create_direct_transaction(self):
         '''Test user creating a transaction'''
 
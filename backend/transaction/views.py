@@ -4,13 +4,20 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework_simplejwt.authentication import JWTAuthentication
 
 from core.models import DirectTransaction
-from product.pagination import CustomPagination
-from transaction.serializers import DirectTransactionSerializer
+from product.pagination import CustomPagination, KeysetPaginationMixin
+from product.values import ValuesListMixin
+from transaction.serializers import (
+    DirectTransactionSerializer,
+    DirectTransactionValuesSerializer,
+)
 
 
-class DirectTransactionViewSet(viewsets.ModelViewSet):
+class DirectTransactionViewSet(KeysetPaginationMixin,
+                               ValuesListMixin,
+                               viewsets.ModelViewSet):
     '''Creating & Processing direct transaction status '''
     serializer_class = DirectTransactionSerializer
+    values_serializer_class = DirectTransactionValuesSerializer
     pagination_class = CustomPagination
     permission_classes = [IsAuthenticated]
     authentication_classes = [JWTAuthentication]